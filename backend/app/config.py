@@ -28,5 +28,96 @@ class Settings:
     if not ELASTICSEARCH_URI:
         raise ValueError("❌ Environment variable ELASTICSEARCH_URI is not set or empty.")
     # ### --- END OF CHANGE --- ###
+    # Shared client (services/es_provider.py): default per-request timeout (s), retries, pooled connections
+    ES_TIMEOUT: float = float(os.getenv("ES_TIMEOUT", 10))
+    ES_MAX_RETRIES: int = int(os.getenv("ES_MAX_RETRIES", 3))
+    ES_POOL_MAXSIZE: int = int(os.getenv("ES_POOL_MAXSIZE", 25))
+    # How long index existence / field mappings are cached before Elasticsearch is asked again (services/es_metadata.py)
+    ES_METADATA_TTL_SECONDS: float = float(os.getenv("ES_METADATA_TTL_SECONDS", 30))
+    # Investigation paging/export (services/es_export.py): point-in-time keep-alive, which is also how
+    # long an unused page cursor lives (s), open cursors kept, hits fetched per export page
+    INVESTIGATION_PIT_KEEP_ALIVE_SECONDS: int = int(os.getenv("INVESTIGATION_PIT_KEEP_ALIVE_SECONDS", 120))
+    INVESTIGATION_MAX_CURSORS: int = int(os.getenv("INVESTIGATION_MAX_CURSORS", 256))
+    INVESTIGATION_EXPORT_PAGE_SIZE: int = int(os.getenv("INVESTIGATION_EXPORT_PAGE_SIZE", 1000))
+    # Memory budget (bytes of JSON) of the /query result cache (services/query_cache.py)
+    INVESTIGATION_CACHE_MAX_BYTES: int = int(os.getenv("INVESTIGATION_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+    # --- Live packet pipeline ---
+    # How packets are persisted: "copy" (PostgreSQL COPY), "insert" (multi-row INSERT) or "row" (one commit per packet)
+    PACKET_WRITE_MODE: str = os.getenv("PACKET_WRITE_MODE", "copy").lower()
+    # A batch is flushed when it reaches this many packets...
+    PACKET_BATCH_SIZE: int = int(os.getenv("PACKET_BATCH_SIZE", 500))
+    # ...or when the oldest packet in it has waited this long (milliseconds)
+    PACKET_FLUSH_INTERVAL_MS: int = int(os.getenv("PACKET_FLUSH_INTERVAL_MS", 250))
+    # What the packet-streamer writes into the FIFO: "ek" (tshark -T ek JSON) or "pcap" (tshark -F pcap -w -)
+    PACKET_INGEST_FORMAT: str = os.getenv("PACKET_INGEST_FORMAT", "ek").lower()
+    # Number of EK decoder worker processes; 1 keeps the single json_sniffer_process
+    PACKET_DECODER_WORKERS: int = int(os.getenv("PACKET_DECODER_WORKERS", 1))
+    # Sniffer -> handler transport: "queue" (multiprocessing.Queue) or "shm" (shared-memory ring)
+    PACKET_TRANSPORT: str = os.getenv("PACKET_TRANSPORT", "queue").lower()
+    # Number of fixed-width packet records the shared-memory ring can hold
+    PACKET_RING_CAPACITY: int = int(os.getenv("PACKET_RING_CAPACITY", 65536))
+    # Hard bound of the queue transport; packets beyond it are dropped and counted
+    PACKET_QUEUE_MAX_DEPTH: int = int(os.getenv("PACKET_QUEUE_MAX_DEPTH", 100000))
+    # Load shedding watermarks, as a fraction of the transport capacity
+    PACKET_SOFT_WATERMARK: float = float(os.getenv("PACKET_SOFT_WATERMARK", 0.5))
+    PACKET_HARD_WATERMARK: float = float(os.getenv("PACKET_HARD_WATERMARK", 0.9))
+    # Between the watermarks, persist 1 packet out of this many
+    PACKET_SAMPLE_RATE: int = int(os.getenv("PACKET_SAMPLE_RATE", 10))
+    # What the handler persists: "packets" (raw rows), "flows" (5-tuple flows only) or "both"
+    PACKET_PERSISTENCE: str = os.getenv("PACKET_PERSISTENCE", "packets").lower()
+    # Flow table bounds: max tracked flows (least recently updated is evicted), idle and active timeouts (seconds)
+    FLOW_TABLE_MAX_FLOWS: int = int(os.getenv("FLOW_TABLE_MAX_FLOWS", 100000))
+    FLOW_IDLE_TIMEOUT: int = int(os.getenv("FLOW_IDLE_TIMEOUT", 30))
+    FLOW_ACTIVE_TIMEOUT: int = int(os.getenv("FLOW_ACTIVE_TIMEOUT", 300))
+    # Also maintain per-minute rollups by (protocol, src, dst, dst port); higher cardinality than the protocol rollup
+    PACKET_ROLLUP_CONVERSATIONS: bool = os.getenv("PACKET_ROLLUP_CONVERSATIONS", "false").lower() == "true"
+    # Most recent packets kept in memory to answer GET /api/packets without PostgreSQL
+    PACKET_CACHE_SIZE: int = int(os.getenv("PACKET_CACHE_SIZE", 10000))
+
+    # --- Bandwidth time series (services/bandwidth_store.py) ---
+    # Destinations in these CIDRs count as ingress, everything else as egress
+    BANDWIDTH_LOCAL_NETWORKS: str = os.getenv("BANDWIDTH_LOCAL_NETWORKS", "10.0.0.0/8,172.16.0.0/12,192.168.0.0/16,fc00::/7")
+    # Interface name used when the capture does not report one (raw pcap input)
+    BANDWIDTH_DEFAULT_INTERFACE: str = os.getenv("BANDWIDTH_DEFAULT_INTERFACE") or os.getenv("IFACE") or "capture"
+    # Archives are saved here on shutdown and restored on start (empty: not persisted)
+    BANDWIDTH_SNAPSHOT_FILE: str = os.getenv("BANDWIDTH_SNAPSHOT_FILE", "/var/lib/netguard/bandwidth.rrd")
+
+    # --- Suricata alert ingestion ---
+    # eve.json event types stored as alerts; all other lines are skipped before JSON decoding
+    SURICATA_EVENT_TYPES: list = [t.strip() for t in os.getenv("SURICATA_EVENT_TYPES", "alert").split(",") if t.strip()]
+    # Alerts stored per multi-row INSERT / broadcast per WebSocket frame
+    ALERT_BATCH_SIZE: int = int(os.getenv("ALERT_BATCH_SIZE", 200))
+
+    # Repeated hits of (signature, src, dst, dst port) within this many seconds update one row (0 disables)
+    ALERT_DEDUP_WINDOW_SECONDS: float = float(os.getenv("ALERT_DEDUP_WINDOW_SECONDS", 60))
+    # Dedup keys kept in memory; the least recently hit are evicted first
+    ALERT_DEDUP_MAX_KEYS: int = int(os.getenv("ALERT_DEDUP_MAX_KEYS", 10000))
+
+    # --- CIDR suppression / allow-list (services/suppression.py) ---
+    # JSON rules file; a missing file means no rules
+    SUPPRESSION_RULES_FILE: str = os.getenv("SUPPRESSION_RULES_FILE", "/var/lib/netguard/suppression_rules.json")
+    # How often (seconds) the rules file is checked for changes
+    SUPPRESSION_RELOAD_INTERVAL: float = float(os.getenv("SUPPRESSION_RELOAD_INTERVAL", 5))
+
+    # --- Log tailing (Suricata / Zeek) ---
+    # Byte offsets of the followed log files, so a restart resumes where it stopped
+    LOG_TAILER_OFFSETS_FILE: str = os.getenv("LOG_TAILER_OFFSETS_FILE", "/var/lib/netguard/log_offsets.json")
+    # Fallback polling period (seconds) when no inotify event arrives
+    LOG_TAILER_POLL_INTERVAL: float = float(os.getenv("LOG_TAILER_POLL_INTERVAL", 5))
+
+    # --- Zeek ---
+    # Directory holding Zeek's current JSON logs (conn.log, dns.log, http.log, ssl.log)
+    ZEEK_LOG_DIR: str = os.getenv("ZEEK_LOG_DIR", "/opt/zeek/logs/current")
+    # Records kept in memory per Zeek log type; older data is read from Elasticsearch
+    ZEEK_RING_CAPACITY: int = int(os.getenv("ZEEK_RING_CAPACITY", 100000))
+
+    # --- Live WebSocket stream ---
+    # Packet frames sent per second; each frame carries every packet seen since the previous one
+    WS_BROADCAST_HZ: float = float(os.getenv("WS_BROADCAST_HZ", 10))
+    # Upper bound of packets in one frame (the newest are kept)
+    WS_MAX_PACKETS_PER_FRAME: int = int(os.getenv("WS_MAX_PACKETS_PER_FRAME", 500))
+    # Frames buffered per client before the oldest is dropped
+    WS_CLIENT_QUEUE_SIZE: int = int(os.getenv("WS_CLIENT_QUEUE_SIZE", 64))
 
 settings = Settings()
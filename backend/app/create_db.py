@@ -7,6 +7,7 @@ from sqlalchemy.exc import OperationalError
 # Import your core database objects and models
 from app.database import engine, Base
 from app import models
+from app.services import db_partitions, alert_aggregation
 
 # --- Configuration for the retry logic ---
 # Total number of times we will try to connect
@@ -27,10 +28,13 @@ def initialize_database():
             # Attempt to connect to the database. The 'create_all' command
             # requires a successful connection to proceed.
             print(f"Attempting to connect to database... (Attempt {attempt}/{MAX_RETRIES})")
+            db_partitions.migrate_legacy_table()
             Base.metadata.create_all(bind=engine)
+            alert_aggregation.ensure_aggregation_columns()
+            db_partitions.ensure_partitions()
             
             # If we reach this line, the connection was successful.
-            print("✅ Database connection successful. Tables are verified/created.")
+            print("✅ Database connection successful. Tables and packet partitions are verified/created.")
             return # Exit the function successfully.
 
         except OperationalError:
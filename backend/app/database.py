@@ -45,11 +45,16 @@ try:
         finally: db.close()
 
     def create_db_and_tables():
-        """Creates all tables defined in the SQLAlchemy models."""
+        """Creates all tables defined in the SQLAlchemy models, plus the upcoming network_packets partitions."""
         from app import models  # Import here to avoid circular dependencies
+        from app.services import db_partitions, alert_aggregation, traffic_rollups
         logger.info("--- Creating database tables if they do not exist... ---")
+        db_partitions.migrate_legacy_table()
         Base.metadata.create_all(bind=engine)
-        logger.info("✅ Database tables are ready.")
+        alert_aggregation.ensure_aggregation_columns()
+        db_partitions.ensure_partitions()
+        traffic_rollups.backfill_from_packets()
+        logger.info("✅ Database tables and packet partitions are ready.")
 
 except Exception as e:
     logger.critical(f"FATAL: A critical error occurred while creating the database engine: {e}", exc_info=True)
@@ -22,13 +22,13 @@ from app.routers import (
 from app.routers.connection_manager import manager
 from app.services import (
     packet_capture, evasive_scanner, host_discovery, port_scanner,
-    vulnerability_scanner, db_cleanup
+    vulnerability_scanner, db_cleanup, zeek_parser, log_parser, log_tailer
 )
 from app.database import create_db_and_tables, SessionLocal
 from app.models import Vulnerability
 from app.config import settings
 from app.state import app_state
-from elasticsearch import Elasticsearch
+from app.services import es_provider, es_ingest
 
 # --- Configure Logging ---
 logging.basicConfig(level="INFO", format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -56,35 +56,44 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Failed to clear old vulnerability data on startup: {e}"); db.rollback()
     finally: db.close()
-    es_client = Elasticsearch(settings.ELASTICSEARCH_URI)
     while True:
-        try:
-            if es_client.ping(): logger.info("✅ Elasticsearch is connected and healthy."); break
-        except Exception: pass
+        if await es_provider.ping(): logger.info("✅ Elasticsearch is connected and healthy."); break
         logger.warning("🟡 Elasticsearch not ready, waiting 5 seconds..."); await asyncio.sleep(5)
-    es_client.close()
+    try: es_ingest.install()
+    except Exception as e: logger.error(f"❌ Failed to install the Zeek ingest pipeline/template: {e}")
     app_state.main_event_loop = asyncio.get_running_loop()
+    broadcaster_task = asyncio.create_task(manager.run_packet_broadcaster())
     logger.info("Starting background services...")
     threading.Thread(target=host_discovery_loop, daemon=True).start()
     threading.Thread(target=port_scanner_loop, daemon=True).start()
     threading.Thread(target=vuln_scanner_loop, daemon=True).start()
     threading.Thread(target=evasive_scanner.start_automated_evasion_scanner, daemon=True).start()
     threading.Thread(target=db_cleanup.db_cleanup_loop, daemon=True).start()
+    # Recent Zeek conn/dns/http/ssl logs are followed into the in-memory rings (returns immediately).
+    zeek_parser.start_log_monitoring()
+    # Suricata eve.json alerts, through the same shared tailer.
+    log_parser.start_log_monitoring()
     try:
         pipe_path_in_container = "/stream/scapy.pcap"
         logger.info(f"✅ Scapy analysis service will read from shared stream: '{pipe_path_in_container}'")
-        packet_queue = multiprocessing.Queue()
+        packet_queue = packet_capture.create_packet_transport()
+        app_state.packet_transport = packet_queue
         stop_event = multiprocessing.Event()
         app.state.packet_capture_stop_event = stop_event
-        sniffer_process = multiprocessing.Process(target=packet_capture.json_sniffer_process, args=(packet_queue, pipe_path_in_container, stop_event), daemon=True)
+        packet_capture.start_sniffer(packet_queue, pipe_path_in_container, stop_event)
         handler_thread = threading.Thread(target=packet_capture.data_handler_thread, args=(packet_queue, stop_event), daemon=True)
-        sniffer_process.start(); handler_thread.start()
+        handler_thread.start()
         logger.info("✅ Scapy analysis service started successfully.")
     except Exception as e: logger.error(f"❌ FATAL: Failed to start Scapy analysis service: {e}", exc_info=True)
     logger.info("✅ Application startup sequence complete. CybReon is running.")
     yield
     logger.info("--- Shutting Down ---")
+    broadcaster_task.cancel()
     if hasattr(app.state, 'packet_capture_stop_event'): app.state.packet_capture_stop_event.set()
+    if hasattr(app_state.packet_transport, 'close'): app_state.packet_transport.close()
+    log_tailer.tailer.stop()
+    if app_state.bandwidth_store: app_state.bandwidth_store.save()
+    await es_provider.close_clients()
     logger.info("✅ Shutdown complete.")
 
 # --- Background Loops (No changes here) ---
@@ -133,10 +142,19 @@ async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         while True:
-            await websocket.receive_text()
+            # Clients may send {"action": "subscribe", ...} at any time to change what they receive.
+            manager.handle_client_message(websocket, await websocket.receive_text())
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Any other error (or cancellation) must not leave the client and its sender task behind.
         manager.disconnect(websocket)
 
+@api_router.get("/ws/stats", tags=["WebSocket"])
+def websocket_stats():
+    """Per-client queue depth, drops and send lag of the live WebSocket stream."""
+    return manager.stats()
+
 # Mount the main API router
 app.include_router(api_router)
 
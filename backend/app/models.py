@@ -1,7 +1,7 @@
 # backend/app/models.py
 
 from app.database import Base
-from sqlalchemy import Column, Integer, String, DateTime, Index, Text, ForeignKey, JSON, Float, func
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Index, Text, ForeignKey, JSON, Float, func
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 
@@ -31,8 +31,11 @@ class Vulnerability(Base):
 
 class NetworkPacket(Base):
     __tablename__ = "network_packets"
-    id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime, nullable=False)
+    # Range-partitioned by day; the daily partitions are created and dropped by
+    # app/services/db_partitions.py. PostgreSQL requires the partition key in the primary key.
+    __table_args__ = {"postgresql_partition_by": 'RANGE ("timestamp")'}
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    timestamp = Column(DateTime, primary_key=True, nullable=False, index=True)
     source_ip = Column(String(45), nullable=False)
     destination_ip = Column(String(45), nullable=False)
     source_mac = Column(String(17), nullable=True)
@@ -44,6 +47,44 @@ class NetworkPacket(Base):
     ttl = Column(Integer, nullable=True)
     flags = Column(String(10), nullable=True)
 
+class NetworkFlow(Base):
+    """Finished 5-tuple flows exported by the in-process flow table (services/flow_table.py)."""
+    __tablename__ = "network_flows"
+    id = Column(BigInteger, primary_key=True, index=True)
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False, index=True)
+    protocol = Column(String(10), nullable=False)
+    source_ip = Column(String(45), nullable=False, index=True)
+    source_port = Column(Integer, nullable=True)
+    destination_ip = Column(String(45), nullable=False, index=True)
+    destination_port = Column(Integer, nullable=True)
+    packets = Column(BigInteger, nullable=False)
+    bytes = Column(BigInteger, nullable=False)
+    tcp_flags = Column(String(10), nullable=True)  # OR of all TCP flags seen, e.g. "0x001b"
+    end_reason = Column(String(10), nullable=False)  # fin, idle, active, evicted or shutdown
+
+# --- Traffic rollups, maintained incrementally by the packet writer ---
+
+class TrafficRollupProtocol(Base):
+    """Packets and bytes per protocol per minute."""
+    __tablename__ = "traffic_rollup_protocol_1m"
+    bucket = Column(DateTime, primary_key=True)
+    protocol = Column(String(10), primary_key=True)
+    packets = Column(BigInteger, nullable=False, default=0)
+    bytes = Column(BigInteger, nullable=False, default=0)
+
+class TrafficRollupConversation(Base):
+    """Packets and bytes per (protocol, source, destination, destination port) per minute. Optional, see PACKET_ROLLUP_CONVERSATIONS."""
+    __tablename__ = "traffic_rollup_conversation_1m"
+    bucket = Column(DateTime, primary_key=True)
+    protocol = Column(String(10), primary_key=True)
+    source_ip = Column(String(45), primary_key=True)
+    destination_ip = Column(String(45), primary_key=True)
+    # 0 when the protocol has no ports, so the column can be part of the key
+    destination_port = Column(Integer, primary_key=True, default=0)
+    packets = Column(BigInteger, nullable=False, default=0)
+    bytes = Column(BigInteger, nullable=False, default=0)
+
 class NetworkPort(Base):
     __tablename__ = "network_ports"
     id = Column(Integer, primary_key=True, index=True)
@@ -76,7 +117,12 @@ class SecurityAlert(Base):
     severity = Column(String(50))
     signature = Column(String(255))
     event_type = Column(String(50))
+    # Only the first hit of an aggregation window keeps its raw log line
     raw_log = Column(Text, nullable=True)
+    # Aggregation window (see services/alert_aggregation.py): hits merged into this row
+    first_seen = Column(DateTime, nullable=True)
+    last_seen = Column(DateTime, nullable=True)
+    count = Column(Integer, nullable=False, default=1, server_default="1")
 
 
 class Host(Base):
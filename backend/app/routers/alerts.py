@@ -1,7 +1,7 @@
 # backend/app/routers/alerts.py
 from fastapi import APIRouter
 from typing import List
-from app.services import alert_service, ids_query_service
+from app.services import alert_service, ids_query_service, log_parser, log_tailer
 from app import schemas
 
 router = APIRouter()
@@ -12,6 +12,20 @@ def read_alerts():
     alerts = alert_service.get_latest_alerts()
     return {"alerts": alerts}
 
+@router.get("/ingest-stats")
+def get_ingest_stats():
+    """
+    Counters of the eve.json consumer: lines seen, lines skipped by the raw event_type
+    pre-filter, lines fully decoded and alerts parsed, the dedup window counters and the tailer
+    position of each log.
+    """
+    return {
+        "accepted_event_types": sorted(log_parser.ACCEPTED_EVENT_TYPES),
+        "suricata": dict(log_parser.INGEST_STATS),
+        "deduplication": log_parser.alert_aggregator.snapshot(),
+        "tailer": log_tailer.tailer.stats(),
+    }
+
 # This is the new endpoint for Suricata flow data
 @router.get("/api/suricata/flows", response_model=List[schemas.SuricataFlowSchema], tags=["Suricata"])
 def get_suricata_flows():
@@ -1,55 +1,354 @@
 # app/routers/connection_manager.py
 # (FINAL, WORKING VERSION)
 from fastapi import WebSocket
+from collections import deque
 import logging
 import asyncio
+import threading
+import time
+import json
+import ipaddress
+
+from app.config import settings
+from app.services import ws_codec
 
 logger = logging.getLogger(__name__)
 
+
+TOPICS = ("packets", "alerts", "scan_progress")
+
+
+class SubscriptionFilter:
+    """
+    Compiled predicate of a client subscription. Every criterion that is given must
+    match (AND); inside a criterion any value may match (OR). IPs/CIDRs and ports are
+    checked against both the source and the destination of the event.
+    """
+    def __init__(self, ips=None, ports=None, protocols=None):
+        self.networks = tuple(ipaddress.ip_network(value, strict=False) for value in _as_list(ips))
+        self.ports = frozenset(int(port) for port in _as_list(ports))
+        self.protocols = frozenset(str(protocol).upper() for protocol in _as_list(protocols))
+
+    @classmethod
+    def from_message(cls, spec: dict):
+        spec = spec or {}
+        if not isinstance(spec, dict):
+            raise ValueError("filter must be an object with ip/port/protocol keys")
+        return cls(ips=spec.get("ip") or spec.get("ips"), ports=spec.get("port") or spec.get("ports"),
+                   protocols=spec.get("protocol") or spec.get("protocols"))
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.networks or self.ports or self.protocols)
+
+    def key(self) -> tuple:
+        """Canonical form: two clients with the same key share evaluation and serialization."""
+        return (tuple(sorted(str(network) for network in self.networks)), tuple(sorted(self.ports)), tuple(sorted(self.protocols)))
+
+    def matches(self, event: dict) -> bool:
+        if self.protocols and str(event.get("protocol") or "").upper() not in self.protocols:
+            return False
+        if self.ports and event.get("source_port") not in self.ports and event.get("destination_port") not in self.ports:
+            return False
+        if self.networks:
+            for field in ("source_ip", "destination_ip"):
+                value = event.get(field)
+                if not value:
+                    continue
+                try:
+                    address = ipaddress.ip_address(value)
+                except ValueError:
+                    continue
+                if any(address in network for network in self.networks):
+                    return True
+            return False
+        return True
+
+    def to_dict(self) -> dict:
+        networks, ports, protocols = self.key()
+        return {"ips": list(networks), "ports": list(ports), "protocols": list(protocols)}
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+class SubscriptionGroup:
+    """All clients sharing the same topics, filter and wire encoding."""
+    def __init__(self, topics: frozenset, subscription_filter: SubscriptionFilter, encoding: str):
+        self.topics = topics
+        self.filter = subscription_filter
+        self.encoding = encoding
+        self.clients = set()
+
+    def serialize(self, message: dict, events: list = None):
+        """One payload for the whole group: a binary columnar frame for packet batches when negotiated, JSON text otherwise."""
+        if events is not None and self.encoding == "columnar" and message.get("type") == "packet_batch":
+            try:
+                return ws_codec.encode_packet_batch(events)
+            except (ValueError, KeyError, OverflowError) as e:
+                logger.warning(f"Falling back to JSON for a packet batch that cannot be encoded as columnar: {e}")
+        if events is not None:
+            message = {**message, "data": events}
+        return json.dumps(message, default=str)
+
+
+class ClientConnection:
+    """
+    One connected WebSocket client with its own bounded outbound queue.
+    When the client cannot keep up, the oldest queued frames are dropped so
+    it always receives the most recent data without holding anyone else back.
+    """
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.websocket = websocket
+        self.queue = deque(maxlen=max_queue)  # (enqueued_at, text or binary frame)
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.group_key = None
+        self.encoding = "json"
+        self.connected_at = time.time()
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    def enqueue(self, message):
+        if len(self.queue) == self.queue.maxlen:
+            self.frames_dropped += 1  # deque(maxlen) discards the oldest frame on append
+        self.queue.append((time.monotonic(), message))
+        self.wakeup.set()
+
+    def stats(self) -> dict:
+        client = self.websocket.client
+        return {
+            "client": f"{client.host}:{client.port}" if client else None,
+            "connected_since": self.connected_at,
+            "queued_frames": len(self.queue),
+            "frames_sent": self.frames_sent,
+            "frames_dropped": self.frames_dropped,
+            "last_lag_ms": self.last_lag_ms,
+            "max_lag_ms": self.max_lag_ms,
+            "encoding": self.encoding,
+            "subscription": {"topics": sorted(self.group_key[0]), "filter": dict(zip(("ips", "ports", "protocols"), map(list, self.group_key[1])))} if self.group_key else None,
+        }
+
+
 class ConnectionManager:
     """
     Manages active WebSocket connections and provides a simple way to broadcast
     messages to all connected clients.
+
+    Every client gets its own sender task, so a slow browser only ever delays
+    itself. Live packets are not sent one by one: producer threads hand them to
+    `publish_packets`, and a broadcaster task coalesces them into one
+    `packet_batch` frame per tick (WS_BROADCAST_HZ).
+
+    Clients may narrow what they receive by sending
+    `{"action": "subscribe", "topics": [...], "filter": {"ip": ..., "port": ..., "protocol": ...}}`.
+    Clients with identical subscriptions form a group: each event is filtered and
+    serialized once per group, not once per client. Clients that never subscribe
+    receive every topic unfiltered. Adding `"encoding": "columnar"` to the subscribe
+    message switches packet batches to binary frames (see services/ws_codec.py).
     """
     def __init__(self):
-        # A list to hold all active WebSocket connections
-        self.active_connections: list[WebSocket] = []
+        # Active WebSocket connections and their outbound queues
+        self.clients: dict[WebSocket, ClientConnection] = {}
+        self.groups: dict[tuple, SubscriptionGroup] = {}
+        self._loop = None
+        self._pending_packets = []
+        self._pending_lock = threading.Lock()
+        self.packets_coalesced = 0
+        self.packets_dropped = 0
+
+    @property
+    def active_connections(self) -> list:
+        return list(self.clients)
 
     async def connect(self, websocket: WebSocket):
-        """Accepts a new WebSocket connection and adds it to our list."""
+        """Accepts a new WebSocket connection and starts its sender task."""
         await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"New WebSocket client connected. Total clients: {len(self.active_connections)}")
+        self._loop = asyncio.get_running_loop()
+        client = ClientConnection(websocket, settings.WS_CLIENT_QUEUE_SIZE)
+        client.task = asyncio.create_task(self._sender(client))
+        self.clients[websocket] = client
+        self._join_group(client, frozenset(TOPICS), SubscriptionFilter())
+        logger.info(f"New WebSocket client connected. Total clients: {len(self.clients)}")
 
     def disconnect(self, websocket: WebSocket):
-        """Removes a WebSocket connection from our list when a client disconnects."""
-        self.active_connections.remove(websocket)
-        logger.info(f"WebSocket client disconnected. Total clients: {len(self.active_connections)}")
+        """Removes a WebSocket connection and stops its sender task."""
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return
+        self._leave_group(client)
+        if client.task and client.task is not asyncio.current_task():
+            client.task.cancel()
+        logger.info(f"WebSocket client disconnected. Total clients: {len(self.clients)}")
+
+    # --- Subscriptions ---
+    def _join_group(self, client: ClientConnection, topics: frozenset, subscription_filter: SubscriptionFilter):
+        self._leave_group(client)
+        key = (topics, subscription_filter.key(), client.encoding)
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = SubscriptionGroup(topics, subscription_filter, client.encoding)
+        group.clients.add(client)
+        client.group_key = key
+
+    def _leave_group(self, client: ClientConnection):
+        group = self.groups.get(client.group_key)
+        if group is None:
+            return
+        group.clients.discard(client)
+        if not group.clients:
+            del self.groups[client.group_key]
+        client.group_key = None
+
+    def handle_client_message(self, websocket: WebSocket, text: str):
+        """Applies a `subscribe` message from a client and acknowledges it on the client's queue."""
+        client = self.clients.get(websocket)
+        if client is None:
+            return
+        try:
+            message = json.loads(text)
+            if not isinstance(message, dict) or message.get("action") != "subscribe":
+                return
+            topics = message.get("topics") or TOPICS
+            if isinstance(topics, str) or not isinstance(topics, (list, tuple)):
+                raise ValueError("topics must be a list of topic names")
+            topics = frozenset(topics)
+            unknown = topics - set(TOPICS)
+            if unknown:
+                raise ValueError(f"unknown topics {sorted(unknown)}")
+            subscription_filter = SubscriptionFilter.from_message(message.get("filter"))
+            # The encoding is sticky: a later subscribe without it keeps the negotiated one.
+            encoding = message.get("encoding") or client.encoding
+            if encoding not in ws_codec.ENCODINGS:
+                raise ValueError(f"unknown encoding '{encoding}'")
+        except (ValueError, TypeError) as e:
+            client.enqueue(json.dumps({"type": "subscription_error", "error": str(e)}))
+            return
+        client.encoding = encoding
+        self._join_group(client, topics, subscription_filter)
+        client.enqueue(json.dumps({"type": "subscribed", "topics": sorted(topics), "filter": subscription_filter.to_dict(), "encoding": encoding}))
+
+    async def _sender(self, client: ClientConnection):
+        try:
+            while True:
+                await client.wakeup.wait()
+                client.wakeup.clear()
+                while client.queue:
+                    enqueued_at, message = client.queue.popleft()
+                    if isinstance(message, bytes):
+                        await client.websocket.send_bytes(message)
+                    else:
+                        await client.websocket.send_text(message)
+                    client.frames_sent += 1
+                    client.last_lag_ms = round((time.monotonic() - enqueued_at) * 1000, 2)
+                    client.max_lag_ms = max(client.max_lag_ms, client.last_lag_ms)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # This typically happens if a client closed their browser tab.
+            logger.warning(f"Failed to send message to a client (will disconnect): {e}")
+            self.disconnect(client.websocket)
+
+    def _enqueue_all(self, message: str):
+        # Client queues belong to the main event loop; hop onto it when called from elsewhere.
+        if self._loop is not None and self._loop.is_running():
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is not self._loop:
+                self._loop.call_soon_threadsafe(self._enqueue_all, message)
+                return
+        for client in list(self.clients.values()):
+            client.enqueue(message)
 
     async def broadcast(self, message: str):
         """
-        Broadcasts a text message to all currently connected WebSocket clients.
-        
-        This is an 'async' function, making it directly compatible with the
-        'asyncio.run()' call from our background log-parsing thread.
+        Queues a text message for every currently connected WebSocket client.
+        Returns immediately; each client's sender task delivers it at its own pace.
+        """
+        self._enqueue_all(message)
+
+    def publish_event(self, topic: str, message: dict, events: list = None):
         """
-        # We don't want a single disconnected client to stop the broadcast to others,
-        # so we iterate safely.
-        
-        disconnected_clients = []
-        for connection in self.active_connections:
+        Sends `message` to every subscription group of `topic` whose filter accepts it.
+        When `events` is given, `message["data"]` is replaced per group by the events
+        that pass its filter (groups left with nothing are skipped). Thread-safe.
+        """
+        if self._loop is not None and self._loop.is_running():
             try:
-                # The 'await' is crucial. It sends the message.
-                await connection.send_text(message)
-            except Exception as e:
-                # This typically happens if a client closed their browser tab.
-                # We can't send a message to a closed connection.
-                logger.warning(f"Failed to send message to a client (will disconnect): {e}")
-                disconnected_clients.append(connection)
-
-        # Clean up any connections that broke during the broadcast.
-        for client in disconnected_clients:
-            self.active_connections.remove(client)
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is not self._loop:
+                self._loop.call_soon_threadsafe(self.publish_event, topic, message, events)
+                return
+        for group in list(self.groups.values()):
+            if topic not in group.topics:
+                continue
+            if events is not None:
+                selected = events if group.filter.is_empty else [event for event in events if group.filter.matches(event)]
+                if not selected:
+                    continue
+                payload = group.serialize(message, selected)
+            else:
+                if not group.filter.matches(message.get("data") or {}):
+                    continue
+                payload = group.serialize(message)
+            for client in list(group.clients):
+                client.enqueue(payload)
+
+    def publish_scan_progress(self, scan: str, status: str, target: str = None, completed: int = None, total: int = None):
+        """
+        Thread-safe: one `scan_progress` event from a scanner ("started", "running",
+        "complete" or "error"). The scanned host is the event's destination_ip, so IP
+        filters apply to it.
+        """
+        self.publish_event("scan_progress", {"type": "scan_progress", "data": {
+            "scan": scan, "status": status, "target": target, "destination_ip": target,
+            "completed": completed, "total": total, "timestamp": time.time(),
+        }})
+
+    # --- Coalesced live packet stream ---
+    def publish_packets(self, packets: list):
+        """Thread-safe: hands packets to the broadcaster, which sends them on its next tick."""
+        if not packets:
+            return
+        with self._pending_lock:
+            self._pending_packets.extend(packets)
+            overflow = len(self._pending_packets) - settings.WS_MAX_PACKETS_PER_FRAME
+            if overflow > 0:
+                # Keep the newest packets; the live view only ever shows the latest ones.
+                del self._pending_packets[:overflow]
+                self.packets_dropped += overflow
+
+    async def run_packet_broadcaster(self):
+        """Sends the packets published since the last tick as one `packet_batch` frame."""
+        self._loop = asyncio.get_running_loop()
+        interval = 1.0 / max(0.1, settings.WS_BROADCAST_HZ)
+        while True:
+            await asyncio.sleep(interval)
+            with self._pending_lock:
+                packets, self._pending_packets = self._pending_packets, []
+            if not packets or not self.clients:
+                continue
+            self.packets_coalesced += len(packets)
+            self.publish_event("packets", {"type": "packet_batch"}, events=packets)
+
+    def stats(self) -> dict:
+        return {
+            "clients": [client.stats() for client in self.clients.values()],
+            "subscription_groups": len(self.groups),
+            "broadcast_hz": settings.WS_BROADCAST_HZ,
+            "client_queue_size": settings.WS_CLIENT_QUEUE_SIZE,
+            "packets_coalesced": self.packets_coalesced,
+            "packets_dropped": self.packets_dropped,
+        }
 
 
 # Create a single, global instance of the manager that will be imported
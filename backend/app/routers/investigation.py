@@ -1,33 +1,21 @@
 # backend/app/routers/investigation.py
 
-from fastapi import APIRouter, Depends, HTTPException, Body
-from elasticsearch import Elasticsearch, ConnectionError as ESConnectionError, RequestError
+from fastapi import APIRouter, HTTPException, Body, Query
+from fastapi.responses import StreamingResponse
+from elasticsearch import ConnectionError as ESConnectionError, NotFoundError, RequestError
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from app.config import settings
+from app.services import es_export
+from app.services.query_cache import query_cache, normalize_key
+from app.services.es_metadata import index_metadata
 
 router = APIRouter(
     prefix="/api/v1/investigation",
     tags=["Investigation Workbench"],
 )
 
-# Dependency to get an Elasticsearch client instance
-def get_es_client():
-    """Provides a managed Elasticsearch client."""
-    try:
-        client = Elasticsearch(
-            settings.ELASTICSEARCH_URI,
-            retry_on_timeout=True,
-            max_retries=3
-        )
-        yield client
-    except ESConnectionError as e:
-        raise HTTPException(status_code=503, detail=f"Could not connect to Elasticsearch: {e}")
-    finally:
-        if 'client' in locals():
-            client.close()
-
 class SearchQuery(BaseModel):
     """Defines the structure for a search API request."""
     query_string: str = Field(..., example="protocol:TCP AND destination_port:443", description="Query using Lucene syntax.")
@@ -35,54 +23,166 @@ class SearchQuery(BaseModel):
     size: int = Field(default=100, ge=1, le=1000, description="Number of results to return.")
     index: str = Field(default="netguard-packets", description="Elasticsearch index to search.")
 
+class PageQuery(SearchQuery):
+    """A search read page by page through a server-side cursor."""
+    fields: Optional[List[str]] = Field(default=None, description="_source fields to return (default: all).")
+
+class ExportQuery(BaseModel):
+    """A search streamed back in full as NDJSON or CSV."""
+    query_string: str = Field(..., example="protocol:TCP AND destination_port:443", description="Query using Lucene syntax.")
+    time_range_hours: int = Field(default=24, ge=1, description="Time range in hours to search back from now.")
+    index: str = Field(default="netguard-packets", description="Elasticsearch index to search.")
+    fields: Optional[List[str]] = Field(default=None, description="_source fields to export (default: all; CSV then uses the fields of the first page).")
+    format: str = Field(default="ndjson", regex="^(ndjson|csv)$", description="ndjson or csv.")
+    limit: Optional[int] = Field(default=None, ge=1, description="Stop after this many documents (default: all).")
+
+
+def _raise_for_es_error(e: Exception, index: str):
+    """Maps an Elasticsearch error onto the matching HTTP error."""
+    if isinstance(e, HTTPException):
+        raise e
+    if isinstance(e, NotFoundError):
+        index_metadata.invalidate(index)
+        raise HTTPException(status_code=404, detail=f"No Elasticsearch index matches '{index}'.")
+    if isinstance(e, RequestError):
+        # This catches errors from Elasticsearch if the query_string is malformed
+        try:
+            reason = e.info['error']['root_cause'][0]['reason']
+        except (KeyError, IndexError, TypeError):
+            reason = str(e.error)
+        raise HTTPException(status_code=400, detail=f"Invalid search query syntax: {reason}")
+    if isinstance(e, ESConnectionError):
+        raise HTTPException(status_code=503, detail=f"Elasticsearch connection error: {e}")
+    raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
 @router.post("/query", response_model=List[Dict[str, Any]])
-def search_network_data(
-    query: SearchQuery = Body(...), 
-    es: Elasticsearch = Depends(get_es_client)
-):
+async def search_network_data(query: SearchQuery = Body(...)):
     """
     Perform a flexible search query against stored network data in Elasticsearch.
     This is the primary endpoint for the 'Investigation' page.
+    Results are cached for the rest of the clock hour (see services/query_cache.py).
     """
-    try:
+    async def fetch():
         # Construct the Elasticsearch query body
         es_query = {
-            "query": {
-                "bool": {
-                    "must": {
-                        "query_string": {
-                            "query": query.query_string,
-                            "analyze_wildcard": True,
-                            "time_zone": "UTC"
-                        }
-                    },
-                    "filter": {
-                        "range": {
-                            "@timestamp": {
-                                "gte": f"now-{query.time_range_hours}h/h",
-                                "lte": "now/h"
-                            }
-                        }
-                    }
-                }
-            },
+            "query": es_export.build_query(query.query_string, query.time_range_hours),
             "sort": [
                 {"@timestamp": {"order": "desc", "unmapped_type": "boolean"}}
             ]
         }
         
-        response = es.search(
-            index=query.index,
+        response = await index_metadata.async_search(
+            query.index,
             body=es_query,
             size=query.size
         )
+        if response is None:
+            raise HTTPException(status_code=404, detail=f"No Elasticsearch index matches '{query.index}'.")
         # Extract and return the source document for each hit
         return [hit['_source'] for hit in response['hits']['hits']]
 
-    except RequestError as e:
-        # This catches errors from Elasticsearch if the query_string is malformed
-        raise HTTPException(status_code=400, detail=f"Invalid search query syntax: {e.info['error']['root_cause'][0]['reason']}")
+    try:
+        key = normalize_key(query.query_string, query.index, query.time_range_hours, query.size)
+        return await query_cache.get_or_fetch(key, fetch)
+    except Exception as e:
+        _raise_for_es_error(e, query.index)
+
+@router.get("/query/cache", response_model=Dict[str, Any])
+async def get_query_cache_stats():
+    """Size and hit/miss counters of the /query result cache."""
+    return query_cache.snapshot()
+
+@router.delete("/query/cache", status_code=204)
+async def clear_query_cache():
+    """Drops every cached /query result (e.g. after re-indexing)."""
+    query_cache.clear()
+
+
+# --- Paging and export (point in time + search_after, services/es_export.py) ---
+async def _page_response(token: str, pager: es_export.PitPager) -> Dict[str, Any]:
+    hits = await pager.next_page()
+    if pager.exhausted:
+        await es_export.cursors.discard(token)
+    return {"cursor": None if pager.exhausted else token, "hits": [hit['_source'] for hit in hits]}
+
+@router.post("/query/page", response_model=Dict[str, Any])
+async def start_paged_search(query: PageQuery = Body(...)):
+    """
+    Runs a search and returns its first `size` hits with a cursor for the next page.
+    The cursor is null once the results are exhausted; unused cursors expire after
+    INVESTIGATION_PIT_KEEP_ALIVE_SECONDS.
+    """
+    pager = es_export.PitPager(query.index, es_export.build_query(query.query_string, query.time_range_hours), source=query.fields, page_size=query.size)
+    try:
+        await pager.open()
+        token = await es_export.cursors.add(pager)
+        return await _page_response(token, pager)
+    except Exception as e:
+        await pager.close()
+        _raise_for_es_error(e, query.index)
+
+@router.get("/query/page/{cursor}", response_model=Dict[str, Any])
+async def next_search_page(cursor: str):
+    """The next page of a search started with POST /query/page."""
+    pager = await es_export.cursors.get(cursor)
+    if pager is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired cursor.")
+    try:
+        return await _page_response(cursor, pager)
+    except Exception as e:
+        await es_export.cursors.discard(cursor)
+        _raise_for_es_error(e, pager.index)
+
+@router.delete("/query/page/{cursor}", status_code=204)
+async def close_search_cursor(cursor: str):
+    """Releases a cursor (and its point in time) before it expires."""
+    await es_export.cursors.discard(cursor)
+
+@router.post("/export")
+async def export_network_data(query: ExportQuery = Body(...)):
+    """
+    Streams every hit of a search as NDJSON (one _source per line) or CSV, one page of
+    INVESTIGATION_EXPORT_PAGE_SIZE hits at a time, so memory use does not grow with the result.
+    """
+    pager = es_export.PitPager(
+        query.index, es_export.build_query(query.query_string, query.time_range_hours),
+        source=query.fields, page_size=settings.INVESTIGATION_EXPORT_PAGE_SIZE, limit=query.limit,
+    )
+    try:
+        # The first page is fetched before responding, so query errors still get a proper status code.
+        await pager.open()
+        first_page = await pager.next_page()
+    except Exception as e:
+        await pager.close()
+        _raise_for_es_error(e, query.index)
+    columns = es_export.csv_columns(first_page, query.fields) if query.format == "csv" else None
+
+    async def chunks():
+        try:
+            hits = first_page
+            if columns is not None:
+                yield es_export.csv_chunk(hits, columns, header=True)
+            else:
+                yield es_export.ndjson_chunk(hits)
+            while not pager.exhausted:
+                hits = await pager.next_page()
+                yield es_export.csv_chunk(hits, columns) if columns is not None else es_export.ndjson_chunk(hits)
+        except Exception as e:
+            print(f"ERROR: Investigation export of '{query.index}' stopped after {pager.returned} documents: {e}")
+        finally:
+            await pager.close()
+
+    media_type = "text/csv" if query.format == "csv" else "application/x-ndjson"
+    filename = f"investigation-export.{query.format}"
+    return StreamingResponse(chunks(), media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@router.get("/fields", response_model=Dict[str, str])
+def get_index_fields(index: str = Query("netguard-packets", description="Elasticsearch index or pattern.")):
+    """
+    Searchable fields of an index (field path -> mapped type), for building query strings.
+    Served from the index metadata cache.
+    """
+    try:
+        return index_metadata.fields(index)
     except ESConnectionError as e:
         raise HTTPException(status_code=503, detail=f"Elasticsearch connection error: {e}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
\ No newline at end of file
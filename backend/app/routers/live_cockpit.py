@@ -1,22 +1,18 @@
 # backend/app/routers/live_cockpit.py (FINAL CORRECTED VERSION)
 
-from fastapi import APIRouter, Depends, HTTPException
+import time
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session, joinedload
-from typing import List, Dict, Any
-from elasticsearch import Elasticsearch
+from typing import List, Dict, Any, Optional
+from elasticsearch import ConnectionError as ESConnectionError
 
 from app import models
 from app import schemas
 from app.database import SessionLocal
 from app.config import settings
-
-try:
-    es = Elasticsearch(settings.ELASTICSEARCH_URI)
-    if not es.ping():
-        raise ConnectionError("Could not connect to Elasticsearch")
-except Exception as e:
-    print(f"CRITICAL: Elasticsearch connection failed. API will not work. Error: {e}")
-    es = None
+from app.services.es_metadata import index_metadata
+from app.services import bandwidth_store, es_provider
+from app.state import app_state
 
 # --- ROUTING FIX: REMOVED the prefix from here. main.py will handle it. ---
 router = APIRouter(
@@ -31,13 +27,55 @@ def get_db():
         db.close()
 
 # Note: The path is now relative. It will be prefixed by /api/v1/cockpit in main.py
+# Bandwidth is served from the in-process round-robin store fed by the packet handler
+# (services/bandwidth_store.py); Elasticsearch (Zeek) is only used until that store runs.
 @router.get("/bandwidth", response_model=List[Dict[str, Any]])
-def get_live_bandwidth_from_es():
+async def get_live_bandwidth(interface: Optional[str] = None, protocol: Optional[str] = None):
+    """Ingress/egress bytes per second over the last 60 seconds."""
+    store = app_state.bandwidth_store
+    if store is None:
+        return await get_live_bandwidth_from_es()
+    now = time.time()
+    return store.query(now - 60, now, resolution="1s", interface=interface, protocol=protocol)["points"]
+
+
+@router.get("/bandwidth/range", response_model=Dict[str, Any])
+def get_bandwidth_range(
+    minutes: int = Query(60, ge=1, le=43200, description="Window ending now, when start is not given."),
+    start: Optional[float] = Query(None, description="Epoch seconds."),
+    end: Optional[float] = Query(None, description="Epoch seconds, default now."),
+    resolution: Optional[str] = Query(None, regex="^(1s|1m|1h)$", description="Default: the finest one covering the window."),
+    interface: Optional[str] = None,
+    protocol: Optional[str] = None,
+):
+    """Ingress/egress bytes and packets per bucket over a time range, from the bandwidth store."""
+    store = app_state.bandwidth_store
+    if store is None:
+        raise HTTPException(status_code=503, detail="The packet pipeline is not running.")
+    end = end if end is not None else time.time()
+    start = start if start is not None else end - minutes * 60
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end.")
+    step, slots = bandwidth_store.RESOLUTIONS[resolution or store.resolution_for(start)]
+    if (end - start) / step > slots:
+        raise HTTPException(status_code=400, detail=f"At most {slots} buckets of {step}s per request; use a coarser resolution.")
+    return store.query(start, end, resolution=resolution, interface=interface, protocol=protocol)
+
+
+@router.get("/bandwidth/series", response_model=Dict[str, Any])
+def get_bandwidth_series():
+    """Interfaces and protocols seen by the bandwidth store, with its archive geometry and counters."""
+    store = app_state.bandwidth_store
+    if store is None:
+        return {"series": []}
+    return {"series": store.series_keys(), **store.snapshot()}
+
+
+async def get_live_bandwidth_from_es():
     # ... (function content is unchanged and correct) ...
-    if not es: raise HTTPException(status_code=503, detail="Elasticsearch service is not available.")
     query = { "size": 0, "query": { "bool": { "filter": [ { "term": { "log_source": "zeek" } }, { "exists": { "field": "uid" } }, { "range": { "@timestamp": { "gte": "now-60s", "lte": "now" } } } ] } }, "aggs": { "bandwidth_over_time": { "date_histogram": { "field": "@timestamp", "fixed_interval": "1s", "min_doc_count": 0, "extended_bounds": { "min": "now-60s", "max": "now" } }, "aggs": { "ingress_bytes": { "sum": { "field": "resp_ip_bytes" } }, "egress_bytes": { "sum": { "field": "orig_ip_bytes" } } } } } }
     try:
-        response = es.search(index="netguard-zeek-*", body=query)
+        response = await index_metadata.async_search("netguard-zeek-*", body=query) or {}
         buckets = response.get('aggregations', {}).get('bandwidth_over_time', {}).get('buckets', [])
         if not buckets: return []
         chart_data = []
@@ -47,17 +85,19 @@ def get_live_bandwidth_from_es():
             egress = bucket.get('egress_bytes', {}).get('value', 0)
             chart_data.append({"time": ts_seconds, "in": ingress or 0, "out": egress or 0})
         return chart_data
+    except ESConnectionError as e:
+        print(f"Elasticsearch is not available for bandwidth: {e}")
+        raise HTTPException(status_code=503, detail="Elasticsearch service is not available.")
     except Exception as e:
         print(f"Error querying Elasticsearch for bandwidth: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve bandwidth data from Elasticsearch")
 
 @router.get("/security-posture", response_model=Dict[str, Any])
-def get_security_posture():
+async def get_security_posture():
     # ... (function content is unchanged and correct) ...
-    if not es: raise HTTPException(status_code=503, detail="Elasticsearch service is not available.")
     query = { "query": { "bool": { "must": [ { "term": { "log_source": "suricata" } }, { "term": { "suricata.alert.severity": 1 } }, { "range": { "@timestamp": { "gte": "now-24h", "lte": "now" } } } ] } } }
     try:
-        response = es.count(index="netguard-suricata-*", body=query)
+        response = await es_provider.count(index="netguard-suricata-*", body=query)
         critical_alert_count = response.get('count', 0)
         final_score = max(0, 100 - (critical_alert_count * 5))
         return {"health_score": final_score, "critical_alerts_24h": critical_alert_count}
@@ -3,10 +3,14 @@
 # ### --- START OF CHANGES --- ###
 # We no longer need Elasticsearch in this file.
 # We DO need dependencies and models for PostgreSQL.
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional, Dict, Any
+from sqlalchemy import or_, func
 from sqlalchemy.orm import Session
 from .. import schemas, dependencies, models
+from app.services import packet_capture
+from app.state import app_state
 # ### --- END OF CHANGES --- ###
 
 router = APIRouter()
@@ -16,19 +20,35 @@ router = APIRouter()
 # We will use the existing get_db dependency.
 
 @router.get("", response_model=List[schemas.PacketSchema])
-def get_all_packets(db: Session = Depends(dependencies.get_db), limit: int = 100):
+def get_all_packets(
+    db: Session = Depends(dependencies.get_db),
+    limit: int = 100,
+    ip: Optional[str] = Query(None, description="Matches the source or destination IP"),
+    port: Optional[int] = Query(None, description="Matches the source or destination port"),
+    protocol: Optional[str] = None,
+):
     """
-    Retrieves the most recent captured packets from PostgreSQL.
+    Retrieves the most recent captured packets, optionally filtered. Served from the packet
+    handler's in-memory ring; PostgreSQL is only queried when the ring holds fewer matches
+    than requested.
     """
+    recent_packets = app_state.recent_packets
+    if recent_packets is not None:
+        cached = recent_packets.query(limit, ip=ip, port=port, protocol=protocol)
+        if cached is not None:
+            return cached
+
     try:
         # Query the NetworkPacket table in PostgreSQL
         # Order by timestamp descending to get the latest packets first
-        packets = (
-            db.query(models.NetworkPacket)
-            .order_by(models.NetworkPacket.timestamp.desc())
-            .limit(limit)
-            .all()
-        )
+        query = db.query(models.NetworkPacket)
+        if ip:
+            query = query.filter(or_(models.NetworkPacket.source_ip == ip, models.NetworkPacket.destination_ip == ip))
+        if port is not None:
+            query = query.filter(or_(models.NetworkPacket.source_port == port, models.NetworkPacket.destination_port == port))
+        if protocol:
+            query = query.filter(models.NetworkPacket.protocol == protocol.upper())
+        packets = query.order_by(models.NetworkPacket.timestamp.desc()).limit(limit).all()
         
         # We need to manually convert the @timestamp field name
         # to match the schema expected by the frontend.
@@ -63,30 +83,129 @@ def get_all_packets(db: Session = Depends(dependencies.get_db), limit: int = 100
 # ### --- END OF CHANGES --- ###
 
 
-# The protocol-distribution endpoint below is now correct,
-# as the packet data is being written to PostgreSQL where this query runs.
-# The warning comment can be removed.
+# The protocol distribution is served from the per-minute rollup tables that the
+# packet writer maintains (see services/traffic_rollups.py), so its cost depends on
+# the time range and not on how many raw packets are stored.
 
-from sqlalchemy import func
+def _rollup_window(start: Optional[datetime], end: Optional[datetime]):
+    """Normalizes optional bounds to naive UTC, the storage format of rollup buckets."""
+    def naive_utc(value):
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+    return naive_utc(start), naive_utc(end)
 
 @router.get("/protocol-distribution", response_model=List[schemas.ProtocolDistribution])
-def get_protocol_distribution(db: Session = Depends(dependencies.get_db)):
+def get_protocol_distribution(
+    db: Session = Depends(dependencies.get_db),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
     """
     Calculates the distribution of network traffic volume (in bytes)
-    for each protocol (TCP, UDP, ICMP, etc.) from the PostgreSQL database.
+    for each protocol (TCP, UDP, ICMP, etc.). Without bounds it covers the
+    whole retention window; `start`/`end` restrict it to a time range.
     """
     try:
-        protocol_bytes = (
-            db.query(
-                models.NetworkPacket.protocol,
-                func.sum(models.NetworkPacket.length).label("count")
-            )
-            .group_by(models.NetworkPacket.protocol)
-            .order_by(func.sum(models.NetworkPacket.length).desc())
-            .all()
-        )
+        start, end = _rollup_window(start, end)
+        rollup = models.TrafficRollupProtocol
+        query = db.query(rollup.protocol, func.sum(rollup.bytes).label("count"))
+        if start is not None:
+            query = query.filter(rollup.bucket >= start)
+        if end is not None:
+            query = query.filter(rollup.bucket < end)
+        protocol_bytes = query.group_by(rollup.protocol).order_by(func.sum(rollup.bytes).desc()).all()
         return [{"protocol": protocol, "count": count} for protocol, count in protocol_bytes]
 
     except Exception as e:
         print(f"An unexpected error occurred while fetching protocol distribution: {e}")
-        raise HTTPException(status_code=500, detail="An internal server error occurred.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="An internal server error occurred.")
+
+
+@router.get("/protocol-distribution/timeline", response_model=List[Dict[str, Any]])
+def get_protocol_timeline(db: Session = Depends(dependencies.get_db), minutes: int = Query(60, ge=1, le=10080)):
+    """
+    Returns bytes and packets per protocol for each minute of the last `minutes` minutes.
+    """
+    try:
+        since = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(minutes=minutes)
+        rollup = models.TrafficRollupProtocol
+        rows = (
+            db.query(rollup.bucket, rollup.protocol, rollup.packets, rollup.bytes)
+            .filter(rollup.bucket >= since)
+            .order_by(rollup.bucket)
+            .all()
+        )
+        return [{"time": bucket, "protocol": protocol, "packets": packets, "bytes": length} for bucket, protocol, packets, length in rows]
+    except Exception as e:
+        print(f"An unexpected error occurred while fetching the protocol timeline: {e}")
+        raise HTTPException(status_code=500, detail="An internal server error occurred.")
+
+
+@router.get("/top-conversations", response_model=List[Dict[str, Any]])
+def get_top_conversations(db: Session = Depends(dependencies.get_db), minutes: int = Query(60, ge=1, le=10080), limit: int = Query(10, ge=1, le=500)):
+    """
+    Returns the (protocol, source, destination, destination port) tuples with the most bytes
+    over the last `minutes` minutes. Requires PACKET_ROLLUP_CONVERSATIONS=true.
+    """
+    try:
+        since = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(minutes=minutes)
+        rollup = models.TrafficRollupConversation
+        total_bytes = func.sum(rollup.bytes).label("bytes")
+        rows = (
+            db.query(rollup.protocol, rollup.source_ip, rollup.destination_ip, rollup.destination_port,
+                     func.sum(rollup.packets).label("packets"), total_bytes)
+            .filter(rollup.bucket >= since)
+            .group_by(rollup.protocol, rollup.source_ip, rollup.destination_ip, rollup.destination_port)
+            .order_by(total_bytes.desc())
+            .limit(limit)
+            .all()
+        )
+        return [
+            {"protocol": protocol, "source_ip": source_ip, "destination_ip": destination_ip,
+             "destination_port": destination_port or None, "packets": packets, "bytes": length}
+            for protocol, source_ip, destination_ip, destination_port, packets, length in rows
+        ]
+    except Exception as e:
+        print(f"An unexpected error occurred while fetching top conversations: {e}")
+        raise HTTPException(status_code=500, detail="An internal server error occurred.")
+
+@router.get("/pipeline", response_model=Dict[str, Any])
+def get_pipeline_stats():
+    """
+    Returns live counters of the packet ingest pipeline: transport depth and drops,
+    the current load-shedding mode with its drop accounting, write mode, batch size,
+    flush latency, rows written per second, the flow table occupancy and the
+    hit rate of the recent-packet ring.
+    """
+    shedder = app_state.packet_load_shedder
+    flows = app_state.packet_flow_table
+    recent_packets = app_state.recent_packets
+    return {
+        "transport": packet_capture.transport_stats(app_state.packet_transport),
+        "load_shedding": shedder.snapshot() if shedder else {},
+        "writer": dict(app_state.packet_writer_stats),
+        "flows": flows.stats() if flows else {},
+        "recent_packets": recent_packets.snapshot() if recent_packets else {},
+    }
+
+
+@router.get("/flows", response_model=List[Dict[str, Any]])
+def get_recent_flows(db: Session = Depends(dependencies.get_db), limit: int = Query(100, ge=1, le=1000)):
+    """
+    Returns the most recently finished 5-tuple flows. Populated when PACKET_PERSISTENCE is "flows" or "both".
+    """
+    try:
+        flows = db.query(models.NetworkFlow).order_by(models.NetworkFlow.end_time.desc()).limit(limit).all()
+        return [
+            {
+                "start_time": flow.start_time, "end_time": flow.end_time, "protocol": flow.protocol,
+                "source_ip": flow.source_ip, "source_port": flow.source_port,
+                "destination_ip": flow.destination_ip, "destination_port": flow.destination_port,
+                "packets": flow.packets, "bytes": flow.bytes, "tcp_flags": flow.tcp_flags, "end_reason": flow.end_reason,
+            }
+            for flow in flows
+        ]
+    except Exception as e:
+        print(f"An unexpected error occurred while fetching flows: {e}")
+        raise HTTPException(status_code=500, detail="An internal server error occurred.")
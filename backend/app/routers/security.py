@@ -1,10 +1,10 @@
 # backend/app/routers/security.py
-from fastapi import APIRouter, Depends, BackgroundTasks
+from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 from app.dependencies import get_db
 from app import models, schemas
-from app.services import evasive_scanner
+from app.services import evasive_scanner, suppression
 
 
 
@@ -24,4 +24,20 @@ def start_evasive_scan(target_ip: str, background_tasks: BackgroundTasks, db: Se
     This is a non-blocking background task.
     """
     background_tasks.add_task(evasive_scanner.run_evasive_scan, target_ip)
-    return {"message": "IDS Evasion Test initiated in background. Check service logs for results.", "target": target_ip}
\ No newline at end of file
+    return {"message": "IDS Evasion Test initiated in background. Check service logs for results.", "target": target_ip}
+
+
+@router.get("/suppression")
+def get_suppression_rules():
+    """Returns the loaded CIDR suppression/allow rules with their hit counters per scope."""
+    return suppression.suppressor.snapshot()
+
+
+@router.post("/suppression/reload")
+def reload_suppression_rules():
+    """Re-reads the rules file now instead of waiting for the periodic change check."""
+    suppression.suppressor.reload(force=True)
+    snapshot = suppression.suppressor.snapshot()
+    if snapshot["last_error"]:
+        raise HTTPException(status_code=400, detail=f"Rules file is invalid, previous rules kept: {snapshot['last_error']}")
+    return snapshot
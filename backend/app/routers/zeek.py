@@ -1,8 +1,10 @@
 # backend/app/routers/zeek.py (MODIFIED)
 
-from fastapi import APIRouter
-from typing import List
-from app.services import ids_query_service
+import time
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Dict, Any, Optional
+from app.services import ids_query_service, zeek_store
+from app.state import app_state
 from app import schemas
 
 # --- START OF CACHING FIX ---
@@ -12,14 +14,28 @@ from fastapi_cache.decorator import cache
 
 router = APIRouter()
 
+# Recent windows are answered from the in-memory Zeek rings (services/zeek_store.py)
+# whenever they still hold the whole window; Elasticsearch only serves older history.
+
+
+def _ring(log: str):
+    if log not in zeek_store.LOG_SCHEMAS:
+        raise HTTPException(status_code=404, detail=f"Unknown Zeek log '{log}'. Expected one of {list(zeek_store.LOG_SCHEMAS)}.")
+    store = app_state.zeek_store
+    return store.rings[log] if store else None
+
 
 @router.get("/connections", response_model=List[schemas.ZeekConnectionSchema], tags=["Zeek"])
-async def get_zeek_connections():
+async def get_zeek_connections(limit: int = Query(1000, ge=1, le=10000)):
     """
-    Returns the most recent connection logs captured by Zeek from Elasticsearch.
+    Returns the most recent connection logs captured by Zeek, from memory when the
+    conn ring holds enough of them, otherwise from Elasticsearch.
     """
+    ring = _ring("conn")
+    if ring is not None and ring.size >= limit:
+        return ring.query(limit)
     # Increased limit to provide a better dataset for the frontend chart.
-    connections = ids_query_service.get_latest_zeek_connections(limit=1000)
+    connections = await ids_query_service.async_get_latest_zeek_connections(limit=limit)
     return connections
 
 
@@ -30,8 +46,56 @@ async def get_zeek_connections():
 @cache(expire=60) # Cache the result of this function for 60 seconds
 async def get_zeek_protocol_distribution():
     """
-    Returns the top 10 most used protocols by traffic volume from Zeek data in Elasticsearch.
+    Returns the top protocols by traffic volume over the last hour of Zeek data, from
+    memory when the conn ring covers the hour, otherwise from Elasticsearch.
     """
-    protocol_distribution = ids_query_service.get_zeek_protocol_distribution(limit=5)
+    ring = _ring("conn")
+    since = time.time() - 3600
+    if ring is not None and ring.horizon() <= since:
+        rows = ring.group_by(zeek_store.app_protocol, since=since, value_fields=("orig_ip_bytes", "resp_ip_bytes"), limit=None)
+        totals = [{"protocol": row["key"], "count": row["orig_ip_bytes"] + row["resp_ip_bytes"]} for row in rows]
+        totals.sort(key=lambda row: row["count"], reverse=True)
+        return totals[:5]
+    protocol_distribution = await ids_query_service.async_get_zeek_protocol_distribution(limit=5)
     return protocol_distribution
 # ### --- END OF CACHING FIX --- ###
+
+
+@router.get("/memory", response_model=Dict[str, Any], tags=["Zeek"])
+def get_zeek_memory_stats():
+    """Occupancy of the in-memory Zeek rings (capacity, records held, interned strings)."""
+    store = app_state.zeek_store
+    return store.stats() if store else {}
+
+
+@router.get("/{log}/recent", response_model=List[Dict[str, Any]], tags=["Zeek"])
+def get_recent_zeek_records(
+    log: str,
+    minutes: Optional[int] = Query(None, ge=1, le=1440),
+    limit: int = Query(100, ge=1, le=10000),
+    source_ip: Optional[str] = None,
+    dest_ip: Optional[str] = None,
+    dest_port: Optional[int] = None,
+):
+    """Most recent conn/dns/http/ssl records held in memory, optionally within the last `minutes` and filtered."""
+    ring = _ring(log)
+    if ring is None:
+        return []
+    since = time.time() - minutes * 60 if minutes else None
+    return ring.query(limit, since=since, id_orig_h=source_ip, id_resp_h=dest_ip, id_resp_p=dest_port)
+
+
+@router.get("/{log}/top", response_model=List[Dict[str, Any]], tags=["Zeek"])
+def get_top_zeek_values(
+    log: str,
+    field: str,
+    minutes: int = Query(60, ge=1, le=1440),
+    limit: int = Query(10, ge=1, le=1000),
+):
+    """Most frequent values of `field` (e.g. dns `query`, http `host`, ssl `server_name`) in the last `minutes`, from memory."""
+    ring = _ring(log)
+    if field not in dict(zeek_store.LOG_SCHEMAS[log]):
+        raise HTTPException(status_code=400, detail=f"Unknown field '{field}' for the {log} log.")
+    if ring is None:
+        return []
+    return ring.group_by(field, since=time.time() - minutes * 60, limit=limit)
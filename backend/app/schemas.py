@@ -86,6 +86,9 @@ class SecurityAlertSchema(OrmConfig):
     source_ip: str
     dest_ip: str = Field(..., alias='destination_ip')
     protocol: str
+    first_seen: Optional[datetime] = None
+    last_seen: Optional[datetime] = None
+    count: int = 1
 
 class ThreatIntelSummarySchema(BaseModel):
     source: str
@@ -0,0 +1,106 @@
+# backend/app/services/alert_aggregation.py
+"""
+Windowed deduplication of Suricata alerts before they reach `security_alerts`.
+
+Alerts are keyed by (signature, source IP, destination IP, destination port). The first
+hit of a key opens a window of ALERT_DEDUP_WINDOW_SECONDS (in alert time): it is stored as
+a row with its raw_log, and every further hit inside the window only bumps that row's
+`count` and `last_seen`. Keys live in an LRU bounded by ALERT_DEDUP_MAX_KEYS; keys idle
+for longer than the window are evicted as well. A window of 0 disables the merging.
+"""
+import logging
+from collections import OrderedDict
+from datetime import timedelta
+
+from sqlalchemy import text
+
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_aggregation_columns():
+    """Adds the aggregation columns to a security_alerts table created before they existed."""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "ALTER TABLE security_alerts "
+            "ADD COLUMN IF NOT EXISTS first_seen TIMESTAMP WITHOUT TIME ZONE, "
+            "ADD COLUMN IF NOT EXISTS last_seen TIMESTAMP WITHOUT TIME ZONE, "
+            "ADD COLUMN IF NOT EXISTS count INTEGER NOT NULL DEFAULT 1"
+        ))
+
+
+def alert_key(alert: dict) -> tuple:
+    return alert["signature"], alert["source_ip"], alert["destination_ip"], alert["destination_port"]
+
+
+class _Window:
+    __slots__ = ("row", "row_id", "first_seen", "last_seen", "count")
+
+    def __init__(self, row: dict):
+        self.row = row  # Column values of the stored row (the first hit)
+        self.row_id = None
+        self.first_seen = self.last_seen = row["timestamp"]
+        self.count = 1
+
+
+class AlertAggregator:
+    def __init__(self, window_seconds: float, max_keys: int):
+        self.window = timedelta(seconds=window_seconds)
+        self.max_keys = max(1, max_keys)
+        self._windows = OrderedDict()  # key -> _Window, least recently hit first
+        self.stats = {"alerts_seen": 0, "rows_created": 0, "alerts_merged": 0, "keys_evicted": 0}
+
+    def aggregate(self, alerts: list):
+        """
+        Folds a batch of parsed alerts into the open windows. Returns (new, updated): the
+        windows whose first row must be inserted, and the already stored windows whose
+        count/last_seen changed.
+        """
+        new, updated = {}, {}  # id(window) -> window
+        newest = None
+        for alert in alerts:
+            key = alert_key(alert)
+            timestamp = alert["timestamp"]
+            newest = timestamp if newest is None or timestamp > newest else newest
+            window = self._windows.get(key)
+            if window is not None and self.window and timestamp - window.first_seen <= self.window:
+                window.count += 1
+                window.last_seen = max(window.last_seen, timestamp)
+                self._windows.move_to_end(key)
+                if window.row_id is not None:
+                    updated[id(window)] = window
+                self.stats["alerts_merged"] += 1
+            else:
+                window = _Window(alert)
+                self._windows[key] = window
+                self._windows.move_to_end(key)
+                new[id(window)] = window
+                self.stats["rows_created"] += 1
+        self.stats["alerts_seen"] += len(alerts)
+        for window in new.values():
+            window.row.update(first_seen=window.first_seen, last_seen=window.last_seen, count=window.count)
+        self._evict(newest)
+        return list(new.values()), list(updated.values())
+
+    def forget(self, windows: list):
+        """Drops windows whose row could not be stored, so later hits start a fresh row."""
+        for window in windows:
+            key = alert_key(window.row)
+            if self._windows.get(key) is window:
+                del self._windows[key]
+
+    def _evict(self, newest):
+        while len(self._windows) > self.max_keys:
+            self._windows.popitem(last=False)
+            self.stats["keys_evicted"] += 1
+        # Least recently hit first: stop at the first key still inside its window.
+        while self._windows and newest is not None:
+            key, window = next(iter(self._windows.items()))
+            if newest - window.last_seen <= self.window:
+                break
+            del self._windows[key]
+            self.stats["keys_evicted"] += 1
+
+    def snapshot(self) -> dict:
+        return {"window_seconds": self.window.total_seconds(), "max_keys": self.max_keys, "open_keys": len(self._windows), **self.stats}
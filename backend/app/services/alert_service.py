@@ -1,10 +1,5 @@
 # backend/app/services/alert_service.py
-import os
-from elasticsearch import Elasticsearch
-
-# Use the environment variable for the ES host, defaulting to localhost
-es_host = os.getenv("ELASTICSEARCH_URI", "http://elasticsearch:9200")
-es_client = Elasticsearch(es_host)
+from app.services.es_metadata import index_metadata
 
 def get_latest_alerts(limit: int = 500):
     """
@@ -13,10 +8,6 @@ def get_latest_alerts(limit: int = 500):
     # The index name we discovered from our investigation
     index_name = "netguard-suricata-*"
 
-    if not es_client.indices.exists(index=index_name):
-        print(f"Index {index_name} does not exist.")
-        return []
-
     try:
         # This is the corrected query to find actual alerts
         query = {
@@ -35,7 +26,10 @@ def get_latest_alerts(limit: int = 500):
             "size": limit
         }
 
-        res = es_client.search(index=index_name, body=query)
+        res = index_metadata.search(index_name, body=query)
+        if res is None:
+            print(f"Index {index_name} does not exist.")
+            return []
         # We return the full source of each alert document
         return [hit['_source'] for hit in res['hits']['hits']]
 
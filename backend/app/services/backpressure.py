@@ -0,0 +1,120 @@
+# backend/app/services/backpressure.py
+"""
+Bounded transport and watermark-based load shedding for the live packet pipeline.
+
+Degradation policy, driven by the transport depth as a fraction of its capacity:
+
+    normal    depth <  soft watermark   every packet is persisted
+    sampling  depth >= soft watermark   1 in PACKET_SAMPLE_RATE packets is persisted
+    shedding  depth >= hard watermark   nothing is persisted until the backlog drains
+
+Every packet that reaches the handler is still counted in the per-protocol
+aggregates and broadcast, whatever the mode. Packets that do not even fit in the
+bounded transport are dropped by the producer and counted there.
+"""
+import logging
+import multiprocessing
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+MODE_NORMAL = "normal"
+MODE_SAMPLING = "sampling"
+MODE_SHEDDING = "shedding"
+
+
+class BoundedPacketQueue:
+    """
+    multiprocessing.Queue with a hard size limit whose producer never blocks:
+    when the queue is full the packet is dropped and counted in shared memory,
+    so the sniffer keeps draining the FIFO even while PostgreSQL is stalled.
+    """
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._queue = multiprocessing.Queue(maxsize=maxsize)
+        self._dropped = multiprocessing.Value('Q', 0)
+
+    def put(self, item) -> bool:
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            with self._dropped.get_lock():
+                self._dropped.value += 1
+            return False
+
+    def get(self, timeout: float = None):
+        return self._queue.get(timeout=timeout)
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped.value
+
+
+class LoadShedder:
+    """Chooses which packets of a batch are persisted, and keeps the accounting for every decision."""
+    def __init__(self, capacity: int, soft_watermark: float, hard_watermark: float, sample_rate: int):
+        self.soft_limit = int(capacity * soft_watermark)
+        self.hard_limit = int(capacity * hard_watermark)
+        self.sample_rate = max(1, sample_rate)
+        self._sample_counter = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            "mode": MODE_NORMAL, "soft_limit": self.soft_limit, "hard_limit": self.hard_limit, "sample_rate": self.sample_rate,
+            "packets_seen": 0, "packets_persisted": 0, "sampled_out": 0, "shed": 0, "unpersisted_db_unavailable": 0,
+            "mode_changes": 0, "aggregates": {},
+        }
+
+    def mode_for(self, depth: int) -> str:
+        if depth >= self.hard_limit: return MODE_SHEDDING
+        if depth >= self.soft_limit: return MODE_SAMPLING
+        return MODE_NORMAL
+
+    def select(self, batch: list, depth: int) -> list:
+        """Counts the whole batch in the aggregates and returns the packets that should be persisted."""
+        mode = self.mode_for(depth or 0)
+        with self._lock:
+            if mode != self.stats["mode"]:
+                logger.warning(f"Packet pipeline switching from '{self.stats['mode']}' to '{mode}' mode (queue depth {depth}).")
+                self.stats["mode"] = mode
+                self.stats["mode_changes"] += 1
+            aggregates = self.stats["aggregates"]
+            for packet_data in batch:
+                entry = aggregates.setdefault(packet_data.get("protocol") or "UNKNOWN", {"packets": 0, "bytes": 0})
+                entry["packets"] += 1
+                entry["bytes"] += packet_data.get("length") or 0
+            self.stats["packets_seen"] += len(batch)
+
+            if mode == MODE_NORMAL:
+                selected = batch
+            elif mode == MODE_SAMPLING:
+                selected = []
+                for packet_data in batch:
+                    if self._sample_counter % self.sample_rate == 0:
+                        selected.append(packet_data)
+                    self._sample_counter += 1
+                self.stats["sampled_out"] += len(batch) - len(selected)
+            else:
+                selected = []
+                self.stats["shed"] += len(batch)
+            return selected
+
+    def record_persisted(self, count: int):
+        with self._lock:
+            self.stats["packets_persisted"] += count
+
+    def record_unpersisted(self, count: int):
+        """Packets that were selected for persistence but could not be written (database down)."""
+        with self._lock:
+            self.stats["unpersisted_db_unavailable"] += count
+
+    def snapshot(self) -> dict:
+        """A consistent copy of the counters, safe to serialize from the API thread."""
+        with self._lock:
+            snapshot = dict(self.stats)
+            snapshot["aggregates"] = {protocol: dict(entry) for protocol, entry in self.stats["aggregates"].items()}
+            return snapshot
@@ -0,0 +1,287 @@
+# backend/app/services/bandwidth_store.py
+"""
+Round-robin (RRD-style) bandwidth time series, fed by the packet handler for every batch.
+
+Three archives, each a fixed ring of buckets:
+
+    1s   buckets for 1 hour    (3600 slots)
+    1m   buckets for 1 day     (1440 slots)
+    1h   buckets for 30 days   (720 slots)
+
+Every (interface, protocol) series keeps ingress/egress bytes and packets per slot in
+int64 `array`s; a shared per-archive array records which bucket each slot currently
+holds, so a slot is zeroed for all series when the ring wraps onto it. Packets are added
+to all three archives directly, so the coarse archives are exact sums, not averages.
+
+A packet is ingress when its destination is in BANDWIDTH_LOCAL_NETWORKS and egress
+otherwise. The interface is the capture interface tshark reports (EK input), else
+BANDWIDTH_DEFAULT_INTERFACE. The store is saved to BANDWIDTH_SNAPSHOT_FILE on
+shutdown and restored on start: one JSON header line describing the archives and their
+series, followed by the raw bytes of every int64 array in header order (no pickle, so a
+tampered snapshot cannot run code). An empty BANDWIDTH_SNAPSHOT_FILE disables persistence.
+"""
+import atexit
+import ipaddress
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from array import array
+from collections import defaultdict
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# name -> (bucket seconds, slots)
+RESOLUTIONS = {
+    "1s": (1, 3600),
+    "1m": (60, 1440),
+    "1h": (3600, 720),
+}
+COUNTERS = ("in_bytes", "out_bytes", "in_packets", "out_packets")
+SNAPSHOT_VERSION = 2
+ITEM_BYTES = array("q").itemsize
+
+
+class Archive:
+    def __init__(self, step: int, slots: int):
+        self.step = step
+        self.slots = slots
+        self.epochs = array("q", [-1]) * slots  # Bucket number held by each slot, -1 when empty
+        self.series = {}  # (interface, protocol) -> {counter: array}
+        self.newest = -1
+
+    def _new_series(self) -> dict:
+        return {counter: array("q", [0]) * self.slots for counter in COUNTERS}
+
+    def add(self, bucket: int, key: tuple, values: tuple):
+        if bucket <= self.newest - self.slots:
+            return  # Older than the ring reaches
+        slot = bucket % self.slots
+        if self.epochs[slot] != bucket:
+            if self.epochs[slot] > bucket:
+                return
+            for columns in self.series.values():
+                for column in columns.values():
+                    column[slot] = 0
+            self.epochs[slot] = bucket
+            self.newest = max(self.newest, bucket)
+        columns = self.series.get(key)
+        if columns is None:
+            columns = self.series[key] = self._new_series()
+        for counter, value in zip(COUNTERS, values):
+            columns[counter][slot] += value
+
+    def covers(self, start: float) -> bool:
+        return start >= time.time() - self.step * self.slots
+
+    def read(self, start: float, end: float, interface: Optional[str], protocol: Optional[str]) -> list:
+        """One row per bucket in [start, end], summed over the matching series."""
+        first, last = int(start) // self.step, int(end) // self.step
+        first = max(first, last - self.slots + 1)
+        selected = [columns for (series_interface, series_protocol), columns in self.series.items()
+                    if (interface is None or series_interface == interface) and (protocol is None or series_protocol == protocol)]
+        rows = []
+        for bucket in range(first, last + 1):
+            slot = bucket % self.slots
+            row = {"time": bucket * self.step, "in": 0, "out": 0, "in_packets": 0, "out_packets": 0}
+            if self.epochs[slot] == bucket:
+                for columns in selected:
+                    row["in"] += columns["in_bytes"][slot]
+                    row["out"] += columns["out_bytes"][slot]
+                    row["in_packets"] += columns["in_packets"][slot]
+                    row["out_packets"] += columns["out_packets"][slot]
+            rows.append(row)
+        return rows
+
+
+def _parse_networks(value: str) -> list:
+    networks = []
+    for cidr in value.split(","):
+        cidr = cidr.strip()
+        if not cidr:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(cidr, strict=False))
+        except ValueError as e:
+            logger.error(f"Ignoring invalid BANDWIDTH_LOCAL_NETWORKS entry '{cidr}': {e}")
+    return networks
+
+
+def _int64_array(data: memoryview, byteorder: str) -> array:
+    column = array("q")
+    column.frombytes(data)
+    if byteorder != sys.byteorder:
+        column.byteswap()
+    return column
+
+
+class BandwidthStore:
+    def __init__(self, snapshot_file: str, local_networks: str, default_interface: str):
+        self.snapshot_file = snapshot_file
+        self.default_interface = default_interface
+        self.archives = {name: Archive(step, slots) for name, (step, slots) in RESOLUTIONS.items()}
+        self.local_networks = _parse_networks(local_networks)
+        self.is_local = lru_cache(maxsize=65536)(self._is_local)
+        self.stats = {"packets": 0, "bytes": 0, "late_packets": 0}
+        self._lock = threading.Lock()
+        self._second_prefix, self._second = None, 0
+
+    def _is_local(self, address: str) -> bool:
+        try:
+            parsed = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(parsed in network for network in self.local_networks)
+
+    def _epoch_second(self, iso_timestamp: str) -> int:
+        # Packet timestamps are UTC ISO strings; consecutive packets mostly share the second.
+        prefix = iso_timestamp[:19]
+        if prefix != self._second_prefix:
+            self._second = int(datetime.fromisoformat(prefix).replace(tzinfo=timezone.utc).timestamp())
+            self._second_prefix = prefix
+        return self._second
+
+    # --- Writing ---
+    def add_packets(self, batch: list):
+        """Folds a batch of packet records into every archive."""
+        if not batch:
+            return
+        per_second = defaultdict(lambda: [0, 0, 0, 0])
+        total_bytes = 0
+        for packet_data in batch:
+            length = packet_data.get("length") or 0
+            key = (self._epoch_second(packet_data["@timestamp"]), packet_data.get("interface") or self.default_interface, packet_data.get("protocol") or "UNKNOWN")
+            counters = per_second[key]
+            if self.is_local(packet_data.get("destination_ip")):
+                counters[0] += length; counters[2] += 1
+            else:
+                counters[1] += length; counters[3] += 1
+            total_bytes += length
+        with self._lock:
+            newest = self.archives["1s"].newest
+            for (second, interface, protocol), values in per_second.items():
+                if second <= newest - RESOLUTIONS["1s"][1]:
+                    self.stats["late_packets"] += values[2] + values[3]
+                for archive in self.archives.values():
+                    archive.add(second // archive.step, (interface, protocol), values)
+            self.stats["packets"] += len(batch)
+            self.stats["bytes"] += total_bytes
+
+    # --- Reading ---
+    def resolution_for(self, start: float) -> str:
+        """The finest resolution whose ring still reaches back to `start`."""
+        for name, archive in self.archives.items():
+            if archive.covers(start):
+                return name
+        return "1h"
+
+    def query(self, start: float, end: float, resolution: Optional[str] = None, interface: Optional[str] = None, protocol: Optional[str] = None) -> dict:
+        resolution = resolution or self.resolution_for(start)
+        archive = self.archives[resolution]
+        with self._lock:
+            rows = archive.read(start, end, interface, protocol)
+        return {"resolution": resolution, "step": archive.step, "points": rows}
+
+    def series_keys(self) -> list:
+        with self._lock:
+            keys = set()
+            for archive in self.archives.values():
+                keys.update(archive.series)
+        return [{"interface": interface, "protocol": protocol} for interface, protocol in sorted(keys)]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "snapshot_file": self.snapshot_file,
+                "local_networks": [str(network) for network in self.local_networks],
+                "archives": {name: {"step": archive.step, "slots": archive.slots, "series": len(archive.series)} for name, archive in self.archives.items()},
+                **self.stats,
+            }
+
+    # --- Persistence ---
+    def save(self):
+        """Writes the archives to the snapshot file (atomically)."""
+        if not self.snapshot_file:
+            return
+        with self._lock:
+            header = {"version": SNAPSHOT_VERSION, "byteorder": sys.byteorder, "counters": list(COUNTERS), "archives": {}}
+            columns = []
+            for name, archive in self.archives.items():
+                keys = list(archive.series)
+                header["archives"][name] = {"step": archive.step, "slots": archive.slots, "newest": archive.newest, "series": [list(key) for key in keys]}
+                columns.append(archive.epochs.tobytes())
+                for key in keys:
+                    columns.extend(archive.series[key][counter].tobytes() for counter in COUNTERS)
+            data = json.dumps(header).encode() + b"\n" + b"".join(columns)
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_file) or ".", exist_ok=True)
+            temporary = f"{self.snapshot_file}.tmp"
+            with open(temporary, "wb") as f:
+                f.write(data)
+            os.replace(temporary, self.snapshot_file)
+            logger.info(f"Bandwidth store saved to '{self.snapshot_file}' ({len(data)} bytes).")
+        except OSError as e:
+            logger.error(f"Could not write bandwidth snapshot '{self.snapshot_file}': {e}")
+
+    def load(self):
+        """Restores the archives saved by `save`; archives whose geometry changed start empty."""
+        if not self.snapshot_file:
+            return
+        try:
+            with open(self.snapshot_file, "rb") as f:
+                header = json.loads(f.readline())
+                body = memoryview(f.read())
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable bandwidth snapshot '{self.snapshot_file}': {e}")
+            return
+        if not isinstance(header, dict) or header.get("version") != SNAPSHOT_VERSION or header.get("counters") != list(COUNTERS):
+            return
+        restored = {}
+        try:
+            position = 0
+            for name, saved in header["archives"].items():
+                width = saved["slots"] * ITEM_BYTES
+                end = position + width * (1 + len(saved["series"]) * len(COUNTERS))
+                if end > len(body):
+                    raise ValueError("truncated")
+                archive = self.archives.get(name)
+                if archive is not None and (saved["step"], saved["slots"]) == (archive.step, archive.slots):
+                    arrays = [_int64_array(body[start:start + width], header["byteorder"]) for start in range(position, end, width)]
+                    series = {tuple(key): dict(zip(COUNTERS, arrays[1 + i * len(COUNTERS):1 + (i + 1) * len(COUNTERS)]))
+                              for i, key in enumerate(saved["series"])}
+                    restored[name] = (arrays[0], series, saved["newest"])
+                position = end
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable bandwidth snapshot '{self.snapshot_file}': {e}")
+            return
+        with self._lock:
+            for name, (epochs, series, newest) in restored.items():
+                archive = self.archives[name]
+                archive.epochs, archive.series, archive.newest = epochs, series, newest
+        logger.info(f"Bandwidth store restored from '{self.snapshot_file}'.")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> BandwidthStore:
+    """The process-wide store, restored from the last snapshot on first use and saved at exit."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = BandwidthStore(settings.BANDWIDTH_SNAPSHOT_FILE, settings.BANDWIDTH_LOCAL_NETWORKS, settings.BANDWIDTH_DEFAULT_INTERFACE)
+                store.load()
+                atexit.register(store.save)
+                _store = store
+    return _store
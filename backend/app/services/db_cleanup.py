@@ -4,35 +4,51 @@ import logging
 import time
 from datetime import datetime, timedelta, timezone
 from app.database import SessionLocal
-from app.models import NetworkPacket
+from app.models import TrafficRollupProtocol, TrafficRollupConversation, NetworkFlow
+from app.services import db_partitions
 
 logger = logging.getLogger(__name__)
 
 # --- CONFIGURATION ---
 RETENTION_DAYS = 7  # Keep 7 days of packet data
-CLEANUP_INTERVAL_SECONDS = 86400  # Run once every 24 hours
+ROLLUP_RETENTION_DAYS = RETENTION_DAYS  # Same window, so the all-time distribution matches the raw packets
+CLEANUP_INTERVAL_SECONDS = 3600  # Cheap now (catalog operations only), so run every hour
+DETACH_ONLY = False  # True keeps expired partitions as standalone tables (e.g. for archiving) instead of dropping them
 
 def delete_old_packets():
     """
-    Connects to the database and deletes records from the network_packets table
-    that are older than the specified retention period.
+    Manages the lifecycle of the daily network_packets partitions: creates the
+    upcoming ones and detaches/drops those older than the retention period.
+    """
+    try:
+        db_partitions.ensure_partitions()
+        logger.info(f"Running cleanup task. Expiring packet partitions older than {RETENTION_DAYS} days...")
+        removed = db_partitions.drop_expired_partitions(RETENTION_DAYS, detach_only=DETACH_ONLY)
+        action = "Detached" if DETACH_ONLY else "Dropped"
+        logger.info(f"Cleanup complete. {action} {len(removed)} expired packet partitions: {removed}")
+        expire_old_rollups()
+    except Exception as e:
+        logger.error(f"An error occurred during database cleanup: {e}", exc_info=True)
+
+
+def expire_old_rollups():
+    """
+    Deletes traffic rollup rows older than ROLLUP_RETENTION_DAYS and flows older than
+    RETENTION_DAYS. Both are orders of magnitude smaller than raw packets, so a DELETE is fine.
     """
     db = None
     try:
         db = SessionLocal()
-        retention_period = datetime.now(timezone.utc) - timedelta(days=RETENTION_DAYS)
-        
-        logger.info(f"Running cleanup task. Deleting packets older than {retention_period.isoformat()}...")
-        
-        rows_deleted = db.query(NetworkPacket).filter(
-            NetworkPacket.timestamp < retention_period
-        ).delete(synchronize_session=False)
-
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=ROLLUP_RETENTION_DAYS)).replace(tzinfo=None)
+        rows_deleted = 0
+        for model in (TrafficRollupProtocol, TrafficRollupConversation):
+            rows_deleted += db.query(model).filter(model.bucket < cutoff).delete(synchronize_session=False)
+        flow_cutoff = (datetime.now(timezone.utc) - timedelta(days=RETENTION_DAYS)).replace(tzinfo=None)
+        flows_deleted = db.query(NetworkFlow).filter(NetworkFlow.end_time < flow_cutoff).delete(synchronize_session=False)
         db.commit()
-        logger.info(f"Cleanup complete. Deleted {rows_deleted} old packet records.")
-
+        logger.info(f"Deleted {rows_deleted} traffic rollup rows older than {ROLLUP_RETENTION_DAYS} days and {flows_deleted} flows older than {RETENTION_DAYS} days.")
     except Exception as e:
-        logger.error(f"An error occurred during database cleanup: {e}", exc_info=True)
+        logger.error(f"An error occurred while expiring traffic rollups: {e}", exc_info=True)
         if db:
             db.rollback()
     finally:
@@ -49,4 +65,4 @@ def db_cleanup_loop():
     time.sleep(60) # Initial delay to let the app fully start up
     while True:
         delete_old_packets()
-        time.sleep(CLEANUP_INTERVAL_SECONDS)
\ No newline at end of file
+        time.sleep(CLEANUP_INTERVAL_SECONDS)
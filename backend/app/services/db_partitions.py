@@ -0,0 +1,110 @@
+# backend/app/services/db_partitions.py
+"""
+Lifecycle of the daily range partitions of `network_packets`.
+
+    network_packets                 partitioned parent (RANGE on "timestamp")
+    network_packets_pYYYYMMDD       one partition per UTC day, created ahead of time
+    network_packets_default         catches rows outside every daily range (clock skew...)
+
+Retention is a DETACH + DROP of whole expired partitions instead of a DELETE scan.
+"""
+import logging
+from datetime import datetime, date, timedelta, timezone
+
+from sqlalchemy import text
+
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "network_packets"
+LEGACY_TABLE = "network_packets_legacy"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+PARTITION_PREFIX = f"{PARENT_TABLE}_p"
+PARTITION_DAYS_AHEAD = 3  # Partitions for today and the next N days always exist
+
+
+def partition_name(day: date) -> str:
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def _partition_day(name: str):
+    try:
+        return datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def migrate_legacy_table():
+    """
+    Renames a pre-partitioning (plain) network_packets table, with its sequence and
+    indexes, out of the way so create_all can build the partitioned parent. The legacy
+    table stays queryable and is dropped by retention once all of its rows are expired.
+    """
+    with engine.begin() as conn:
+        relkind = conn.execute(text("SELECT relkind FROM pg_class WHERE relname = :name AND relkind IN ('r', 'p')"), {"name": PARENT_TABLE}).scalar()
+        if relkind != 'r':
+            return
+        logger.warning(f"Found unpartitioned '{PARENT_TABLE}' table. Renaming it to '{LEGACY_TABLE}' before creating the partitioned table.")
+        conn.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {LEGACY_TABLE}"))
+        conn.execute(text(f"ALTER SEQUENCE IF EXISTS {PARENT_TABLE}_id_seq RENAME TO {LEGACY_TABLE}_id_seq"))
+        conn.execute(text(f"ALTER INDEX IF EXISTS {PARENT_TABLE}_pkey RENAME TO {LEGACY_TABLE}_pkey"))
+        conn.execute(text(f"ALTER INDEX IF EXISTS ix_{PARENT_TABLE}_id RENAME TO ix_{LEGACY_TABLE}_id"))
+
+
+def ensure_partitions(days_ahead: int = PARTITION_DAYS_AHEAD):
+    """Creates the default partition and the daily partitions from yesterday up to `days_ahead` days from now."""
+    today = datetime.now(timezone.utc).date()
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"))
+    for offset in range(-1, days_ahead + 1):
+        day = today + timedelta(days=offset)
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF {PARENT_TABLE} "
+                    f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+                ))
+        except Exception as e:
+            # Typically: the default partition already holds rows for this day.
+            logger.error(f"Could not create packet partition for {day}: {e}")
+
+
+def list_partitions() -> list:
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :parent ORDER BY child.relname"
+        ), {"parent": PARENT_TABLE}).all()
+    return [row[0] for row in rows]
+
+
+def drop_expired_partitions(retention_days: int, detach_only: bool = False) -> list:
+    """
+    Detaches (and unless `detach_only`, drops) every daily partition whose whole day is
+    older than the retention window. Rows that landed in the default partition and the
+    legacy table are expired with a DELETE / DROP, as they are not covered by a daily range.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    removed = []
+    for name in list_partitions():
+        day = _partition_day(name)
+        if day is None or day + timedelta(days=1) > cutoff.date():
+            continue
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            if not detach_only:
+                conn.execute(text(f"DROP TABLE {name}"))
+        removed.append(name)
+
+    cutoff_naive = cutoff.replace(tzinfo=None)  # "timestamp" is stored without time zone, in UTC
+    with engine.begin() as conn:
+        conn.execute(text(f'DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" < :cutoff'), {"cutoff": cutoff_naive})
+        if conn.execute(text("SELECT to_regclass(:name)"), {"name": LEGACY_TABLE}).scalar():
+            newest = conn.execute(text(f'SELECT max("timestamp") FROM {LEGACY_TABLE}')).scalar()
+            if newest is None or newest < cutoff_naive:
+                conn.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+                removed.append(LEGACY_TABLE)
+    return removed
@@ -0,0 +1,212 @@
+# backend/app/services/ek_decoder.py
+"""
+Decoding of tshark `-T ek` lines into the packet records used by the live pipeline,
+plus a sharded decoder pool for links where one core cannot keep up.
+
+Pool topology (all separate processes):
+
+    FIFO -> ek_reader_process -> chunk_queue -> N x ek_decoder_process -> result_queue -> ek_merger_process -> packet_queue
+
+The reader only splits the stream into sequence-numbered chunks of whole lines, the
+decoders do the JSON work in parallel, and the merger re-emits chunks in sequence
+order (sorted by timestamp inside each chunk) so downstream sees capture order.
+
+A supervisor thread in the parent watches the pool. When any of its processes dies (an
+OOM kill, a crash) the merger would wait forever for the chunk that process held, and a
+decoder killed inside a queue operation can leave the shared queue locked, so the whole
+pool is restarted with fresh queues; the chunks in flight at that moment are lost.
+"""
+import json
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from operator import itemgetter
+
+# Use a faster JSON backend when one is installed.
+try:
+    import orjson
+    json_loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    json_loads = json.loads
+    JSON_BACKEND = "json"
+
+logger = logging.getLogger(__name__)
+
+# tshark emits an {"index": ...} bulk header before every document; those never carry layers.
+LAYERS_MARKER = b'"layers"'
+PIPE_READ_BYTES = 256 * 1024
+POOL_CHECK_INTERVAL_SECONDS = 1.0
+POOL_RESTART_GRACE_SECONDS = 3.0
+
+
+# Network layer -> (source, destination, TTL / hop limit) fields
+NETWORK_LAYERS = {"ip": ("ip_ip_src", "ip_ip_dst", "ip_ip_ttl"), "ipv6": ("ipv6_ipv6_src", "ipv6_ipv6_dst", "ipv6_ipv6_hlim")}
+TRANSPORT_LAYERS = {"tcp": "TCP", "udp": "UDP", "icmp": "ICMP", "icmpv6": "ICMP"}
+
+
+def _first(value):
+    """A layer or field tshark repeated (tunnels, ICMP errors quoting a header) comes as a list; the outer one is first."""
+    return value[0] if isinstance(value, list) else value
+
+
+def ek_doc_to_packet(ek_doc: dict):
+    """Projects a decoded EK document onto a packet record. Returns None for unusable documents."""
+    layers = ek_doc.get("layers")
+    if not layers: return None
+    timestamp_str = ek_doc.get("timestamp")
+    frame_layer, eth_layer = _first(layers.get("frame")) or {}, _first(layers.get("eth")) or {}
+    # Layers are in dissection order: the first network layer is the outer header (for IPv6
+    # the hop limit stands in for the TTL), the first transport layer the outer transport
+    # (the UDP header quoted inside an ICMP error does not make the packet UDP).
+    network = next((name for name in layers if name in NETWORK_LAYERS), None)
+    if network is None: return None  # Non-IP frame
+    ip_layer = _first(layers[network]) or {}
+    source_field, destination_field, ttl_field = NETWORK_LAYERS[network]
+    packet_data = {
+        "@timestamp": datetime.fromtimestamp(float(timestamp_str)/1000, tz=timezone.utc).isoformat(),
+        "source_ip": _first(ip_layer.get(source_field)), "destination_ip": _first(ip_layer.get(destination_field)),
+        "length": int(_first(frame_layer.get("frame_frame_len", 0))), "ttl": int(_first(ip_layer.get(ttl_field, 0))),
+        "protocol": "UNKNOWN", "source_mac": _first(eth_layer.get("eth_eth_src")), "destination_mac": _first(eth_layer.get("eth_eth_dst")),
+        "source_port": None, "destination_port": None, "flags": None,
+        "interface": _first(frame_layer.get("frame_frame_interface_name")),
+    }
+    transport = next((name for name in layers if name in TRANSPORT_LAYERS), None)
+    if transport is not None:
+        packet_data["protocol"] = TRANSPORT_LAYERS[transport]
+    if transport in ("tcp", "udp"):
+        fields = _first(layers[transport]) or {}
+        packet_data["source_port"] = int(_first(fields.get(f"{transport}_{transport}_srcport", 0))); packet_data["destination_port"] = int(_first(fields.get(f"{transport}_{transport}_dstport", 0)))
+        tcp_flags = _first(fields.get("tcp_tcp_flags")) if transport == "tcp" else None
+        if tcp_flags: packet_data["flags"] = f"0x{int(str(tcp_flags), 16):04x}"  # e.g. "0x0012" for SYN/ACK
+    if not (packet_data["source_ip"] and packet_data["destination_ip"]): return None
+    return packet_data
+
+
+def ek_line_to_packet(line):
+    """Decodes one EK line (str or bytes). Returns None for index lines, non-IP frames and garbage."""
+    if isinstance(line, str): line = line.encode()
+    if LAYERS_MARKER not in line: return None  # Skip the bulk index lines without decoding them
+    try:
+        return ek_doc_to_packet(json_loads(line))
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return None
+
+
+def decode_chunk(lines: list) -> list:
+    """Decodes a chunk of EK lines and returns its packet records sorted by timestamp."""
+    packets = [packet for packet in map(ek_line_to_packet, lines) if packet is not None]
+    packets.sort(key=itemgetter("@timestamp"))
+    return packets
+
+
+# --- Pool stages ---
+
+def ek_reader_process(chunk_queue: multiprocessing.Queue, pipe_path: str, stop_event: multiprocessing.Event, workers: int):
+    """Reads the FIFO in large blocks and hands sequence-numbered chunks of complete lines to the decoders."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - [ek_reader_process] - %(levelname)s - %(message)s')
+    proc_logger = logging.getLogger(__name__)
+    proc_logger.info(f"EK reader process started. Monitoring pipe: '{pipe_path}' for {workers} decoder workers.")
+    seq = 0
+    while not stop_event.is_set():
+        try:
+            proc_logger.info(f"Opening pipe '{pipe_path}'. Waiting for data stream...")
+            with open(pipe_path, 'rb') as f:
+                pending = b""
+                while not stop_event.is_set():
+                    block = f.read1(PIPE_READ_BYTES)
+                    if not block: break
+                    pending += block
+                    last_newline = pending.rfind(b"\n")
+                    if last_newline < 0: continue
+                    lines, pending = pending[:last_newline].split(b"\n"), pending[last_newline + 1:]
+                    chunk_queue.put((seq, lines))
+                    seq += 1
+                # The writer closed the pipe after a last line without a newline.
+                if pending:
+                    chunk_queue.put((seq, [pending]))
+                    seq += 1
+            proc_logger.warning("Stream ended. Will attempt to reopen in 2 seconds."); time.sleep(2)
+        except Exception as e:
+            proc_logger.error(f"An unexpected error occurred in the EK reader loop: {e}", exc_info=True); time.sleep(5)
+    for _ in range(workers):
+        chunk_queue.put(None)
+    proc_logger.info("EK reader process received stop signal and is shutting down.")
+
+
+def ek_decoder_process(chunk_queue: multiprocessing.Queue, result_queue: multiprocessing.Queue):
+    """Decodes chunks until it receives the shutdown sentinel. Always answers a chunk, even with an empty list, so the merger never stalls."""
+    while True:
+        item = chunk_queue.get()
+        if item is None: break
+        seq, lines = item
+        try:
+            packets = decode_chunk(lines)
+        except Exception as e:
+            logger.error(f"EK decoder failed on chunk {seq}: {e}")
+            packets = []
+        result_queue.put((seq, packets))
+
+
+def ek_merger_process(result_queue: multiprocessing.Queue, packet_queue: multiprocessing.Queue, stop_event: multiprocessing.Event):
+    """Restores chunk order and forwards the packet records to the handler thread."""
+    next_seq = 0
+    reorder_buffer = {}
+    while not stop_event.is_set():
+        try:
+            seq, packets = result_queue.get(timeout=1.0)
+        except queue.Empty:
+            continue
+        reorder_buffer[seq] = packets
+        while next_seq in reorder_buffer:
+            for packet_data in reorder_buffer.pop(next_seq):
+                packet_queue.put(packet_data)
+            next_seq += 1
+
+
+def _start_pool_processes(packet_queue: multiprocessing.Queue, pipe_path: str, pool_stop: multiprocessing.Event, workers: int) -> list:
+    chunk_queue = multiprocessing.Queue(maxsize=workers * 4)
+    result_queue = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=ek_reader_process, args=(chunk_queue, pipe_path, pool_stop, workers), daemon=True, name="EKReader")]
+    processes += [
+        multiprocessing.Process(target=ek_decoder_process, args=(chunk_queue, result_queue), daemon=True, name=f"EKDecoder-{i}")
+        for i in range(workers)
+    ]
+    processes.append(multiprocessing.Process(target=ek_merger_process, args=(result_queue, packet_queue, pool_stop), daemon=True, name="EKMerger"))
+    for process in processes:
+        process.start()
+    return processes
+
+
+def _supervise_pool(processes: list, packet_queue: multiprocessing.Queue, pipe_path: str, stop_event: multiprocessing.Event, workers: int, pool_stop: multiprocessing.Event):
+    """Restarts the whole pool (replacing `processes` in place) when one of its processes dies."""
+    while not stop_event.wait(POOL_CHECK_INTERVAL_SECONDS):
+        dead = [process for process in processes if not process.is_alive()]
+        if not dead:
+            continue
+        logger.error(f"EK decoder pool: {', '.join(f'{process.name} (exit code {process.exitcode})' for process in dead)} died; restarting the pool.")
+        pool_stop.set()
+        deadline = time.monotonic() + POOL_RESTART_GRACE_SECONDS
+        for process in processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+                process.join(1)
+        pool_stop = multiprocessing.Event()
+        processes[:] = _start_pool_processes(packet_queue, pipe_path, pool_stop, workers)
+    pool_stop.set()
+
+
+def start_decoder_pool(packet_queue: multiprocessing.Queue, pipe_path: str, stop_event: multiprocessing.Event, workers: int) -> list:
+    """
+    Starts the reader, `workers` decoders and the merger, plus their supervisor thread.
+    Returns the started processes; the list is updated in place when the pool restarts.
+    """
+    pool_stop = multiprocessing.Event()  # Set on `stop_event` and before every restart
+    processes = _start_pool_processes(packet_queue, pipe_path, pool_stop, workers)
+    threading.Thread(target=_supervise_pool, args=(processes, packet_queue, pipe_path, stop_event, workers, pool_stop), daemon=True, name="EKPoolSupervisor").start()
+    logger.info(f"EK decoder pool started with {workers} workers (JSON backend: {JSON_BACKEND}).")
+    return processes
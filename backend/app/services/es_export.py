@@ -0,0 +1,204 @@
+# backend/app/services/es_export.py
+"""
+Deep paging over Elasticsearch for the investigation workbench.
+
+A `PitPager` walks a query with a point in time (PIT) and `search_after`. It holds one
+page at a time, so exports stay flat in memory whatever the number of hits, and the
+result set does not shift while it is being read.
+
+    pager = PitPager(index, query, source=["@timestamp", "source_ip"], page_size=1000)
+    await pager.open()
+    while hits := await pager.next_page(): ...
+    await pager.close()
+
+`CursorRegistry` keeps open pagers behind opaque tokens so the UI can fetch page after
+page. A cursor is dropped, and its PIT closed, after INVESTIGATION_PIT_KEEP_ALIVE_SECONDS
+without use or when more than INVESTIGATION_MAX_CURSORS are open.
+"""
+import csv
+import io
+import json
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from app.config import settings
+from app.services import es_provider
+
+logger = logging.getLogger(__name__)
+
+# PIT sorts need a unique tiebreaker; _shard_doc is the cheapest one.
+DEFAULT_SORT = [
+    {"@timestamp": {"order": "desc", "unmapped_type": "boolean"}},
+    {"_shard_doc": "asc"},
+]
+
+
+def build_query(query_string: str, time_range_hours: int) -> dict:
+    """The Lucene query_string search over the last `time_range_hours` used by the workbench."""
+    return {
+        "bool": {
+            "must": {
+                "query_string": {
+                    "query": query_string,
+                    "analyze_wildcard": True,
+                    "time_zone": "UTC"
+                }
+            },
+            "filter": {
+                "range": {
+                    "@timestamp": {
+                        "gte": f"now-{time_range_hours}h/h",
+                        "lte": "now/h"
+                    }
+                }
+            }
+        }
+    }
+
+
+class PitPager:
+    def __init__(self, index: str, query: dict, source: Optional[List[str]] = None, page_size: int = 1000, limit: Optional[int] = None):
+        self.index = index
+        self.query = query
+        self.source = source
+        self.page_size = page_size
+        self.limit = limit  # Stop after this many hits (None: all)
+        self.keep_alive = f"{settings.INVESTIGATION_PIT_KEEP_ALIVE_SECONDS}s"
+        self.pit_id = None
+        self.search_after = None
+        self.returned = 0
+        self.exhausted = False
+
+    async def open(self):
+        response = await es_provider.open_point_in_time(index=self.index, keep_alive=self.keep_alive)
+        self.pit_id = response["id"]
+
+    async def next_page(self) -> list:
+        """The next page of hits (with `_source` projected to `source`), [] once exhausted."""
+        if self.exhausted or self.pit_id is None:
+            return []
+        size = self.page_size if self.limit is None else min(self.page_size, self.limit - self.returned)
+        if size <= 0:
+            self.exhausted = True
+            return []
+        body = {
+            "size": size,
+            "query": self.query,
+            "sort": DEFAULT_SORT,
+            "pit": {"id": self.pit_id, "keep_alive": self.keep_alive},
+            "track_total_hits": False,
+        }
+        if self.source is not None:
+            body["_source"] = self.source
+        if self.search_after is not None:
+            body["search_after"] = self.search_after
+        response = await es_provider.search(body=body)
+        # The PIT id may change between requests; always continue with the latest one.
+        self.pit_id = response.get("pit_id", self.pit_id)
+        hits = response["hits"]["hits"]
+        if hits:
+            self.search_after = hits[-1]["sort"]
+        self.returned += len(hits)
+        if len(hits) < size or (self.limit is not None and self.returned >= self.limit):
+            self.exhausted = True
+        return hits
+
+    async def close(self):
+        if self.pit_id is None:
+            return
+        try:
+            await es_provider.close_point_in_time(body={"id": self.pit_id})
+        except Exception as e:
+            # The PIT expires on its own after keep_alive anyway.
+            logger.warning(f"Could not close point in time: {e}")
+        self.pit_id = None
+
+
+class CursorRegistry:
+    def __init__(self, max_cursors: int, idle_seconds: float):
+        self.max_cursors = max(1, max_cursors)
+        self.idle_seconds = idle_seconds
+        self._cursors = OrderedDict()  # token -> (pager, last_used), least recently used first
+
+    async def add(self, pager: PitPager) -> str:
+        await self.prune()
+        token = secrets.token_urlsafe(24)
+        self._cursors[token] = (pager, time.monotonic())
+        while len(self._cursors) > self.max_cursors:
+            _, (evicted, _) = self._cursors.popitem(last=False)
+            await evicted.close()
+        return token
+
+    async def get(self, token: str) -> Optional[PitPager]:
+        await self.prune()
+        entry = self._cursors.get(token)
+        if entry is None:
+            return None
+        self._cursors[token] = (entry[0], time.monotonic())
+        self._cursors.move_to_end(token)
+        return entry[0]
+
+    async def discard(self, token: str):
+        entry = self._cursors.pop(token, None)
+        if entry is not None:
+            await entry[0].close()
+
+    async def prune(self):
+        """Closes the cursors idle for longer than their PIT keep-alive."""
+        deadline = time.monotonic() - self.idle_seconds
+        while self._cursors:
+            token, (pager, last_used) = next(iter(self._cursors.items()))
+            if last_used >= deadline:
+                break
+            del self._cursors[token]
+            await pager.close()
+
+    def __len__(self):
+        return len(self._cursors)
+
+
+# --- Export encoders: one chunk of text per page ---
+def flatten(document: dict, prefix: str = "", row: Optional[dict] = None) -> dict:
+    """{"source": {"ip": "10.0.0.1"}} -> {"source.ip": "10.0.0.1"}"""
+    row = {} if row is None else row
+    for key, value in document.items():
+        if isinstance(value, dict):
+            flatten(value, f"{prefix}{key}.", row)
+        else:
+            row[f"{prefix}{key}"] = value
+    return row
+
+
+def ndjson_chunk(hits: list) -> str:
+    return "".join(json.dumps(hit.get("_source", {}), default=str) + "\n" for hit in hits)
+
+
+def csv_chunk(hits: list, columns: list, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    for hit in hits:
+        row = flatten(hit.get("_source", {}))
+        writer.writerow([
+            json.dumps(value, default=str) if isinstance(value, list) else ("" if value is None else value)
+            for value in (row.get(column) for column in columns)
+        ])
+    return buffer.getvalue()
+
+
+def csv_columns(hits: list, fields: Optional[List[str]]) -> list:
+    """The requested fields, else every flattened field of the first page (in first-seen order)."""
+    if fields:
+        return list(fields)
+    columns = {}
+    for hit in hits:
+        columns.update(dict.fromkeys(flatten(hit.get("_source", {}))))
+    return list(columns)
+
+
+# Cursors of the investigation /query/page endpoint.
+cursors = CursorRegistry(settings.INVESTIGATION_MAX_CURSORS, settings.INVESTIGATION_PIT_KEEP_ALIVE_SECONDS)
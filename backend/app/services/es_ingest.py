@@ -0,0 +1,138 @@
+# backend/app/services/es_ingest.py
+"""
+Index-time enrichment of Zeek documents in Elasticsearch.
+
+The ingest pipeline ZEEK_PIPELINE_ID adds two fields to every Zeek connection record as
+it is indexed:
+
+    app_proto       application protocol from the well-known ports (orig port first, as
+                    zeek_store.app_protocol does), else the upper-cased transport protocol
+    total_ip_bytes  orig_ip_bytes + resp_ip_bytes
+
+The legacy index template ZEEK_TEMPLATE_NAME maps them as keyword / long and makes the
+pipeline the default of every new netguard-zeek-* index, on top of Filebeat's own
+"netguard" template. The protocol distribution is then a plain terms + sum aggregation
+over doc values instead of two painless scripts per document.
+
+`install()` runs at startup and also attaches the pipeline and mappings to the indices
+that already exist. Documents indexed before that have neither field; backfill them once:
+
+    python -m app.services.es_ingest backfill [--index netguard-zeek-*] [--wait]
+"""
+import argparse
+import json
+import logging
+import time
+
+from app.services import es_provider
+from app.services.zeek_store import APP_PORTS
+
+logger = logging.getLogger(__name__)
+
+ZEEK_INDEX_PATTERN = "netguard-zeek-*"
+ZEEK_PIPELINE_ID = "netguard-zeek-enrich"
+ZEEK_TEMPLATE_NAME = "netguard-zeek-enrich"
+# Above Filebeat's "netguard" template so these settings and mappings win the merge.
+ZEEK_TEMPLATE_ORDER = 10
+
+ENRICHED_FIELDS = {
+    "app_proto": {"type": "keyword"},
+    "total_ip_bytes": {"type": "long"},
+}
+
+ENRICH_SCRIPT = """
+    def port = ctx.id_orig_p != null ? ctx.id_orig_p : ctx.id_resp_p;
+    def name = port == null ? null : params.app_ports[String.valueOf(port)];
+    if (name == null) {
+        name = ctx.proto != null ? ctx.proto.toString().toUpperCase() : 'UNKNOWN';
+    }
+    ctx.app_proto = name;
+    if (ctx.orig_ip_bytes != null && ctx.resp_ip_bytes != null) {
+        ctx.total_ip_bytes = ((Number) ctx.orig_ip_bytes).longValue() + ((Number) ctx.resp_ip_bytes).longValue();
+    }
+"""
+
+
+def pipeline_body() -> dict:
+    return {
+        "description": "NetGuard: app_proto and total_ip_bytes for Zeek connection records",
+        "processors": [
+            {
+                "script": {
+                    "lang": "painless",
+                    "if": "ctx.proto != null",
+                    "source": ENRICH_SCRIPT,
+                    "params": {"app_ports": {str(port): name for port, name in APP_PORTS.items()}},
+                    "ignore_failure": True,
+                }
+            }
+        ],
+    }
+
+
+def template_body() -> dict:
+    return {
+        "index_patterns": [ZEEK_INDEX_PATTERN],
+        "order": ZEEK_TEMPLATE_ORDER,
+        "settings": {"index.default_pipeline": ZEEK_PIPELINE_ID},
+        "mappings": {"properties": ENRICHED_FIELDS},
+    }
+
+
+def install():
+    """Creates/updates the pipeline and template, and attaches both to the existing Zeek indices."""
+    client = es_provider.get_client()
+    client.ingest.put_pipeline(id=ZEEK_PIPELINE_ID, body=pipeline_body())
+    client.indices.put_template(name=ZEEK_TEMPLATE_NAME, body=template_body())
+    if client.indices.exists(index=ZEEK_INDEX_PATTERN):
+        client.indices.put_mapping(index=ZEEK_INDEX_PATTERN, body={"properties": ENRICHED_FIELDS})
+        client.indices.put_settings(index=ZEEK_INDEX_PATTERN, body={"index.default_pipeline": ZEEK_PIPELINE_ID})
+    logger.info(f"✅ Elasticsearch ingest pipeline '{ZEEK_PIPELINE_ID}' and template '{ZEEK_TEMPLATE_NAME}' are installed.")
+
+
+def backfill(index: str = ZEEK_INDEX_PATTERN, wait: bool = False, poll_seconds: float = 5.0) -> dict:
+    """
+    Runs the pipeline over the connection records of `index` that lack `app_proto`, as an
+    update-by-query task. Returns the task id, or the final task status when `wait` is set.
+    """
+    client = es_provider.get_client()
+    install()
+    response = client.update_by_query(
+        index=index,
+        body={"query": {"bool": {"filter": [{"exists": {"field": "proto"}}], "must_not": [{"exists": {"field": "app_proto"}}]}}},
+        pipeline=ZEEK_PIPELINE_ID,
+        conflicts="proceed",
+        slices="auto",
+        wait_for_completion=False,
+    )
+    task_id = response["task"]
+    logger.info(f"Backfill of '{index}' started as task {task_id}.")
+    if not wait:
+        return {"task": task_id}
+    while True:
+        task = client.tasks.get(task_id=task_id)
+        status = task.get("task", {}).get("status", {})
+        logger.info(f"Backfill progress: {status.get('updated', 0)} of {status.get('total', '?')} documents updated.")
+        if task.get("completed"):
+            return task
+        time.sleep(poll_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Install the Zeek ingest pipeline/template, or backfill existing Zeek indices.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("install", help="create or update the ingest pipeline and index template")
+    backfill_parser = commands.add_parser("backfill", help="add app_proto/total_ip_bytes to already indexed documents")
+    backfill_parser.add_argument("--index", default=ZEEK_INDEX_PATTERN, help="index or pattern to backfill")
+    backfill_parser.add_argument("--wait", action="store_true", help="poll the task until it completes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level="INFO", format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == "install":
+        install()
+    else:
+        print(json.dumps(backfill(args.index, wait=args.wait), indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# backend/app/services/es_metadata.py
+"""
+Short-lived cache of Elasticsearch index metadata: whether an index pattern currently
+matches any index, and the merged field mappings of those indices.
+
+The query helpers used to call `indices.exists` before every search, doubling the round
+trips of the dashboard endpoints. They now go through `search` / `async_search` here,
+which only ask Elasticsearch again once an entry is older than ES_METADATA_TTL_SECONDS.
+A search failing with `index_not_found_exception` (indices deleted by the cleanup job or
+ILM) drops the pattern's entry at once, so the next call re-checks.
+"""
+import logging
+import threading
+import time
+from typing import Optional
+
+from elasticsearch import NotFoundError
+
+from app.config import settings
+from app.services import es_provider
+
+logger = logging.getLogger(__name__)
+
+
+def _is_index_not_found(e: NotFoundError) -> bool:
+    return getattr(e, "error", None) == "index_not_found_exception"
+
+
+def _flatten_properties(properties: dict, prefix: str = "", fields: Optional[dict] = None) -> dict:
+    """{"source": {"properties": {"ip": {"type": "ip"}}}} -> {"source.ip": "ip"}"""
+    fields = {} if fields is None else fields
+    for name, spec in properties.items():
+        path = f"{prefix}{name}"
+        if "properties" in spec:
+            _flatten_properties(spec["properties"], f"{path}.", fields)
+        else:
+            fields[path] = spec.get("type", "object")
+    return fields
+
+
+class IndexMetadataCache:
+    def __init__(self, ttl_seconds: float):
+        self.ttl = ttl_seconds
+        self._exists = {}  # pattern -> (checked_at, bool)
+        self._mappings = {}  # pattern -> (checked_at, {field: type})
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def _cached(self, table: dict, pattern: str):
+        with self._lock:
+            entry = table.get(pattern)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self.stats["hits"] += 1
+                return entry
+            self.stats["misses"] += 1
+            return None
+
+    def _store(self, table: dict, pattern: str, value):
+        with self._lock:
+            table[pattern] = (time.monotonic(), value)
+        return value
+
+    # --- Existence ---
+    def exists(self, pattern: str) -> bool:
+        entry = self._cached(self._exists, pattern)
+        if entry is not None:
+            return entry[1]
+        return self._store(self._exists, pattern, bool(es_provider.get_client().indices.exists(index=pattern)))
+
+    async def async_exists(self, pattern: str) -> bool:
+        entry = self._cached(self._exists, pattern)
+        if entry is not None:
+            return entry[1]
+        return self._store(self._exists, pattern, await es_provider.indices_exists(index=pattern))
+
+    # --- Mappings ---
+    def fields(self, pattern: str) -> dict:
+        """Field path -> mapped type, merged over every index matching `pattern` ({} if none)."""
+        entry = self._cached(self._mappings, pattern)
+        if entry is not None:
+            return entry[1]
+        fields = {}
+        if self.exists(pattern):
+            try:
+                response = es_provider.get_client().indices.get_mapping(index=pattern)
+            except NotFoundError as e:
+                if not _is_index_not_found(e):
+                    raise
+                self.invalidate(pattern)
+                return {}
+            for index_mapping in response.values():
+                _flatten_properties(index_mapping.get("mappings", {}).get("properties", {}), fields=fields)
+        return self._store(self._mappings, pattern, fields)
+
+    def has_field(self, pattern: str, field: str) -> bool:
+        return field in self.fields(pattern)
+
+    def invalidate(self, pattern: Optional[str] = None):
+        """Forgets `pattern` (or everything)."""
+        with self._lock:
+            if pattern is None:
+                self._exists.clear()
+                self._mappings.clear()
+            else:
+                self._exists.pop(pattern, None)
+                self._mappings.pop(pattern, None)
+            self.stats["invalidations"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "ttl_seconds": self.ttl,
+                "patterns": {pattern: {"exists": value, "age_seconds": round(now - checked_at, 1)} for pattern, (checked_at, value) in self._exists.items()},
+                "mapped_patterns": list(self._mappings),
+                **self.stats,
+            }
+
+    # --- Query helpers ---
+    def search(self, index: str, **kwargs) -> Optional[dict]:
+        """Searches `index`; None (without a search) when the pattern matches no index."""
+        if not self.exists(index):
+            return None
+        try:
+            return es_provider.get_client().search(index=index, **kwargs)
+        except NotFoundError as e:
+            if not _is_index_not_found(e):
+                raise
+            self.invalidate(index)
+            return None
+
+    async def async_search(self, index: str, **kwargs) -> Optional[dict]:
+        if not await self.async_exists(index):
+            return None
+        try:
+            return await es_provider.search(index=index, **kwargs)
+        except NotFoundError as e:
+            if not _is_index_not_found(e):
+                raise
+            self.invalidate(index)
+            return None
+
+
+# Shared by every Elasticsearch query helper in the process.
+index_metadata = IndexMetadataCache(settings.ES_METADATA_TTL_SECONDS)
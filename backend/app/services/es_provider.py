@@ -0,0 +1,115 @@
+# backend/app/services/es_provider.py
+"""
+The one Elasticsearch client of the process, shared by every service and router.
+
+    es_provider.get_client()          sync client (keep-alive urllib3 pool of ES_POOL_MAXSIZE)
+    await es_provider.search(...)     for async routes: AsyncElasticsearch when the aiohttp
+                                      transport is installed, otherwise the sync client on
+                                      the threadpool
+
+Both clients are created lazily, retry on timeouts / connection errors ES_MAX_RETRIES times
+and default to ES_TIMEOUT seconds; individual calls may pass `request_timeout=` to override.
+"""
+import logging
+import threading
+
+from elasticsearch import Elasticsearch
+from starlette.concurrency import run_in_threadpool
+
+# AsyncElasticsearch needs the optional aiohttp transport (elasticsearch[async]).
+try:
+    from elasticsearch import AsyncElasticsearch
+except ImportError:
+    AsyncElasticsearch = None
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_client = None
+_async_client = None
+
+
+def _client_options() -> dict:
+    return {
+        "timeout": settings.ES_TIMEOUT,
+        "max_retries": settings.ES_MAX_RETRIES,
+        "retry_on_timeout": True,
+        "maxsize": settings.ES_POOL_MAXSIZE,
+        "http_compress": True,
+    }
+
+
+def get_client() -> Elasticsearch:
+    """The shared sync client."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = Elasticsearch(settings.ELASTICSEARCH_URI, **_client_options())
+    return _client
+
+
+def get_async_client():
+    """The shared AsyncElasticsearch client, or None when the async transport is not installed."""
+    global _async_client
+    if AsyncElasticsearch is None:
+        return None
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                _async_client = AsyncElasticsearch(settings.ELASTICSEARCH_URI, **_client_options())
+    return _async_client
+
+
+def _method(client, method: str):
+    # Dotted names reach namespaced APIs, e.g. "indices.exists".
+    for name in method.split("."):
+        client = getattr(client, name)
+    return client
+
+
+async def _call(method: str, **kwargs):
+    client = get_async_client()
+    if client is not None:
+        return await _method(client, method)(**kwargs)
+    return await run_in_threadpool(_method(get_client(), method), **kwargs)
+
+
+async def search(**kwargs):
+    return await _call("search", **kwargs)
+
+
+async def count(**kwargs):
+    return await _call("count", **kwargs)
+
+
+async def open_point_in_time(**kwargs):
+    return await _call("open_point_in_time", **kwargs)
+
+
+async def close_point_in_time(**kwargs):
+    return await _call("close_point_in_time", **kwargs)
+
+
+async def indices_exists(**kwargs) -> bool:
+    return bool(await _call("indices.exists", **kwargs))
+
+
+async def ping() -> bool:
+    try:
+        return bool(await _call("ping"))
+    except Exception:
+        return False
+
+
+async def close_clients():
+    """Closes the pooled connections; called once on application shutdown."""
+    global _client, _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+    if _client is not None:
+        _client.close()
+        _client = None
@@ -11,6 +11,7 @@ from app.state import app_state
 # --- ADDITIONS FOR AUTOMATION END ---
 
 from . import ids_query_service
+from app.routers.connection_manager import manager
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +29,7 @@ def run_evasive_scan(target_ip: str):
     ]
 
     logger.info(f"Executing Evasive Scan Command: {' '.join(command)}")
+    manager.publish_scan_progress("evasive_scan", "started", target=target_ip)
     scan_start_time = datetime.now(timezone.utc)
 
     try:
@@ -39,6 +41,7 @@ def run_evasive_scan(target_ip: str):
         scan_end_time = datetime.now(timezone.utc)
         logger.info(f"Evasive scan on {target_ip} complete. Checking for IDS alerts...")
         _check_for_ids_alerts(target_ip, scan_start_time, scan_end_time)
+        manager.publish_scan_progress("evasive_scan", "complete", target=target_ip)
 
 
 def _check_for_ids_alerts(target_ip: str, start_time: datetime, end_time: datetime):
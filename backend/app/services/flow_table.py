@@ -0,0 +1,123 @@
+# backend/app/services/flow_table.py
+"""
+In-process 5-tuple flow aggregation for the live packet pipeline.
+
+Packets are folded into unidirectional flows keyed by
+(protocol, source_ip, source_port, destination_ip, destination_port). A flow is
+exported (handed back to the caller for persistence in `network_flows`) when:
+
+    fin       a TCP FIN or RST was seen
+    idle      no packet for FLOW_IDLE_TIMEOUT seconds
+    active    it has been open for FLOW_ACTIVE_TIMEOUT seconds (long flows are cut into slices)
+    evicted   the table is full and it is the least recently updated flow
+    shutdown  the pipeline is stopping
+
+The table is an OrderedDict kept in least-recently-updated order, which bounds memory
+at `max_flows` entries and makes both eviction and the idle sweep O(expired flows). A
+second OrderedDict keeps the same keys in creation order (packets arrive in capture order,
+so that is first-seen order), which makes the active-timeout sweep O(expired flows) too.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+TCP_FIN, TCP_RST = 0x01, 0x04
+
+
+class Flow:
+    __slots__ = ("first_seen", "last_seen", "packets", "bytes", "tcp_flags")
+
+    def __init__(self, ts: float):
+        self.first_seen = self.last_seen = ts
+        self.packets = self.bytes = self.tcp_flags = 0
+
+
+def _flow_record(key: tuple, flow: Flow, reason: str) -> dict:
+    protocol, source_ip, source_port, destination_ip, destination_port = key
+    return {
+        "start_time": datetime.fromtimestamp(flow.first_seen, tz=timezone.utc).replace(tzinfo=None),
+        "end_time": datetime.fromtimestamp(flow.last_seen, tz=timezone.utc).replace(tzinfo=None),
+        "protocol": protocol, "source_ip": source_ip, "source_port": source_port,
+        "destination_ip": destination_ip, "destination_port": destination_port,
+        "packets": flow.packets, "bytes": flow.bytes,
+        "tcp_flags": f"0x{flow.tcp_flags:04x}" if protocol == "TCP" else None,
+        "end_reason": reason,
+    }
+
+
+class FlowTable:
+    def __init__(self, max_flows: int, idle_timeout: float, active_timeout: float):
+        self.max_flows = max(1, max_flows)
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self._flows = OrderedDict()  # key -> Flow, least recently updated first
+        self._by_start = OrderedDict()  # key -> None, oldest first_seen first
+        self._lock = threading.Lock()
+        self.counters = {"flows_created": 0, "flows_exported": 0, "evicted": 0, "idle": 0, "active": 0, "fin": 0, "shutdown": 0}
+
+    def _export(self, key: tuple, flow: Flow, reason: str, out: list):
+        self._by_start.pop(key, None)
+        out.append(_flow_record(key, flow, reason))
+        self.counters[reason] += 1
+        self.counters["flows_exported"] += 1
+
+    def update(self, batch: list) -> list:
+        """Folds a batch of packet records into the table. Returns the flows this ended (FIN/RST, evictions)."""
+        exported = []
+        with self._lock:
+            flows = self._flows
+            for packet_data in batch:
+                key = (packet_data.get("protocol") or "UNKNOWN", packet_data["source_ip"], packet_data.get("source_port"),
+                       packet_data["destination_ip"], packet_data.get("destination_port"))
+                ts = datetime.fromisoformat(packet_data["@timestamp"]).timestamp()
+                flow = flows.get(key)
+                if flow is None:
+                    if len(flows) >= self.max_flows:
+                        self._export(*flows.popitem(last=False), "evicted", exported)
+                    flow = flows[key] = Flow(ts)
+                    self._by_start[key] = None
+                    self.counters["flows_created"] += 1
+                else:
+                    flows.move_to_end(key)
+                flow.packets += 1
+                flow.bytes += packet_data.get("length") or 0
+                if ts > flow.last_seen: flow.last_seen = ts
+                if packet_data.get("flags"):
+                    flow.tcp_flags |= int(packet_data["flags"], 16)
+                    if flow.tcp_flags & (TCP_FIN | TCP_RST):
+                        self._export(key, flows.pop(key), "fin", exported)
+        return exported
+
+    def sweep(self, now: float = None) -> list:
+        """Exports flows that hit their idle or active timeout."""
+        now = time.time() if now is None else now
+        exported = []
+        with self._lock:
+            flows = self._flows
+            # Least recently updated first: stop at the first flow that is still fresh.
+            while flows:
+                key, flow = next(iter(flows.items()))
+                if now - flow.last_seen < self.idle_timeout: break
+                del flows[key]
+                self._export(key, flow, "idle", exported)
+            # Oldest first: stop at the first flow that has not been open for active_timeout yet.
+            by_start = self._by_start
+            while by_start:
+                key = next(iter(by_start))
+                if now - flows[key].first_seen < self.active_timeout: break
+                self._export(key, flows.pop(key), "active", exported)
+        return exported
+
+    def flush(self) -> list:
+        """Exports every open flow, e.g. on shutdown."""
+        exported = []
+        with self._lock:
+            while self._flows:
+                self._export(*self._flows.popitem(last=False), "shutdown", exported)
+        return exported
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"active_flows": len(self._flows), "max_flows": self.max_flows,
+                    "idle_timeout": self.idle_timeout, "active_timeout": self.active_timeout, **self.counters}
@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import select
 from app.database import SessionLocal
 from app.models import Host
+from app.routers.connection_manager import manager
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +23,7 @@ def discover_hosts():
         return
 
     logger.info(f"🔍 Discovering hosts in CIDR: {cidr}")
+    manager.publish_scan_progress("host_discovery", "started", target=cidr)
     nm = nmap.PortScanner()
     db = SessionLocal()
     
@@ -68,9 +70,11 @@ def discover_hosts():
 
         db.commit()
         logger.info(f"✅ Host discovery complete. Found {len(nm.all_hosts())} active hosts.")
+        manager.publish_scan_progress("host_discovery", "complete", target=cidr, completed=len(nm.all_hosts()), total=len(nm.all_hosts()))
 
     except Exception as e:
         logger.error(f"Error during host discovery: {e}", exc_info=True)
+        manager.publish_scan_progress("host_discovery", "error", target=cidr)
         db.rollback() # Rollback all changes if an error occurs
     finally:
         db.close()
\ No newline at end of file
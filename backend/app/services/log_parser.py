@@ -1,21 +1,32 @@
 # app/services/log_parser.py (DEFINITIVE, WITH SELF-FILTERING)
 import logging
 import json
-import time
-import os
-import asyncio
+import re
 import psutil  # Used to get the server's own IP addresses
 import socket  # Used for the address family constant
 
 from datetime import datetime
+from sqlalchemy import insert, update
+from sqlalchemy.exc import DataError, IntegrityError, InterfaceError, OperationalError
 from sqlalchemy.orm import Session
 from app.database import SessionLocal
 from app import models
+from app.config import settings
 from app.routers.connection_manager import manager
+from app.services import log_tailer, alert_aggregation, suppression
 
 logger = logging.getLogger(__name__)
 SURICATA_LOG_FILE = "/var/log/suricata/eve.json"
 
+# Most eve.json lines are flow/dns/tls/stats events. Their type is read from the raw bytes
+# so only the accepted ones pay for a full json.loads.
+EVENT_TYPE_PATTERN = re.compile(rb'"event_type"\s*:\s*"([^"]+)"')
+ACCEPTED_EVENT_TYPES = frozenset(settings.SURICATA_EVENT_TYPES)
+INGEST_STATS = {"lines_seen": 0, "lines_skipped": 0, "lines_decoded": 0, "alerts_parsed": 0, "alerts_rejected": 0}
+
+# Repeated (signature, src, dst, dst_port) hits are merged into one row per window.
+alert_aggregator = alert_aggregation.AlertAggregator(settings.ALERT_DEDUP_WINDOW_SECONDS, settings.ALERT_DEDUP_MAX_KEYS)
+
 
 def get_server_ips():
     """
@@ -44,14 +55,25 @@ SERVER_IPS = get_server_ips()
 # --------------------------------------------------------------------------------
 
 
+def is_accepted_event(line: bytes) -> bool:
+    """Pre-filter on the raw line: True when its event_type is one of SURICATA_EVENT_TYPES."""
+    match = EVENT_TYPE_PATTERN.search(line)
+    # Lines without a recognisable event_type are left to the full decode to judge.
+    return match is None or match.group(1).decode("ascii", errors="replace") in ACCEPTED_EVENT_TYPES
+
+
 def process_log_entry(line: str):
-    """Parse a single JSON log line and save it to the DB, ignoring self-generated alerts."""
+    """
+    Parses a single JSON log line into SecurityAlert column values, ignoring self-generated
+    alerts. Returns None for anything that should not be stored.
+    """
     try:
         log = json.loads(line)
+        INGEST_STATS["lines_decoded"] += 1
 
-        # We are only interested in 'alert' events.
-        if log.get('event_type') != 'alert':
-            return
+        # We are only interested in alert events (SURICATA_EVENT_TYPES).
+        if log.get('event_type') not in ACCEPTED_EVENT_TYPES:
+            return None
 
         # --- NEW: FILTERING LOGIC ---
         # Get the source IP from the alert
@@ -63,84 +85,141 @@ def process_log_entry(line: str):
             # without cluttering the main log.
             #logger.debug(f"Ignoring self-generated alert from {source_ip}: {log.get('alert', {}).get('signature')}")
             #return # Exit the function immediately
+
+        # Scanner hosts, internal subnets and benign ranges from the CIDR rules file.
+        if suppression.suppressor.suppresses("alerts", source_ip, log.get('dest_ip')):
+            return None
         # --- END OF FILTERING LOGIC ---
 
 
         alert_data = log.get('alert', {})
         timestamp_obj = datetime.fromisoformat(log.get('timestamp').replace("Z", "+00:00"))
 
-        new_alert = models.SecurityAlert(
-            timestamp=timestamp_obj,
-            source_ip=source_ip, # We already have it from above
-            source_port=log.get('src_port'),
-            destination_ip=log.get('dest_ip'),
-            destination_port=log.get('dest_port'),
-            protocol=log.get('proto'),
-            severity=alert_data.get('severity', 3),
-            signature=alert_data.get('signature'),
-            event_type=log.get('event_type'),
-            raw_log=line
-        )
-
-        with SessionLocal() as db:
-            db.add(new_alert)
-            db.commit()
-            logger.info(f"✅ Real-Time Alert: '{new_alert.signature}' saved to database.")
-
-            alert_payload = {
-                "type": "new_alert",
-                "data": {
-                    "timestamp": new_alert.timestamp.isoformat(),
-                    "signature": new_alert.signature,
-                    "severity": new_alert.severity,
-                    "source_ip": new_alert.source_ip,
-                    "destination_ip": new_alert.destination_ip,
-                    "destination_port": new_alert.destination_port
-                }
-            }
-            # This broadcast now only happens for external alerts
-            asyncio.run(manager.broadcast(json.dumps(alert_payload)))
+        return {
+            "timestamp": timestamp_obj,
+            "source_ip": source_ip, # We already have it from above
+            "source_port": log.get('src_port'),
+            "destination_ip": log.get('dest_ip'),
+            "destination_port": log.get('dest_port'),
+            "protocol": log.get('proto'),
+            "severity": alert_data.get('severity', 3),
+            "signature": alert_data.get('signature'),
+            "event_type": log.get('event_type'),
+            "raw_log": line,
+        }
 
     except Exception as e:
-        logger.error(f"Failed to process/save alert: '{line[:100]}...'. Error: {e}", exc_info=True)
-        if 'db' in locals() and db.in_transaction():
+        logger.error(f"Failed to parse alert: '{line[:100]}...'. Error: {e}", exc_info=True)
+        return None
+
+
+def _alert_event(window) -> dict:
+    """The WebSocket representation of a stored (possibly aggregated) alert."""
+    alert = window.row
+    return {
+        "id": window.row_id,
+        "timestamp": alert["timestamp"].isoformat(),
+        "signature": alert["signature"],
+        "severity": alert["severity"],
+        "source_ip": alert["source_ip"],
+        "source_port": alert["source_port"],
+        "destination_ip": alert["destination_ip"],
+        "destination_port": alert["destination_port"],
+        "protocol": alert["protocol"],
+        "first_seen": window.first_seen.isoformat(),
+        "last_seen": window.last_seen.isoformat(),
+        "count": window.count,
+    }
+
+
+def write_alerts(alerts: list, batch_size: int = settings.ALERT_BATCH_SIZE):
+    """
+    Folds parsed alerts into the dedup windows, then, in a single transaction, inserts one
+    row per new window (multi-row INSERTs of up to `batch_size` rows) and bumps
+    count/last_seen of the windows already stored. The touched windows go to the WebSocket
+    layer as coalesced `alert_batch` frames of up to `batch_size` entries.
+
+    On a database error the transaction is rolled back, the touched windows are forgotten
+    (so a retry neither double counts nor points at unstored rows) and the error is raised.
+    """
+    if not alerts:
+        return
+    batch_size = max(1, batch_size)
+    new, updated = alert_aggregator.aggregate(alerts)
+    with SessionLocal() as db:
+        try:
+            statement = insert(models.SecurityAlert).returning(models.SecurityAlert.id, sort_by_parameter_order=True)
+            for start in range(0, len(new), batch_size):
+                chunk = new[start:start + batch_size]
+                row_ids = db.execute(statement, [window.row for window in chunk]).scalars().all()
+                for window, row_id in zip(chunk, row_ids):
+                    window.row_id = row_id
+            if updated:
+                db.execute(update(models.SecurityAlert), [
+                    {"id": window.row_id, "count": window.count, "last_seen": window.last_seen} for window in updated
+                ])
+            db.commit()
+        except Exception as e:
+            logger.warning(f"Failed to save {len(alerts)} alerts, rolled back: {e}")
             db.rollback()
+            alert_aggregator.forget(new + updated)
+            raise
+    logger.info(f"✅ Real-Time Alerts: {len(alerts)} processed, {len(new)} new rows, {len(updated)} aggregated rows updated.")
+
+    # Coalesced frames; publish_event hands them over to the main event loop and each
+    # "alerts" subscriber only receives the alerts its filter accepts.
+    touched = new + updated
+    for start in range(0, len(touched), batch_size):
+        events = [_alert_event(window) for window in touched[start:start + batch_size]]
+        manager.publish_event("alerts", {"type": "alert_batch", "data": events}, events=events)
+
+
+def store_alerts(alerts: list):
+    """
+    `write_alerts`, bisecting a batch the database rejects (DataError/IntegrityError, e.g. a
+    signature longer than its column) down to the offending alerts, which are skipped and
+    counted in INGEST_STATS["alerts_rejected"]. Any other error is raised.
+    """
+    try:
+        write_alerts(alerts)
+    except (DataError, IntegrityError) as e:
+        if len(alerts) == 1:
+            INGEST_STATS["alerts_rejected"] += 1
+            logger.error(f"Skipping an alert the database rejects ('{str(alerts[0].get('signature'))[:100]}' from {alerts[0].get('source_ip')}): {e.orig}")
+            return
+        middle = len(alerts) // 2
+        store_alerts(alerts[:middle])
+        store_alerts(alerts[middle:])
 
 
 def start_log_monitoring():
-    """Main entry point for the log parsing background thread."""
+    """
+    Registers eve.json with the shared log tailer and returns. Every chunk of lines the
+    tailer reads is stored in one transaction before the tailer checkpoints its offset.
+    While the database is unreachable the tailer does not advance and retries the chunk
+    on its next poll, so neither a restart nor an outage skips or repeats alerts. Alerts
+    the database rejects are skipped one by one (see `store_alerts`).
+    """
     logger.info("Log monitoring service starting (Real-Time Dynamic Mode).")
     # Log the IPs that will be ignored, so you can confirm it's working as expected.
     logger.info(f"Self-filtering is active. Alerts originating from the following server IPs will be ignored: {list(SERVER_IPS)}")
-    
-    time.sleep(5) 
-    
-    try:
-        # Jump to the end of the file so we only process new alerts.
-        with open(SURICATA_LOG_FILE, 'r') as f:
-            f.seek(0, os.SEEK_END)
-            last_pos = f.tell()
-    except FileNotFoundError:
-        last_pos = 0
-        logger.warning(f"Log file not found at startup: {SURICATA_LOG_FILE}. Will keep trying.")
-
-    while True:
+
+    def on_lines(lines: list):
+        INGEST_STATS["lines_seen"] += len(lines)
+        alerts = []
+        for line in lines:
+            if not is_accepted_event(line):
+                INGEST_STATS["lines_skipped"] += 1
+                continue
+            alert = process_log_entry(line.decode("utf-8", errors="replace"))
+            if alert:
+                INGEST_STATS["alerts_parsed"] += 1
+                alerts.append(alert)
         try:
-            with open(SURICATA_LOG_FILE, 'r') as f:
-                current_size = os.fstat(f.fileno()).st_size
-                if current_size < last_pos:
-                    last_pos = 0 # Log file was rotated or truncated
-                
-                f.seek(last_pos)
-                for line in f:
-                    if line.strip():
-                        process_log_entry(line.strip())
-                last_pos = f.tell()
-        except FileNotFoundError:
-            last_pos = 0
-            time.sleep(2)
-            continue
-        except Exception as e:
-            logger.error(f"Error in main log monitoring loop: {e}. Retrying...", exc_info=True)
+            store_alerts(alerts)
+        except (OperationalError, InterfaceError) as e:
+            # Connection-level failure: keep the chunk for a retry.
+            raise log_tailer.RetryLater(str(e.orig)) from e
 
-        time.sleep(1)
+    log_tailer.tailer.register("suricata", SURICATA_LOG_FILE, on_lines)
+    log_tailer.tailer.start()
@@ -0,0 +1,294 @@
+# backend/app/services/log_tailer.py
+"""
+One tail engine for every log file the backend follows (Suricata eve.json, Zeek logs).
+
+    log_tailer.tailer.register("suricata", "/var/log/suricata/eve.json", on_lines)
+    log_tailer.tailer.start()
+
+A single thread reads each file in large chunks and hands the complete lines to the
+file's callback. It is woken by inotify through watchdog, and polls on a timer as a
+fallback. Rotation is detected by inode: the rest of the old file is drained before the
+new one is opened from its start, and truncation rewinds to 0. After each callback returns,
+the (inode, byte offset) of every file is checkpointed to LOG_TAILER_OFFSETS_FILE.
+A restart therefore resumes exactly after the last line handed over.
+
+A callback that raises `RetryLater` (a transient failure such as the database being
+down) does not advance the offset: the same lines are handed over again on the next
+poll. Any other exception drops the lines, counted in `lines_dropped`, so one bad line
+cannot stall the file forever.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+from typing import Callable, Dict, List
+
+# inotify wake-ups when watchdog is installed, timer polling otherwise.
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler, Observer = object, None
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_BYTES = 1024 * 1024
+# A single line longer than this is passed on in pieces rather than buffered forever.
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+
+class RetryLater(Exception):
+    """Raised by a callback when its lines should be handed over again on the next poll."""
+
+
+class TailedFile:
+    def __init__(self, name: str, path: str, on_lines: Callable[[List[bytes]], None], start_at_end: bool):
+        self.name = name
+        self.path = os.path.abspath(path)
+        self.on_lines = on_lines
+        self.start_at_end = start_at_end
+        self.handle = None
+        self.inode = None
+        self.offset = 0  # Byte position just after the last complete line handed over
+        self.fragment = b""  # Trailing bytes of a line that is still being written
+        self.failed = False  # The last callback asked to retry; its lines are handed over again on the next poll
+        self.stats = {"lines": 0, "bytes": 0, "rotations": 0, "truncations": 0, "callback_errors": 0, "retries": 0, "lines_dropped": 0}
+
+    def snapshot(self) -> dict:
+        return {"path": self.path, "inode": self.inode, "offset": self.offset, **self.stats}
+
+
+class _WakeHandler(FileSystemEventHandler):
+    def __init__(self, tailer: "LogTailer"):
+        self.tailer = tailer
+
+    def on_any_event(self, event):
+        paths = {getattr(event, "src_path", None), getattr(event, "dest_path", None)}
+        if paths & self.tailer.watched_paths:
+            self.tailer.wakeup.set()
+
+
+class LogTailer:
+    def __init__(self, offsets_file: str, poll_interval: float):
+        self.offsets_file = offsets_file
+        self.poll_interval = poll_interval
+        self.files: Dict[str, TailedFile] = {}
+        self.watched_paths = set()
+        self.wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._observer = None
+        self._watched_dirs = set()
+        self._checkpoint_dirty = False
+        self._offsets = self._load_offsets()
+
+    # --- Registration ---
+    def register(self, name: str, path: str, on_lines: Callable[[List[bytes]], None], start_at_end: bool = True):
+        """
+        Follows `path` and calls `on_lines(lines)` with lists of complete lines (bytes, without
+        the newline) from the tailer thread. Without a checkpoint, reading starts at the end of
+        the file (only new lines) unless `start_at_end` is False.
+        """
+        tailed = TailedFile(name, path, on_lines, start_at_end)
+        with self._lock:
+            self.files[name] = tailed
+            self.watched_paths.add(tailed.path)
+        if self._observer is not None:
+            self._watch_dir(os.path.dirname(tailed.path))
+        self.wakeup.set()
+        logger.info(f"Log tailer: following '{tailed.path}' as '{name}'.")
+
+    def start(self):
+        """Starts the tailer thread (idempotent)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            if Observer is not None:
+                self._observer = Observer()
+                self._observer.daemon = True
+                for tailed in self.files.values():
+                    self._watch_dir(os.path.dirname(tailed.path))
+                self._observer.start()
+            else:
+                logger.warning(f"watchdog is not installed; log tailer falls back to polling every {self.poll_interval}s.")
+            self._thread = threading.Thread(target=self._run, name="LogTailer", daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stops the thread and writes a final checkpoint."""
+        self._stop.set()
+        self.wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        if self._observer is not None:
+            self._observer.stop()
+        self._checkpoint(force=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {name: tailed.snapshot() for name, tailed in self.files.items()}
+
+    def _watch_dir(self, directory: str):
+        # The directory is watched (not the file) so creation and rename events of rotation are seen.
+        if directory in self._watched_dirs or not os.path.isdir(directory):
+            return
+        try:
+            self._observer.schedule(_WakeHandler(self), directory, recursive=False)
+            self._watched_dirs.add(directory)
+        except OSError as e:
+            logger.warning(f"Log tailer cannot watch '{directory}' ({e}); relying on polling.")
+
+    # --- Offsets ---
+    def _load_offsets(self) -> dict:
+        try:
+            with open(self.offsets_file) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable log tailer checkpoint '{self.offsets_file}': {e}")
+            return {}
+
+    def _checkpoint(self, force: bool = False):
+        if not (self._checkpoint_dirty or force):
+            return
+        with self._lock:
+            # Files that have not been opened yet keep their previous checkpoint.
+            offsets = dict(self._offsets)
+            offsets.update({tailed.path: {"inode": tailed.inode, "offset": tailed.offset} for tailed in self.files.values() if tailed.inode is not None})
+            self._offsets = offsets
+        try:
+            os.makedirs(os.path.dirname(self.offsets_file) or ".", exist_ok=True)
+            temporary = f"{self.offsets_file}.tmp"
+            with open(temporary, "w") as f:
+                json.dump(offsets, f)
+            os.replace(temporary, self.offsets_file)  # Atomic: a crash never leaves a torn checkpoint
+            self._checkpoint_dirty = False
+        except OSError as e:
+            logger.error(f"Could not write log tailer checkpoint '{self.offsets_file}': {e}")
+
+    # --- Reading ---
+    def _open(self, tailed: TailedFile, first_open: bool) -> bool:
+        try:
+            handle = open(tailed.path, "rb")
+        except FileNotFoundError:
+            # Whatever gets written to a file created from now on is new.
+            tailed.start_at_end = False
+            return False
+        status = os.fstat(handle.fileno())
+        inode, size = status.st_ino, status.st_size
+        offset = 0
+        if first_open:
+            saved = self._offsets.get(tailed.path)
+            if saved and saved.get("inode") == inode and saved.get("offset", 0) <= size:
+                offset = saved["offset"]
+                logger.info(f"Log tailer: resuming '{tailed.name}' at byte {offset}.")
+            elif saved is None and tailed.start_at_end:
+                offset = size
+        elif inode == tailed.inode and tailed.offset <= size:
+            offset = tailed.offset  # Reopened after an error, same file
+        handle.seek(offset)
+        tailed.handle, tailed.inode, tailed.offset, tailed.fragment = handle, inode, offset, b""
+        self._checkpoint_dirty = True
+        return True
+
+    def _drain(self, tailed: TailedFile) -> bool:
+        """Reads everything available from the open handle. Returns True if data was read."""
+        read_any = False
+        tailed.failed = False
+        while not self._stop.is_set():
+            chunk = tailed.handle.read(READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            read_any = True
+            data = tailed.fragment + chunk
+            end = data.rfind(b"\n")
+            if end < 0:
+                if len(data) < MAX_LINE_BYTES:
+                    tailed.fragment = data
+                    continue
+                end = len(data) - 1  # Give up waiting for the newline of a runaway line
+            complete, tailed.fragment = data[:end + 1], data[end + 1:]
+            lines = [line.rstrip(b"\r") for line in complete.split(b"\n")[:-1] if line.strip()]
+            if lines:
+                try:
+                    tailed.on_lines(lines)
+                except RetryLater as e:
+                    tailed.stats["retries"] += 1
+                    logger.warning(f"Log tailer: '{tailed.name}' could not process {len(lines)} lines, retrying from byte {tailed.offset} on the next poll: {e}")
+                    # Rewind to the first line not handed over successfully.
+                    tailed.handle.seek(tailed.offset)
+                    tailed.fragment = b""
+                    tailed.failed = True
+                    return read_any
+                except Exception as e:
+                    tailed.stats["callback_errors"] += 1
+                    tailed.stats["lines_dropped"] += len(lines)
+                    logger.error(f"Log tailer: '{tailed.name}' failed to process {len(lines)} lines, skipping them: {e}", exc_info=True)
+            tailed.offset += len(complete)
+            tailed.stats["lines"] += len(lines)
+            tailed.stats["bytes"] += len(complete)
+            self._checkpoint_dirty = True
+        return read_any
+
+    def _poll_file(self, tailed: TailedFile):
+        if tailed.handle is None:
+            if not self._open(tailed, first_open=tailed.inode is None):
+                return
+        self._drain(tailed)
+        if tailed.failed:
+            return  # Retry the same file (and its pending lines) before looking at rotation
+        try:
+            current = os.stat(tailed.path)
+        except FileNotFoundError:
+            return  # Rotated away and not recreated yet; keep the old handle until it is
+        if current.st_ino != tailed.inode:
+            # Rotation: finish the old file first, then start the new one from its beginning.
+            self._drain(tailed)
+            if tailed.failed:
+                return
+            tailed.handle.close()
+            tailed.handle = None
+            tailed.stats["rotations"] += 1
+            logger.info(f"Log tailer: '{tailed.name}' was rotated, following the new file.")
+            if self._open(tailed, first_open=False):
+                self._drain(tailed)
+        elif current.st_size < tailed.offset + len(tailed.fragment):
+            tailed.stats["truncations"] += 1
+            logger.info(f"Log tailer: '{tailed.name}' was truncated, reading from the start.")
+            tailed.handle.seek(0)
+            tailed.offset, tailed.fragment = 0, b""
+            self._drain(tailed)
+
+    def _run(self):
+        logger.info(f"Log tailer started (inotify: {self._observer is not None}, checkpoint: {self.offsets_file}).")
+        while not self._stop.is_set():
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+            with self._lock:
+                files = list(self.files.values())
+            for tailed in files:
+                try:
+                    self._poll_file(tailed)
+                except Exception as e:
+                    logger.error(f"Log tailer error on '{tailed.path}': {e}", exc_info=True)
+                    if tailed.handle is not None:
+                        tailed.handle.close()
+                        tailed.handle = None
+            if self._observer is not None:
+                for tailed in files:
+                    self._watch_dir(os.path.dirname(tailed.path))
+            self._checkpoint()
+        for tailed in self.files.values():
+            if tailed.handle is not None:
+                tailed.handle.close()
+        logger.info("Log tailer stopped.")
+
+
+# Shared by every log parser in the process.
+tailer = LogTailer(settings.LOG_TAILER_OFFSETS_FILE, settings.LOG_TAILER_POLL_INTERVAL)
@@ -0,0 +1,55 @@
+# backend/app/services/packet_cache.py
+"""
+In-process ring of the most recent packets seen by the packet handler.
+
+GET /api/packets polls for "the latest N packets", which the handler has just held in
+memory anyway, so it is answered from here. Only requests that reach past the ring's
+horizon (more matches wanted than the ring still holds) go to PostgreSQL.
+"""
+import threading
+from collections import deque
+from typing import Optional
+
+
+class RecentPacketCache:
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self._packets = deque(maxlen=self.capacity)
+        self._lock = threading.Lock()
+        self.stats = {"packets_seen": 0, "hits": 0, "misses": 0}
+
+    def extend(self, batch: list):
+        """Appends a batch in arrival order; the oldest packets fall off the ring."""
+        if not batch:
+            return
+        with self._lock:
+            self._packets.extend(batch)
+            self.stats["packets_seen"] += len(batch)
+
+    def query(self, limit: int, ip: Optional[str] = None, port: Optional[int] = None, protocol: Optional[str] = None):
+        """
+        Returns up to `limit` matching packets, newest first, or None when the ring cannot
+        answer on its own (fewer than `limit` matches left in it) and the caller should
+        fall back to the database.
+        """
+        protocol = protocol.upper() if protocol else None
+        matches = []
+        with self._lock:
+            if limit <= len(self._packets):
+                for packet in reversed(self._packets):
+                    if ip and ip != packet.get("source_ip") and ip != packet.get("destination_ip"):
+                        continue
+                    if port is not None and port != packet.get("source_port") and port != packet.get("destination_port"):
+                        continue
+                    if protocol and protocol != packet.get("protocol"):
+                        continue
+                    matches.append(packet)
+                    if len(matches) == limit:
+                        break
+            hit = len(matches) == limit
+            self.stats["hits" if hit else "misses"] += 1
+        return matches if hit else None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"capacity": self.capacity, "size": len(self._packets), **self.stats}
@@ -2,104 +2,298 @@
 import logging
 import multiprocessing
 import queue
-import json
-import asyncio
+import csv
+import io
 import os
 import time
 from datetime import datetime, timezone
 
 # --- START OF FINAL FIX: Import 'text' from SQLAlchemy ---
-from sqlalchemy import text
+from sqlalchemy import text, insert
 from sqlalchemy.exc import OperationalError, InterfaceError
 from app.database import SessionLocal
-from app.models import NetworkPacket
+from app.models import NetworkPacket, NetworkFlow
 # --- END OF FINAL FIX ---
 
 from app.routers.connection_manager import manager
 from app.state import app_state
+from app.config import settings
+from app.services import ek_decoder, shm_ring, backpressure, pcap_stream, traffic_rollups, flow_table, packet_cache, suppression, bandwidth_store
 
 logger = logging.getLogger(__name__)
 
-# No changes to the sniffer process
 def json_sniffer_process(packet_queue: multiprocessing.Queue, pipe_path: str, stop_event: multiprocessing.Event):
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - [json_sniffer_process] - %(levelname)s - %(message)s')
     proc_logger = logging.getLogger(__name__)
-    proc_logger.info(f"JSON sniffer process started. Monitoring pipe: '{pipe_path}'.")
+    proc_logger.info(f"JSON sniffer process started. Monitoring pipe: '{pipe_path}' (JSON backend: {ek_decoder.JSON_BACKEND}).")
     while not stop_event.is_set():
         try:
             proc_logger.info(f"Opening pipe '{pipe_path}'. Waiting for data stream...")
-            with open(pipe_path, 'r') as f:
+            with open(pipe_path, 'rb') as f:
                 for line in f:
                     if stop_event.is_set(): break
-                    try:
-                        ek_doc = json.loads(line)
-                        layers = ek_doc.get("layers")
-                        if not layers: continue
-                        timestamp_str = ek_doc.get("timestamp")
-                        packet_data = {
-                            "@timestamp": datetime.fromtimestamp(float(timestamp_str)/1000, tz=timezone.utc).isoformat(),
-                            "source_ip": layers.get("ip", {}).get("ip_ip_src"), "destination_ip": layers.get("ip", {}).get("ip_ip_dst"),
-                            "length": int(layers.get("frame", {}).get("frame_frame_len", 0)), "ttl": int(layers.get("ip", {}).get("ip_ip_ttl", 0)),
-                            "protocol": "UNKNOWN", "source_mac": layers.get("eth", {}).get("eth_eth_src"), "destination_mac": layers.get("eth", {}).get("eth_eth_dst"),
-                            "source_port": None, "destination_port": None, "flags": None
-                        }
-                        if "tcp" in layers:
-                            packet_data["protocol"] = "TCP"; packet_data["source_port"] = int(layers["tcp"].get("tcp_tcp_srcport", 0)); packet_data["destination_port"] = int(layers["tcp"].get("tcp_tcp_dstport", 0))
-                        elif "udp" in layers:
-                            packet_data["protocol"] = "UDP"; packet_data["source_port"] = int(layers["udp"].get("udp_udp_srcport", 0)); packet_data["destination_port"] = int(layers["udp"].get("udp_udp_dstport", 0))
-                        elif "icmp" in layers: packet_data["protocol"] = "ICMP"
-                        if packet_data["source_ip"] and packet_data["destination_ip"]: packet_queue.put(packet_data)
-                    except (json.JSONDecodeError, KeyError, AttributeError): continue
+                    packet_data = ek_decoder.ek_line_to_packet(line)
+                    if packet_data: packet_queue.put(packet_data)
             proc_logger.warning("Stream ended. Will attempt to reopen in 2 seconds."); time.sleep(2)
         except Exception as e:
             proc_logger.error(f"An unexpected error occurred in the JSON sniffer loop: {e}", exc_info=True); proc_logger.info("Restarting sniffer loop after a 5 second delay..."); time.sleep(5)
     proc_logger.info("Sniffer process received stop signal and is shutting down.")
 
 
+def create_packet_transport():
+    """
+    Builds the channel between the sniffer process(es) and the handler thread:
+    a shared-memory PacketRing when PACKET_TRANSPORT=shm, otherwise a BoundedPacketQueue.
+    Both are bounded and drop (with accounting) instead of blocking the producer.
+    """
+    if settings.PACKET_TRANSPORT == "shm":
+        return shm_ring.PacketRing(settings.PACKET_RING_CAPACITY)
+    return backpressure.BoundedPacketQueue(settings.PACKET_QUEUE_MAX_DEPTH)
+
+
+def transport_stats(packet_queue) -> dict:
+    """Depth and drop counters of the packet transport, for monitoring."""
+    if packet_queue is None:
+        return {}
+    if isinstance(packet_queue, shm_ring.PacketRing):
+        return packet_queue.stats()
+    try:
+        depth = packet_queue.qsize()
+    except NotImplementedError:  # Not available on every platform
+        depth = None
+    return {"type": "queue", "capacity": packet_queue.maxsize, "depth": depth, "dropped": packet_queue.dropped}
+
+
+def start_sniffer(packet_queue: multiprocessing.Queue, pipe_path: str, stop_event: multiprocessing.Event) -> list:
+    """
+    Starts the decoding stage that feeds `packet_queue`: the native pcap reader when
+    PACKET_INGEST_FORMAT=pcap, otherwise the single json_sniffer_process or the sharded
+    EK decoder pool when PACKET_DECODER_WORKERS > 1. Returns the started processes.
+    """
+    if settings.PACKET_INGEST_FORMAT == "pcap":
+        sniffer_process = multiprocessing.Process(target=pcap_stream.pcap_sniffer_process, args=(packet_queue, pipe_path, stop_event), daemon=True)
+        sniffer_process.start()
+        return [sniffer_process]
+    workers = settings.PACKET_DECODER_WORKERS
+    if workers > 1:
+        return ek_decoder.start_decoder_pool(packet_queue, pipe_path, stop_event, workers)
+    sniffer_process = multiprocessing.Process(target=json_sniffer_process, args=(packet_queue, pipe_path, stop_event), daemon=True)
+    sniffer_process.start()
+    return [sniffer_process]
+
+
+# --- Batched PostgreSQL writer ---
+# Column order used for both the COPY stream and the multi-row INSERT.
+PACKET_COLUMNS = (
+    "timestamp", "source_ip", "destination_ip", "source_mac", "destination_mac",
+    "protocol", "length", "source_port", "destination_port", "ttl", "flags",
+)
+COPY_SQL = f"COPY {NetworkPacket.__tablename__} ({', '.join(PACKET_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+STATS_REPORT_INTERVAL_SECONDS = 10
+DB_RECONNECT_INTERVAL_SECONDS = 5
+FLOW_SWEEP_INTERVAL_SECONDS = 1
+
+
+def _to_db_row(packet_data: dict) -> dict:
+    """Maps a packet record produced by the sniffer onto NetworkPacket columns."""
+    row = {column: packet_data.get(column) for column in PACKET_COLUMNS[1:]}
+    row["timestamp"] = datetime.fromisoformat(packet_data["@timestamp"])
+    return row
+
+
+def _drain_batch(packet_queue: multiprocessing.Queue, batch_size: int, flush_interval: float) -> list:
+    """
+    Collects up to `batch_size` packets from the queue. Waits at most `flush_interval`
+    seconds after the first packet arrives, so a quiet link never holds data back for long.
+    """
+    if isinstance(packet_queue, shm_ring.PacketRing):
+        return packet_queue.get_batch(batch_size, flush_interval)
+    batch = [packet_queue.get(timeout=1.0)]  # Raises queue.Empty when the link is idle
+    deadline = time.monotonic() + flush_interval
+    while len(batch) < batch_size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(packet_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _write_batch_copy(db_session, rows: list):
+    """Streams the batch into PostgreSQL with a single COPY ... FROM STDIN."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # An empty unquoted CSV field is read back by COPY as NULL.
+        writer.writerow(["" if row[column] is None else row[column] for column in PACKET_COLUMNS])
+    buffer.seek(0)
+    cursor = db_session.connection().connection.cursor()
+    try:
+        cursor.execute(COPY_SQL, stream=buffer)
+    finally:
+        cursor.close()
+
+
+def _write_batch_insert(db_session, rows: list):
+    """Writes the batch as a multi-row INSERT (SQLAlchemy 'insertmanyvalues')."""
+    db_session.execute(insert(NetworkPacket), rows)
+
+
+def _write_batch_rows(db_session, rows: list):
+    """Legacy behaviour: one ORM object and one commit per packet."""
+    for row in rows:
+        db_session.add(NetworkPacket(**row))
+        db_session.commit()
+
+
+BATCH_WRITERS = {
+    "copy": _write_batch_copy,
+    "insert": _write_batch_insert,
+    "row": _write_batch_rows,
+}
+
+
+def _connect_db():
+    """Opens a session and checks the connection. Returns None when PostgreSQL is unreachable."""
+    logger.info("Packet handler is attempting to connect to the database...")
+    db_session = None
+    try:
+        db_session = SessionLocal()
+        # --- START OF FINAL FIX: Wrap the SQL in text() ---
+        db_session.execute(text('SELECT 1'))
+        # --- END OF FINAL FIX ---
+        logger.info("✅ Database connection successful in packet handler.")
+        return db_session
+    except (OperationalError, InterfaceError) as e:
+        logger.warning(f"Database connection failed in packet handler: {e}. Retrying in {DB_RECONNECT_INTERVAL_SECONDS} seconds...")
+        if db_session: db_session.close()
+        return None
+
+
+def _write_flows(db_session, flows: list):
+    """Inserts exported flow records into network_flows (multi-row INSERT)."""
+    db_session.execute(insert(NetworkFlow), flows)
+
+
 def data_handler_thread(packet_queue: multiprocessing.Queue, stop_event: multiprocessing.Event):
-    logger.info("PostgreSQL Writer & Broadcaster thread started.")
+    write_mode = settings.PACKET_WRITE_MODE if settings.PACKET_WRITE_MODE in BATCH_WRITERS else "copy"
+    write_batch = BATCH_WRITERS[write_mode]
+    batch_size = max(1, settings.PACKET_BATCH_SIZE)
+    flush_interval = max(0, settings.PACKET_FLUSH_INTERVAL_MS) / 1000.0
+    persistence = settings.PACKET_PERSISTENCE if settings.PACKET_PERSISTENCE in ("packets", "flows", "both") else "packets"
+    persist_packets = persistence in ("packets", "both")
+
+    stats = app_state.packet_writer_stats
+    stats.update({
+        "write_mode": write_mode, "persistence": persistence, "batch_size": batch_size, "flush_interval_ms": settings.PACKET_FLUSH_INTERVAL_MS,
+        "rows_written": 0, "flows_written": 0, "flows_unpersisted": 0, "batches_written": 0, "failed_batches": 0,
+        "last_batch_rows": 0, "last_flush_latency_ms": 0.0, "rows_per_second": 0.0,
+    })
+    report_started, report_rows = time.monotonic(), 0
+
+    capacity = transport_stats(packet_queue).get("capacity") or settings.PACKET_QUEUE_MAX_DEPTH
+    shedder = backpressure.LoadShedder(capacity, settings.PACKET_SOFT_WATERMARK, settings.PACKET_HARD_WATERMARK, settings.PACKET_SAMPLE_RATE)
+    app_state.packet_load_shedder = shedder
+
+    flows = None
+    if persistence in ("flows", "both"):
+        flows = flow_table.FlowTable(settings.FLOW_TABLE_MAX_FLOWS, settings.FLOW_IDLE_TIMEOUT, settings.FLOW_ACTIVE_TIMEOUT)
+        app_state.packet_flow_table = flows
+    next_flow_sweep = time.monotonic() + FLOW_SWEEP_INTERVAL_SECONDS
+
+    recent_packets = packet_cache.RecentPacketCache(settings.PACKET_CACHE_SIZE)
+    app_state.recent_packets = recent_packets
+    bandwidth = bandwidth_store.get_store()
+    app_state.bandwidth_store = bandwidth
+
+    logger.info(f"PostgreSQL Writer & Broadcaster thread started (mode={write_mode}, persistence={persistence}, batch_size={batch_size}, flush_interval={flush_interval}s).")
     db_session = None
-    while not stop_event.is_set():
+    next_connect_attempt = 0.0
+    finished_flows = []
+    while True:
+        stopping = stop_event.is_set()
         try:
+            # Never stop draining the transport while PostgreSQL is away: broadcasting and
+            # accounting carry on, only persistence is skipped until the reconnect succeeds.
+            if db_session is None and time.monotonic() >= next_connect_attempt:
+                db_session = _connect_db()
+                next_connect_attempt = time.monotonic() + DB_RECONNECT_INTERVAL_SECONDS
+            try:
+                batch = [] if stopping else _drain_batch(packet_queue, batch_size, flush_interval)
+            except queue.Empty:
+                batch = []
+            # Packets from suppressed ranges are dropped before anything else sees them.
+            batch = suppression.suppressor.filter_packets(batch)
+            # Coalesced into one WebSocket frame per broadcaster tick.
+            manager.publish_packets(batch)
+            recent_packets.extend(batch)
+            bandwidth.add_packets(batch)
+            to_persist = shedder.select(batch, transport_stats(packet_queue).get("depth")) if batch else []
+            if not persist_packets:
+                to_persist = []
+            if flows is not None:
+                # The flow table sees every packet, whatever the load-shedding mode.
+                finished_flows += flows.update(batch)
+                if stopping:
+                    finished_flows += flows.flush()
+                elif time.monotonic() >= next_flow_sweep:
+                    finished_flows += flows.sweep()
+                    next_flow_sweep = time.monotonic() + FLOW_SWEEP_INTERVAL_SECONDS
+            # The idle/no-database shortcuts must still honour a stop request, or the loop spins forever.
+            if not (batch or finished_flows):
+                if stopping:
+                    break
+                continue
             if db_session is None:
-                logger.info("Packet handler is attempting to connect to the database...")
-                try:
-                    db_session = SessionLocal()
-                    # --- START OF FINAL FIX: Wrap the SQL in text() ---
-                    db_session.execute(text('SELECT 1'))
-                    # --- END OF FINAL FIX ---
-                    logger.info("✅ Database connection successful in packet handler.")
-                except (OperationalError, InterfaceError) as e:
-                    logger.warning(f"Database connection failed in packet handler: {e}. Retrying in 5 seconds...")
-                    if db_session: db_session.close()
-                    db_session = None
-                    time.sleep(5)
-                    continue
-            packet_data = packet_queue.get(timeout=1.0)
-            broadcast_message = {"type": "packet_data", "data": packet_data}
-            json_string_message = json.dumps(broadcast_message, default=str)
-            main_loop = app_state.main_event_loop
-            if main_loop and main_loop.is_running():
-                asyncio.run_coroutine_threadsafe(manager.broadcast(json_string_message), main_loop)
+                shedder.record_unpersisted(len(to_persist))
+                stats["flows_unpersisted"] += len(finished_flows)
+                finished_flows = []
+                if stopping:
+                    break
+                continue
             try:
-                db_packet_data = packet_data.copy()
-                iso_timestamp = db_packet_data.pop("@timestamp")
-                db_packet_data["timestamp"] = datetime.fromisoformat(iso_timestamp)
-                new_packet = NetworkPacket(**db_packet_data)
-                db_session.add(new_packet)
+                flush_started = time.monotonic()
+                if to_persist:
+                    write_batch(db_session, [_to_db_row(packet_data) for packet_data in to_persist])
+                # Rollups count the whole batch, including packets shed from raw persistence.
+                traffic_rollups.write_rollups(db_session, batch)
+                if finished_flows:
+                    _write_flows(db_session, finished_flows)
                 db_session.commit()
+                stats["last_flush_latency_ms"] = round((time.monotonic() - flush_started) * 1000, 2)
+                stats["last_batch_rows"] = len(to_persist)
+                stats["rows_written"] += len(to_persist)
+                stats["flows_written"] += len(finished_flows)
+                stats["batches_written"] += 1
+                report_rows += len(to_persist)
+                shedder.record_persisted(len(to_persist))
             except (OperationalError, InterfaceError) as e:
-                logger.error(f"Lost PostgreSQL connection, will attempt to reconnect: {e}")
+                stats["failed_batches"] += 1
+                stats["flows_unpersisted"] += len(finished_flows)
+                shedder.record_unpersisted(len(to_persist))
+                logger.error(f"Lost PostgreSQL connection, will attempt to reconnect ({len(to_persist)} packets, {len(finished_flows)} flows not written): {e}")
                 db_session.close()
                 db_session = None
             except Exception as e:
-                logger.error(f"Failed to write packet to PostgreSQL: {e}")
+                stats["failed_batches"] += 1
+                stats["flows_unpersisted"] += len(finished_flows)
+                logger.error(f"Failed to write {len(to_persist)} packets and {len(finished_flows)} flows to PostgreSQL: {e}")
                 db_session.rollback()
-        except queue.Empty:
-            continue
+            finished_flows = []
         except Exception as e:
             logger.error(f"An unexpected outer loop error occurred in data handler: {e}", exc_info=True)
             time.sleep(5)
+        finally:
+            elapsed = time.monotonic() - report_started
+            if elapsed >= STATS_REPORT_INTERVAL_SECONDS:
+                stats["rows_per_second"] = round(report_rows / elapsed, 1)
+                if report_rows:
+                    logger.info(f"Packet writer: {stats['rows_per_second']} rows/s, last flush {stats['last_batch_rows']} rows in {stats['last_flush_latency_ms']} ms.")
+                report_started, report_rows = time.monotonic(), 0
+        if stopping:
+            break
     if db_session:
         db_session.close()
-    logger.info("PostgreSQL data handler thread shutting down.")
\ No newline at end of file
+    logger.info("PostgreSQL data handler thread shutting down.")
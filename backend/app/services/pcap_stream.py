@@ -0,0 +1,260 @@
+# backend/app/services/pcap_stream.py
+"""
+Native ingestion of a raw libpcap stream (PACKET_INGEST_FORMAT=pcap).
+
+The packet-streamer then writes `tshark -F pcap -w -` (or `dumpcap -P -w -`) into
+the FIFO instead of `tshark -T ek`, and this module decodes the pcap record headers
+and the Ethernet / IPv4 / IPv6 / TCP / UDP / ICMP headers with `struct` over
+memoryviews. It produces exactly the packet record the EK path builds, with no JSON
+on either side of the pipe.
+
+Only the classic pcap container is understood (not pcapng), hence `-F pcap`.
+
+Both decoders must agree record for record; check them against tshark on a capture
+(a small built-in fixture covering IPv4/IPv6/VLAN/fragments/ICMPv6 by default):
+
+    python -m app.services.pcap_stream parity [capture.pcap] [--tshark tshark]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+PIPE_READ_BYTES = 256 * 1024
+
+# Global header magic -> (byte order, fractional timestamp unit per millisecond)
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1000),        # microsecond resolution, little endian
+    b"\xa1\xb2\xc3\xd4": (">", 1000),        # microsecond resolution, big endian
+    b"\x4d\x3c\xb2\xa1": ("<", 1000000),     # nanosecond resolution, little endian
+    b"\xa1\xb2\x3c\x4d": (">", 1000000),     # nanosecond resolution, big endian
+}
+GLOBAL_HEADER_SIZE = 24
+RECORD_HEADER_SIZE = 16
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+VLAN_ETHERTYPES = (0x8100, 0x88A8)
+
+IPPROTO_ICMP, IPPROTO_TCP, IPPROTO_UDP, IPPROTO_ICMPV6 = 1, 6, 17, 58
+IPV6_EXTENSION_HEADERS = (0, 43, 60)  # hop-by-hop, routing, destination options
+IPV6_FRAGMENT_HEADER = 44
+
+
+def _format_mac(raw) -> str:
+    return bytes(raw).hex(":")
+
+
+def _ip_to_str(raw) -> str:
+    return socket.inet_ntop(socket.AF_INET if len(raw) == 4 else socket.AF_INET6, bytes(raw))
+
+
+def parse_frame(linktype: int, timestamp_ms: int, orig_len: int, frame: memoryview):
+    """Decodes one captured frame into a packet record, or None for non-IP and truncated frames (the EK path skips those too)."""
+    source_mac = destination_mac = None
+    if linktype == LINKTYPE_ETHERNET:
+        if len(frame) < 14: return None
+        destination_mac, source_mac = _format_mac(frame[0:6]), _format_mac(frame[6:12])
+        ethertype, offset = struct.unpack_from("!H", frame, 12)[0], 14
+        while ethertype in VLAN_ETHERTYPES and len(frame) >= offset + 4:
+            ethertype, offset = struct.unpack_from("!H", frame, offset + 2)[0], offset + 4
+    elif linktype == LINKTYPE_LINUX_SLL:
+        if len(frame) < 16: return None
+        ethertype, offset = struct.unpack_from("!H", frame, 14)[0], 16
+    elif linktype == LINKTYPE_RAW:
+        if not len(frame): return None
+        ethertype, offset = (ETHERTYPE_IPV4 if frame[0] >> 4 == 4 else ETHERTYPE_IPV6), 0
+    else:
+        return None
+
+    packet_data = {
+        "@timestamp": datetime.fromtimestamp(timestamp_ms/1000, tz=timezone.utc).isoformat(),
+        "source_ip": None, "destination_ip": None, "length": orig_len, "ttl": 0,
+        "protocol": "UNKNOWN", "source_mac": source_mac, "destination_mac": destination_mac,
+        "source_port": None, "destination_port": None, "flags": None,
+        "interface": None,  # The classic pcap container does not record the interface
+    }
+
+    if ethertype == ETHERTYPE_IPV4:
+        if len(frame) < offset + 20: return None
+        version_ihl, _, _, _, frag, ttl, proto, _, src, dst = struct.unpack_from("!BBHHHBBH4s4s", frame, offset)
+        packet_data["source_ip"], packet_data["destination_ip"], packet_data["ttl"] = _ip_to_str(src), _ip_to_str(dst), ttl
+        transport_offset = offset + (version_ihl & 0x0F) * 4
+        first_fragment = (frag & 0x1FFF) == 0
+    elif ethertype == ETHERTYPE_IPV6:
+        if len(frame) < offset + 40: return None
+        _, _, proto, hop_limit, src, dst = struct.unpack_from("!IHBB16s16s", frame, offset)
+        packet_data["source_ip"], packet_data["destination_ip"], packet_data["ttl"] = _ip_to_str(src), _ip_to_str(dst), hop_limit
+        transport_offset, first_fragment = offset + 40, True
+        # Walk the extension header chain to reach the upper-layer protocol.
+        while proto in IPV6_EXTENSION_HEADERS + (IPV6_FRAGMENT_HEADER,) and len(frame) >= transport_offset + 8:
+            next_proto, ext_len = frame[transport_offset], frame[transport_offset + 1]
+            if proto == IPV6_FRAGMENT_HEADER:
+                first_fragment = (struct.unpack_from("!H", frame, transport_offset + 2)[0] & 0xFFF8) == 0
+                transport_offset += 8
+            else:
+                transport_offset += (ext_len + 1) * 8
+            proto = next_proto
+    else:
+        return None  # Non-IP frames have no ip layer in EK either
+
+    if not first_fragment:
+        return packet_data  # tshark shows no transport layer on non-first fragments
+    if proto in (IPPROTO_TCP, IPPROTO_UDP):
+        packet_data["protocol"] = "TCP" if proto == IPPROTO_TCP else "UDP"
+        ports = struct.unpack_from("!HH", frame, transport_offset) if len(frame) >= transport_offset + 4 else (0, 0)
+        packet_data["source_port"], packet_data["destination_port"] = ports
+        if proto == IPPROTO_TCP and len(frame) >= transport_offset + 14:
+            packet_data["flags"] = f"0x{struct.unpack_from('!H', frame, transport_offset + 12)[0] & 0x0FFF:04x}"  # Same rendering as tshark's tcp.flags
+    elif proto in (IPPROTO_ICMP, IPPROTO_ICMPV6):
+        packet_data["protocol"] = "ICMP"
+    return packet_data
+
+
+def iter_pcap_packets(stream, stop_event: multiprocessing.Event = None):
+    """
+    Yields packet records from a binary pcap stream. The stream is read in large
+    blocks and every record is decoded in place through a memoryview of its block.
+    """
+    header = b""
+    while len(header) < GLOBAL_HEADER_SIZE:
+        block = stream.read(GLOBAL_HEADER_SIZE - len(header))
+        if not block: return
+        header += block
+    if header[:4] not in PCAP_MAGIC:
+        raise ValueError(f"Not a classic pcap stream (magic {header[:4].hex()}); is the streamer writing pcapng? Use 'tshark -F pcap'.")
+    order, units_per_ms = PCAP_MAGIC[header[:4]]
+    linktype = struct.unpack_from(order + "I", header, 20)[0] & 0x0FFFFFFF
+    record_header = struct.Struct(order + "IIII")
+
+    pending = b""
+    while not (stop_event and stop_event.is_set()):
+        block = stream.read1(PIPE_READ_BYTES)
+        if not block: return
+        buffer = pending + block if pending else block
+        view = memoryview(buffer)
+        offset = 0
+        while len(buffer) - offset >= RECORD_HEADER_SIZE:
+            ts_sec, ts_frac, incl_len, orig_len = record_header.unpack_from(view, offset)
+            end = offset + RECORD_HEADER_SIZE + incl_len
+            if end > len(buffer): break
+            packet_data = parse_frame(linktype, ts_sec * 1000 + ts_frac // units_per_ms, orig_len, view[offset + RECORD_HEADER_SIZE:end])
+            if packet_data: yield packet_data
+            offset = end
+        view.release()
+        pending = buffer[offset:]
+
+
+def pcap_sniffer_process(packet_queue: multiprocessing.Queue, pipe_path: str, stop_event: multiprocessing.Event):
+    """Counterpart of json_sniffer_process for a raw pcap FIFO."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - [pcap_sniffer_process] - %(levelname)s - %(message)s')
+    proc_logger = logging.getLogger(__name__)
+    proc_logger.info(f"pcap sniffer process started. Monitoring pipe: '{pipe_path}'.")
+    while not stop_event.is_set():
+        try:
+            proc_logger.info(f"Opening pipe '{pipe_path}'. Waiting for pcap stream...")
+            with open(pipe_path, 'rb') as f:
+                for packet_data in iter_pcap_packets(f, stop_event):
+                    packet_queue.put(packet_data)
+            proc_logger.warning("Stream ended. Will attempt to reopen in 2 seconds."); time.sleep(2)
+        except Exception as e:
+            proc_logger.error(f"An unexpected error occurred in the pcap sniffer loop: {e}", exc_info=True); proc_logger.info("Restarting sniffer loop after a 5 second delay..."); time.sleep(5)
+    proc_logger.info("pcap sniffer process received stop signal and is shutting down.")
+
+
+# --- Parity with the EK path ---
+
+def _fixture_frames() -> list:
+    """Ethernet frames exercising every branch of parse_frame."""
+    def ethernet(ethertype: int, payload: bytes, vlan: int = None) -> bytes:
+        header = bytes.fromhex("020000000002") + bytes.fromhex("020000000001")
+        if vlan is not None:
+            header += struct.pack("!HH", VLAN_ETHERTYPES[0], vlan)
+        return header + struct.pack("!H", ethertype) + payload
+
+    def ipv4(proto: int, payload: bytes, ttl: int = 64, frag: int = 0) -> bytes:
+        return struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(payload), 1, frag, ttl, proto, 0,
+                           socket.inet_aton("10.0.0.1"), socket.inet_aton("192.168.1.20")) + payload
+
+    def ipv6(next_header: int, payload: bytes, hop_limit: int = 64) -> bytes:
+        return struct.pack("!IHBB16s16s", 6 << 28, len(payload), next_header, hop_limit,
+                           socket.inet_pton(socket.AF_INET6, "2001:db8::1"), socket.inet_pton(socket.AF_INET6, "2001:db8::20")) + payload
+
+    tcp = struct.pack("!HHIIHHHH", 51000, 443, 1, 0, (5 << 12) | 0x012, 65535, 0, 0)
+    udp = struct.pack("!HHHH", 53000, 53, 8 + 4, 0) + b"test"
+    icmp_echo = struct.pack("!BBHHH", 8, 0, 0, 1, 1) + b"ping"
+    icmpv6_echo = struct.pack("!BBHHH", 128, 0, 0, 1, 1) + b"ping"
+    hop_by_hop = struct.pack("!BB6s", IPPROTO_TCP, 0, b"\x01\x04\x00\x00\x00\x00")
+    return [
+        ethernet(ETHERTYPE_IPV4, ipv4(IPPROTO_TCP, tcp)),
+        ethernet(ETHERTYPE_IPV4, ipv4(IPPROTO_UDP, udp, ttl=128)),
+        ethernet(ETHERTYPE_IPV4, ipv4(IPPROTO_ICMP, icmp_echo, ttl=255)),
+        ethernet(ETHERTYPE_IPV4, ipv4(IPPROTO_UDP, udp, frag=0x0001)),  # Non-first fragment
+        ethernet(ETHERTYPE_IPV4, ipv4(IPPROTO_TCP, tcp), vlan=100),
+        ethernet(ETHERTYPE_IPV6, ipv6(IPPROTO_TCP, tcp)),
+        ethernet(ETHERTYPE_IPV6, ipv6(0, hop_by_hop + tcp)),  # Hop-by-hop extension header
+        ethernet(ETHERTYPE_IPV6, ipv6(IPPROTO_UDP, udp, hop_limit=1)),
+        ethernet(ETHERTYPE_IPV6, ipv6(IPPROTO_ICMPV6, icmpv6_echo, hop_limit=255)),
+        ethernet(0x0806, bytes(28)),  # ARP: skipped by both decoders
+    ]
+
+
+def write_fixture_capture(path: str):
+    """Writes the fixture frames as a microsecond pcap, one millisecond apart."""
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, LINKTYPE_ETHERNET))
+        for i, frame in enumerate(_fixture_frames()):
+            f.write(struct.pack("<IIII", 1700000000, i * 1000, len(frame), len(frame)) + frame)
+
+
+def parity_mismatches(capture_path: str, tshark: str = "tshark") -> list:
+    """Decodes `capture_path` natively and through `tshark -T ek`; returns the differing records."""
+    from app.services import ek_decoder
+
+    with open(capture_path, "rb") as f:
+        native = list(iter_pcap_packets(f))
+    output = subprocess.run([tshark, "-r", capture_path, "-T", "ek"], capture_output=True, check=True, timeout=120).stdout
+    ek = [packet for packet in map(ek_decoder.ek_line_to_packet, output.splitlines()) if packet is not None]
+    mismatches = [{"index": i, "pcap": a, "ek": b} for i, (a, b) in enumerate(zip(native, ek)) if a != b]
+    if len(native) != len(ek):
+        mismatches.append({"index": None, "pcap": f"{len(native)} records", "ek": f"{len(ek)} records"})
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the pcap decoder and the EK decoder produce identical packet records.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    parity_parser = commands.add_parser("parity", help="decode a capture both ways and compare the records")
+    parity_parser.add_argument("capture", nargs="?", help="classic pcap file (default: a built-in fixture)")
+    parity_parser.add_argument("--tshark", default="tshark", help="tshark binary used for the EK side")
+    args = parser.parse_args()
+
+    logging.basicConfig(level="INFO", format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    with tempfile.TemporaryDirectory(prefix="netguard-parity-") as workdir:
+        capture = args.capture
+        if capture is None:
+            capture = os.path.join(workdir, "fixture.pcap")
+            write_fixture_capture(capture)
+        mismatches = parity_mismatches(capture, args.tshark)
+    for mismatch in mismatches:
+        logger.error(f"Record {mismatch['index']} differs:\n  pcap: {mismatch['pcap']}\n  ek:   {mismatch['ek']}")
+    if mismatches:
+        sys.exit(1)
+    logger.info("pcap and EK decoders agree.")
+
+
+if __name__ == "__main__":
+    main()
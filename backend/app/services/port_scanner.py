@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import select
 from app.database import SessionLocal
 from app.models import Host, NetworkPort
+from app.routers.connection_manager import manager
 
 logger = logging.getLogger(__name__)
 
@@ -17,9 +18,11 @@ def scan_ports():
     try:
         stmt = select(Host).where(Host.status == 'up').options(joinedload(Host.ports))
         hosts = db.scalars(stmt).unique().all()
+        manager.publish_scan_progress("port_scan", "started", completed=0, total=len(hosts))
 
-        for host in hosts:
+        for scanned, host in enumerate(hosts, start=1):
             logger.info(f"🔍 Scanning ports on {host.ip_address}...")
+            manager.publish_scan_progress("port_scan", "running", target=host.ip_address, completed=scanned - 1, total=len(hosts))
             try:
                 nm.scan(hosts=host.ip_address, arguments='-sS -sU -T4 -Pn --top-ports 100')
                 
@@ -66,5 +69,7 @@ def scan_ports():
             except Exception as e:
                 logger.error(f"Error scanning ports for {host.ip_address}: {e}", exc_info=True)
                 db.rollback()
+                manager.publish_scan_progress("port_scan", "error", target=host.ip_address, completed=scanned, total=len(hosts))
+        manager.publish_scan_progress("port_scan", "complete", completed=len(hosts), total=len(hosts))
     finally:
         db.close()
\ No newline at end of file
@@ -0,0 +1,119 @@
+# backend/app/services/query_cache.py
+"""
+LRU cache of investigation /query results.
+
+The workbench query covers `now-Nh/h` .. `now/h`, so within one clock hour the same
+question asks Elasticsearch the same thing. Results are keyed by a normalized
+(query_string, index, time_range_hours, size) plus the current UTC hour; when the hour
+rolls over every entry is dropped at once.
+
+The cache is bounded by INVESTIGATION_CACHE_MAX_BYTES, measured as the JSON size of
+each result, and evicts least recently used entries first. Concurrent identical misses
+share one Elasticsearch request; if that request is cancelled, its waiters fetch again.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_key(query_string: str, index: str, time_range_hours: int, size: int) -> tuple:
+    """Whitespace runs collapse and index names are case-insensitive; Lucene syntax is otherwise kept as is."""
+    return " ".join(query_string.split()), index.strip().lower(), time_range_hours, size
+
+
+class QueryResultCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hour = None
+        self.bytes = 0
+        self._entries = OrderedDict()  # key -> (result, size in bytes), least recently used first
+        self._inflight = {}  # key -> asyncio.Future of the running fetch
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "rollovers": 0, "uncacheable": 0}
+
+    def _check_hour(self):
+        hour = int(time.time() // 3600)
+        if hour != self.hour:
+            if self._entries:
+                self.stats["rollovers"] += 1
+                logger.info(f"Investigation query cache: hour rolled over, dropping {len(self._entries)} entries.")
+            self.clear()
+            self.hour = hour
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def _store(self, key: tuple, result):
+        size = len(json.dumps(result, default=str))
+        if size > self.max_bytes:
+            self.stats["uncacheable"] += 1
+            return
+        self._entries[key] = (result, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.bytes -= evicted
+            self.stats["evictions"] += 1
+
+    async def get_or_fetch(self, key: tuple, fetch: Callable[[], Awaitable]):
+        """The cached result for `key`, else the result of `fetch()` (cached unless it raises)."""
+        self._check_hour()
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[0]
+        running = self._inflight.get(key)
+        if running is not None:
+            self.stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(running)
+            except asyncio.CancelledError:
+                if not running.cancelled():
+                    raise  # This request itself was cancelled
+                # The request running the fetch was cancelled; fetch again (the first waiter leads).
+                return await self.get_or_fetch(key, fetch)
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        hour = self.hour
+        try:
+            result = await fetch()
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Retrieved here, so an error nobody else awaited is not logged as unhandled
+            raise
+        else:
+            future.set_result(result)
+            # A result fetched across the hour boundary may already be stale.
+            if hour == int(time.time() // 3600):
+                self._check_hour()
+                self._store(key, result)
+            return result
+        finally:
+            # Cancelled (or interrupted by any other BaseException): waiters must not hang on it.
+            if not future.done():
+                future.cancel()
+            self._inflight.pop(key, None)
+
+    def snapshot(self) -> dict:
+        self._check_hour()
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hit_ratio": round((self.stats["hits"] + self.stats["coalesced"]) / lookups, 3) if lookups else None,
+            **self.stats,
+        }
+
+
+# Shared by every investigation /query request (all on the event loop, so no lock is needed).
+query_cache = QueryResultCache(settings.INVESTIGATION_CACHE_MAX_BYTES)
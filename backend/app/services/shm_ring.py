@@ -0,0 +1,164 @@
+# backend/app/services/shm_ring.py
+"""
+Single-producer / single-consumer ring buffer of fixed-width packet records in
+`multiprocessing.shared_memory`. It replaces the pickling multiprocessing.Queue
+between the sniffer process and the handler thread when PACKET_TRANSPORT=shm.
+
+Layout of the shared block:
+
+    [0:8]   write_seq  (only ever written by the producer)
+    [8:16]  read_seq   (only ever written by the consumer)
+    [16:24] dropped    (records rejected because the ring was full; producer-owned)
+    [64:]   capacity x RECORD records
+
+Each counter has exactly one writer, so no lock is needed: the producer fills a
+slot before publishing it by bumping write_seq, and the consumer releases slots
+by bumping read_seq only after it has decoded them.
+"""
+import queue
+import socket
+import struct
+import time
+from datetime import datetime, timezone
+from multiprocessing import shared_memory
+
+HEADER = struct.Struct("<QQQ")
+HEADER_SIZE = 64
+# ts, ip version, src ip, dst ip, src mac, dst mac, presence bits, protocol, length, sport, dport, ttl, flags
+RECORD = struct.Struct("<dB16s16s6s6sBBIHHB10s")
+
+PROTOCOLS = ("UNKNOWN", "TCP", "UDP", "ICMP")
+PROTOCOL_CODES = {name: code for code, name in enumerate(PROTOCOLS)}
+
+HAS_SRC_MAC, HAS_DST_MAC, HAS_SRC_PORT, HAS_DST_PORT, HAS_TTL = 1, 2, 4, 8, 16
+POLL_INTERVAL_SECONDS = 0.002
+
+
+def _pack_ip(address: str):
+    if ":" in address:
+        return 6, socket.inet_pton(socket.AF_INET6, address)
+    return 4, socket.inet_pton(socket.AF_INET, address)
+
+
+def encode_packet(packet_data: dict) -> tuple:
+    """Converts a packet record dict into the field tuple stored in the ring."""
+    version, src_ip = _pack_ip(packet_data["source_ip"])
+    _, dst_ip = _pack_ip(packet_data["destination_ip"])
+    present = 0
+    src_mac = packet_data.get("source_mac")
+    dst_mac = packet_data.get("destination_mac")
+    if src_mac: present |= HAS_SRC_MAC; src_mac = bytes.fromhex(src_mac.replace(":", ""))
+    if dst_mac: present |= HAS_DST_MAC; dst_mac = bytes.fromhex(dst_mac.replace(":", ""))
+    if packet_data.get("source_port") is not None: present |= HAS_SRC_PORT
+    if packet_data.get("destination_port") is not None: present |= HAS_DST_PORT
+    if packet_data.get("ttl") is not None: present |= HAS_TTL
+    return (
+        datetime.fromisoformat(packet_data["@timestamp"]).timestamp(), version, src_ip, dst_ip,
+        src_mac or b"", dst_mac or b"", present, PROTOCOL_CODES.get(packet_data.get("protocol"), 0),
+        packet_data.get("length") or 0, packet_data.get("source_port") or 0, packet_data.get("destination_port") or 0,
+        packet_data.get("ttl") or 0, (packet_data.get("flags") or "").encode()[:10],
+    )
+
+
+def decode_packet(fields: tuple) -> dict:
+    """Inverse of encode_packet: rebuilds the packet record dict from a ring record."""
+    ts, version, src_ip, dst_ip, src_mac, dst_mac, present, protocol, length, sport, dport, ttl, flags = fields
+    family, width = (socket.AF_INET6, 16) if version == 6 else (socket.AF_INET, 4)
+    return {
+        "@timestamp": datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(),
+        "source_ip": socket.inet_ntop(family, src_ip[:width]), "destination_ip": socket.inet_ntop(family, dst_ip[:width]),
+        "length": length, "ttl": ttl if present & HAS_TTL else None, "protocol": PROTOCOLS[protocol],
+        "source_mac": src_mac.hex(":") if present & HAS_SRC_MAC else None,
+        "destination_mac": dst_mac.hex(":") if present & HAS_DST_MAC else None,
+        "source_port": sport if present & HAS_SRC_PORT else None,
+        "destination_port": dport if present & HAS_DST_PORT else None,
+        "flags": flags.rstrip(b"\0").decode() or None,
+    }
+
+
+class PacketRing:
+    """
+    Fixed-capacity shared-memory ring of packet records.
+
+    Created once in the main process; passing the instance to a child process
+    re-attaches to the same block by name. `put` is the producer side and never
+    blocks (it drops and counts when full), `get_batch` is the consumer side.
+    """
+    def __init__(self, capacity: int, name: str = None):
+        self.capacity = capacity
+        self._owner = name is None
+        size = HEADER_SIZE + capacity * RECORD.size
+        self.shm = shared_memory.SharedMemory(name=name, create=self._owner, size=size)
+        if self._owner:
+            HEADER.pack_into(self.shm.buf, 0, 0, 0, 0)
+
+    def __getstate__(self):
+        return {"capacity": self.capacity, "name": self.shm.name}
+
+    def __setstate__(self, state):
+        self.__init__(state["capacity"], name=state["name"])
+
+    def _counters(self):
+        return HEADER.unpack_from(self.shm.buf, 0)
+
+    # --- Producer side ---
+    def put(self, packet_data: dict) -> bool:
+        write_seq, read_seq, dropped = self._counters()
+        if write_seq - read_seq >= self.capacity:
+            struct.pack_into("<Q", self.shm.buf, 16, dropped + 1)
+            return False
+        try:
+            fields = encode_packet(packet_data)
+        except (OSError, ValueError, TypeError, struct.error):
+            # e.g. tunnelled frames where tshark reports several addresses; count them with the drops
+            struct.pack_into("<Q", self.shm.buf, 16, dropped + 1)
+            return False
+        offset = HEADER_SIZE + (write_seq % self.capacity) * RECORD.size
+        RECORD.pack_into(self.shm.buf, offset, *fields)
+        struct.pack_into("<Q", self.shm.buf, 0, write_seq + 1)  # Publish the slot
+        return True
+
+    # --- Consumer side ---
+    def read(self, max_records: int) -> list:
+        """Decodes up to `max_records` published records straight out of shared memory."""
+        write_seq, read_seq, _ = self._counters()
+        count = min(write_seq - read_seq, max_records)
+        if count <= 0: return []
+        packets = []
+        start = read_seq % self.capacity
+        # At most two contiguous spans: up to the end of the ring, then from its start.
+        for first, n in ((start, min(count, self.capacity - start)), (0, count - min(count, self.capacity - start))):
+            if n <= 0: continue
+            offset = HEADER_SIZE + first * RECORD.size
+            with self.shm.buf[offset:offset + n * RECORD.size] as span:
+                packets.extend(decode_packet(fields) for fields in RECORD.iter_unpack(span))
+        struct.pack_into("<Q", self.shm.buf, 8, read_seq + count)  # Release the slots
+        return packets
+
+    def get_batch(self, max_records: int, flush_interval: float, timeout: float = 1.0) -> list:
+        """
+        Same contract as the queue-based batch drain: waits up to `timeout` for the first
+        record (raising queue.Empty), then up to `flush_interval` to fill the batch.
+        """
+        deadline = time.monotonic() + timeout
+        batch = self.read(max_records)
+        while not batch:
+            if time.monotonic() >= deadline: raise queue.Empty
+            time.sleep(POLL_INTERVAL_SECONDS)
+            batch = self.read(max_records)
+        deadline = time.monotonic() + flush_interval
+        while len(batch) < max_records and time.monotonic() < deadline:
+            more = self.read(max_records - len(batch))
+            if more: batch.extend(more)
+            else: time.sleep(POLL_INTERVAL_SECONDS)
+        return batch
+
+    # --- Monitoring / lifecycle ---
+    def stats(self) -> dict:
+        write_seq, read_seq, dropped = self._counters()
+        return {"type": "shm", "capacity": self.capacity, "depth": write_seq - read_seq, "written": write_seq, "dropped": dropped}
+
+    def close(self):
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
@@ -0,0 +1,219 @@
+# backend/app/services/suppression.py
+"""
+CIDR suppression / allow-list rules for Suricata alerts and live packets.
+
+Rules are read from SUPPRESSION_RULES_FILE (JSON) and reloaded when the file changes:
+
+    {"rules": [
+        {"name": "vuln-scanner", "cidr": "10.0.0.5/32"},
+        {"name": "internal", "cidr": "192.168.0.0/16", "match": "either", "scope": ["alerts"]},
+        {"name": "gateway", "cidr": "192.168.1.1/32", "action": "allow", "match": "either", "scope": ["alerts"]}
+    ]}
+
+    action  "suppress" (default) or "allow"
+    match   which address the prefix is tested against: "source" (default), "destination" or "either"
+    scope   "alerts" and/or "packets" (default both)
+
+For each address the longest matching prefix decides, so an "allow" rule punches a hole in a
+broader "suppress" range. An event is dropped when its source or destination resolves to
+a suppress rule. Lookups are longest-prefix-first probes of one hash table per prefix
+length in use, i.e. at most one probe per distinct length and never more than the
+address width.
+"""
+import ipaddress
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import Counter
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ("alerts", "packets")
+MATCHES = ("source", "destination", "either")
+ACTIONS = ("suppress", "allow")
+
+
+class Rule:
+    __slots__ = ("name", "network", "action", "match", "scope")
+
+    def __init__(self, name: str, network, action: str, match: str, scope: tuple):
+        self.name, self.network, self.action, self.match, self.scope = name, network, action, match, scope
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "cidr": str(self.network), "action": self.action, "match": self.match, "scope": list(self.scope)}
+
+
+class PrefixTable:
+    """Longest-prefix match over IPv4 and IPv6 networks."""
+
+    def __init__(self):
+        # family -> {prefix length -> {network bits -> rule}}, probed longest length first
+        self._tables = {socket.AF_INET: {}, socket.AF_INET6: {}}
+        self._lengths = {socket.AF_INET: [], socket.AF_INET6: []}
+
+    def add(self, rule: Rule):
+        network = rule.network
+        family = socket.AF_INET if network.version == 4 else socket.AF_INET6
+        by_length = self._tables[family].setdefault(network.prefixlen, {})
+        by_length[int(network.network_address) >> (network.max_prefixlen - network.prefixlen)] = rule
+        self._lengths[family] = sorted(self._tables[family], reverse=True)
+
+    def __bool__(self):
+        return any(self._lengths.values())
+
+    def lookup(self, address: str):
+        """The rule of the longest prefix containing `address`, or None (also for unparsable input)."""
+        if not address:
+            return None
+        family = socket.AF_INET6 if ":" in address else socket.AF_INET
+        lengths = self._lengths[family]
+        if not lengths:
+            return None
+        try:
+            value = int.from_bytes(socket.inet_pton(family, address.split("%", 1)[0]), "big")
+        except OSError:
+            return None
+        width = 32 if family == socket.AF_INET else 128
+        tables = self._tables[family]
+        for length in lengths:
+            rule = tables[length].get(value >> (width - length))
+            if rule is not None:
+                return rule
+        return None
+
+
+class RuleSet:
+    def __init__(self, rules: list):
+        self.rules = rules
+        # (scope, "source" | "destination") -> PrefixTable
+        self.tables = {(scope, side): PrefixTable() for scope in SCOPES for side in ("source", "destination")}
+        for rule in rules:
+            for scope in rule.scope:
+                sides = ("source", "destination") if rule.match == "either" else (rule.match,)
+                for side in sides:
+                    self.tables[(scope, side)].add(rule)
+        self.active_scopes = {scope for scope in SCOPES if self.tables[(scope, "source")] or self.tables[(scope, "destination")]}
+
+
+def parse_rules(document: dict) -> list:
+    """Validates a rules document. Raises ValueError describing the first invalid rule."""
+    rules = []
+    for position, entry in enumerate(document.get("rules", [])):
+        try:
+            network = ipaddress.ip_network(entry["cidr"], strict=False)
+        except (KeyError, ValueError) as e:
+            raise ValueError(f"Rule #{position}: invalid or missing 'cidr' ({e})")
+        action = entry.get("action", "suppress")
+        match = entry.get("match", "source")
+        scope = entry.get("scope", list(SCOPES))
+        scope = (scope,) if isinstance(scope, str) else tuple(scope)
+        if action not in ACTIONS or match not in MATCHES or not set(scope) <= set(SCOPES):
+            raise ValueError(f"Rule #{position}: action must be one of {ACTIONS}, match one of {MATCHES}, scope a subset of {SCOPES}")
+        rules.append(Rule(entry.get("name") or str(network), network, action, match, scope))
+    return rules
+
+
+class SuppressionEngine:
+    def __init__(self, rules_file: str, reload_interval: float):
+        self.rules_file = rules_file
+        self.reload_interval = reload_interval
+        self.ruleset = RuleSet([])
+        # One counter per scope, each only written by the thread that serves that scope.
+        self.hits = {scope: Counter() for scope in SCOPES}
+        self.checked = Counter()
+        self.last_error = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.reload(force=True)
+
+    def reload(self, force: bool = False) -> bool:
+        """(Re)loads the rules file if it changed. A broken file keeps the previous rules. Returns True on reload."""
+        with self._lock:
+            try:
+                mtime = os.stat(self.rules_file).st_mtime if self.rules_file else None
+            except FileNotFoundError:
+                mtime = None
+            if mtime == self._mtime and not force:
+                return False
+            try:
+                if mtime is None:
+                    rules = []
+                else:
+                    with open(self.rules_file) as f:
+                        rules = parse_rules(json.load(f))
+            except (OSError, ValueError) as e:
+                self.last_error = str(e)
+                self._mtime = mtime
+                logger.error(f"Keeping the previous suppression rules, '{self.rules_file}' is invalid: {e}")
+                return False
+            self.ruleset = RuleSet(rules)  # Swapped atomically; readers keep whichever set they picked up
+            self._mtime, self.last_error = mtime, None
+            logger.info(f"Loaded {len(rules)} suppression/allow rules from '{self.rules_file}'.")
+            return True
+
+    def _current(self) -> RuleSet:
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.reload_interval
+            self.reload()
+        return self.ruleset
+
+    def _decide(self, ruleset: RuleSet, scope: str, source_ip: str, destination_ip: str):
+        """The deciding rule: a suppress rule if either side resolves to one, else a matching allow rule, else None."""
+        allowed = None
+        for side, address in (("source", source_ip), ("destination", destination_ip)):
+            rule = ruleset.tables[(scope, side)].lookup(address)
+            if rule is not None:
+                if rule.action == "suppress":
+                    return rule
+                allowed = rule
+        return allowed
+
+    def suppresses(self, scope: str, source_ip: str, destination_ip: str) -> bool:
+        """True when the event should be dropped. Counts a hit for the deciding rule (suppress or allow)."""
+        ruleset = self._current()
+        if scope not in ruleset.active_scopes:
+            return False
+        self.checked[scope] += 1
+        rule = self._decide(ruleset, scope, source_ip, destination_ip)
+        if rule is None:
+            return False
+        self.hits[scope][rule.name] += 1
+        return rule.action == "suppress"
+
+    def filter_packets(self, batch: list) -> list:
+        """Returns the packets of `batch` that are not suppressed."""
+        ruleset = self._current()
+        if not batch or "packets" not in ruleset.active_scopes:
+            return batch
+        kept, hits = [], self.hits["packets"]
+        for packet_data in batch:
+            rule = self._decide(ruleset, "packets", packet_data.get("source_ip"), packet_data.get("destination_ip"))
+            if rule is not None:
+                hits[rule.name] += 1
+                if rule.action == "suppress":
+                    continue
+            kept.append(packet_data)
+        self.checked["packets"] += len(batch)
+        return kept
+
+    def snapshot(self) -> dict:
+        return {
+            "rules_file": self.rules_file,
+            "last_error": self.last_error,
+            "rules": [
+                {**rule.to_dict(), "hits": {scope: self.hits[scope][rule.name] for scope in rule.scope}}
+                for rule in self.ruleset.rules
+            ],
+            "checked": dict(self.checked),
+        }
+
+
+# Shared by the alert consumer and the packet handler.
+suppressor = SuppressionEngine(settings.SUPPRESSION_RULES_FILE, settings.SUPPRESSION_RELOAD_INTERVAL)
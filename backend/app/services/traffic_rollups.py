@@ -0,0 +1,92 @@
+# backend/app/services/traffic_rollups.py
+"""
+Per-minute traffic rollups, updated by the packet writer for every batch it drains.
+
+Each batch is first folded in memory into one row per (minute, key), then merged into
+the rollup tables with a single INSERT ... ON CONFLICT DO UPDATE per table, so the
+dashboard distribution queries scan a few rows per minute instead of raw packets.
+
+Rollup tables that are still empty at startup (right after an upgrade, or when the
+conversation rollup is switched on) are backfilled once from network_packets, before
+the packet writer starts.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import func, literal, literal_column, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.config import settings
+from app.database import engine
+from app.models import NetworkPacket, TrafficRollupProtocol, TrafficRollupConversation
+
+logger = logging.getLogger(__name__)
+
+UPSERT_CHUNK_ROWS = 5000
+
+
+def _minute_bucket(iso_timestamp: str) -> datetime:
+    # Packet timestamps are always UTC ISO strings; "YYYY-MM-DDTHH:MM" is the minute.
+    return datetime.fromisoformat(iso_timestamp[:16])
+
+
+def aggregate(batch: list):
+    """Folds a batch of packet records into per-minute protocol (and optionally conversation) counters."""
+    by_protocol = defaultdict(lambda: [0, 0])
+    by_conversation = defaultdict(lambda: [0, 0]) if settings.PACKET_ROLLUP_CONVERSATIONS else None
+    for packet_data in batch:
+        bucket = _minute_bucket(packet_data["@timestamp"])
+        protocol = packet_data.get("protocol") or "UNKNOWN"
+        length = packet_data.get("length") or 0
+        counters = by_protocol[(bucket, protocol)]
+        counters[0] += 1; counters[1] += length
+        if by_conversation is not None:
+            key = (bucket, protocol, packet_data["source_ip"], packet_data["destination_ip"], packet_data.get("destination_port") or 0)
+            counters = by_conversation[key]
+            counters[0] += 1; counters[1] += length
+    return by_protocol, by_conversation
+
+
+def _upsert(db_session, model, key_columns: tuple, counters: dict):
+    rows = [dict(zip(key_columns, key), packets=packets, bytes=length) for key, (packets, length) in counters.items()]
+    # Stay well below PostgreSQL's 65535 bind parameters per statement.
+    for start in range(0, len(rows), UPSERT_CHUNK_ROWS):
+        statement = pg_insert(model).values(rows[start:start + UPSERT_CHUNK_ROWS])
+        statement = statement.on_conflict_do_update(
+            index_elements=list(key_columns),
+            set_={
+                "packets": model.packets + statement.excluded.packets,
+                "bytes": model.bytes + statement.excluded.bytes,
+            },
+        )
+        db_session.execute(statement)
+
+
+def write_rollups(db_session, batch: list):
+    """Merges a batch into the rollup tables. Runs inside the caller's transaction."""
+    if not batch:
+        return
+    by_protocol, by_conversation = aggregate(batch)
+    _upsert(db_session, TrafficRollupProtocol, ("bucket", "protocol"), by_protocol)
+    if by_conversation:
+        _upsert(db_session, TrafficRollupConversation, ("bucket", "protocol", "source_ip", "destination_ip", "destination_port"), by_conversation)
+
+
+def backfill_from_packets():
+    """Fills each empty rollup table from the raw packets (INSERT ... SELECT ... GROUP BY minute)."""
+    # Literal SQL (no bind parameters), so the SELECT and GROUP BY expressions are identical whatever the driver.
+    bucket = func.date_trunc(literal_column("'minute'"), NetworkPacket.timestamp).label("bucket")
+    tables = [(TrafficRollupProtocol, [NetworkPacket.protocol])]
+    if settings.PACKET_ROLLUP_CONVERSATIONS:
+        tables.append((TrafficRollupConversation, [NetworkPacket.protocol, NetworkPacket.source_ip, NetworkPacket.destination_ip,
+                                                   func.coalesce(NetworkPacket.destination_port, literal_column("0")).label("destination_port")]))
+    for model, keys in tables:
+        with engine.begin() as conn:
+            if conn.execute(select(literal(1)).select_from(model).limit(1)).first() is not None:
+                continue
+            query = select(bucket, *keys, func.count(), func.coalesce(func.sum(NetworkPacket.length), 0)).group_by(bucket, *keys)
+            columns = ["bucket"] + [key.name for key in keys] + ["packets", "bytes"]
+            result = conn.execute(pg_insert(model).from_select(columns, query).on_conflict_do_nothing())
+        if result.rowcount:
+            logger.info(f"✅ Backfilled {result.rowcount} rows of {model.__tablename__} from network_packets.")
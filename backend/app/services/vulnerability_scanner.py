@@ -4,6 +4,7 @@ import json # We will need this to parse some script output
 from sqlalchemy import select
 from app.database import SessionLocal
 from app.models import Host, Vulnerability
+from app.routers.connection_manager import manager
 
 logger = logging.getLogger(__name__)
 
@@ -29,8 +30,10 @@ def run_vuln_scan():
             Vulnerability.source == SCAN_SOURCE_NAME
         ).delete(synchronize_session=False)
 
-        for host in hosts:
+        manager.publish_scan_progress("vulnerability_scan", "started", completed=0, total=len(hosts))
+        for scanned, host in enumerate(hosts, start=1):
             logger.info(f"🚨 Running ADVANCED vulnerability scan on {host.ip_address}")
+            manager.publish_scan_progress("vulnerability_scan", "running", target=host.ip_address, completed=scanned - 1, total=len(hosts))
             try:
                 # ### --- THE NEW, SMARTER SCAN COMMAND --- ###
                 # -sV: Enumerate service versions (CRITICAL)
@@ -82,11 +85,14 @@ def run_vuln_scan():
 
             except Exception as e:
                 logger.error(f"Error running vuln scan on {host.ip_address}: {e}", exc_info=True)
+                manager.publish_scan_progress("vulnerability_scan", "error", target=host.ip_address, completed=scanned, total=len(hosts))
 
         db.commit()
+        manager.publish_scan_progress("vulnerability_scan", "complete", completed=len(hosts), total=len(hosts))
 
     except Exception as e:
         logger.error(f"A critical error occurred during the vulnerability scan process: {e}", exc_info=True)
+        manager.publish_scan_progress("vulnerability_scan", "error")
         db.rollback()
     finally:
         db.close()
\ No newline at end of file
@@ -0,0 +1,109 @@
+# backend/app/services/ws_codec.py
+"""
+Compact binary ("columnar") encoding of live `packet_batch` WebSocket frames.
+
+A client opts in with `{"action": "subscribe", "encoding": "columnar"}`; JSON text
+frames stay the default. The frame is column-oriented so repeated values compress
+to small indexes and timestamps to small deltas. All integers are little endian:
+
+    header      magic "NGPB" | version u8 | count u32 | base timestamp f64 (epoch ms)
+    strings     n u16, then n x (byte length u16 + UTF-8 bytes)   -- dictionary of IPs, MACs, protocols, flags
+    timestamps  count x i32   ms delta to the previous packet (the first one to the base)
+    dictionary  count x u16 per field, in STRING_FIELDS order; 0xFFFF is null
+    length      count x u32
+    integers    count x i32 per field, in INT_FIELDS order; -1 is null
+
+The matching decoder lives in src/api/wireFormat.js.
+"""
+import struct
+import sys
+from array import array
+from datetime import datetime
+
+MAGIC = b"NGPB"
+VERSION = 1
+HEADER = struct.Struct("<4sBId")
+NULL_INDEX = 0xFFFF
+STRING_FIELDS = ("source_ip", "destination_ip", "protocol", "source_mac", "destination_mac", "flags")
+INT_FIELDS = ("source_port", "destination_port", "ttl")
+
+ENCODINGS = ("json", "columnar")
+
+
+def _little_endian(column: array) -> bytes:
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column.tobytes()
+
+
+def encode_packet_batch(packets: list) -> bytes:
+    """Encodes packet records into one columnar frame. Raises ValueError if the dictionary would overflow."""
+    index, table = {}, []
+
+    def intern(value):
+        if value is None:
+            return NULL_INDEX
+        position = index.get(value)
+        if position is None:
+            position = index[value] = len(table)
+            table.append(value)
+        return position
+
+    # Whole milliseconds (the resolution of both decoders), so the deltas add up exactly.
+    timestamps = [round(datetime.fromisoformat(packet["@timestamp"]).timestamp() * 1000) for packet in packets]
+    base = timestamps[0] if timestamps else 0
+    deltas, previous = array("i"), base
+    for ts in timestamps:
+        deltas.append(ts - previous)
+        previous = ts
+
+    string_columns = [array("H", (intern(packet.get(field)) for packet in packets)) for field in STRING_FIELDS]
+    if len(table) >= NULL_INDEX:
+        raise ValueError("Too many distinct values for one columnar frame")
+
+    parts = [HEADER.pack(MAGIC, VERSION, len(packets), base), struct.pack("<H", len(table))]
+    for value in table:
+        encoded = str(value).encode()
+        parts.append(struct.pack("<H", len(encoded)))
+        parts.append(encoded)
+    parts.append(_little_endian(deltas))
+    parts.extend(_little_endian(column) for column in string_columns)
+    parts.append(_little_endian(array("I", (packet.get("length") or 0 for packet in packets))))
+    for field in INT_FIELDS:
+        parts.append(_little_endian(array("i", (-1 if packet.get(field) is None else packet[field] for packet in packets))))
+    return b"".join(parts)
+
+
+def decode_packet_batch(frame: bytes) -> list:
+    """Reference decoder, the inverse of encode_packet_batch (timestamps come back as epoch ms)."""
+    magic, version, count, base = HEADER.unpack_from(frame, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a columnar packet frame")
+    offset = HEADER.size
+    (n_strings,) = struct.unpack_from("<H", frame, offset); offset += 2
+    table = []
+    for _ in range(n_strings):
+        (length,) = struct.unpack_from("<H", frame, offset); offset += 2
+        table.append(frame[offset:offset + length].decode()); offset += length
+
+    def column(typecode):
+        nonlocal offset
+        values = array(typecode)
+        values.frombytes(frame[offset:offset + count * values.itemsize])
+        if sys.byteorder == "big":
+            values.byteswap()
+        offset += count * values.itemsize
+        return values
+
+    deltas = column("i")
+    strings = {field: column("H") for field in STRING_FIELDS}
+    lengths = column("I")
+    integers = {field: column("i") for field in INT_FIELDS}
+    packets, ts = [], base
+    for i in range(count):
+        ts += deltas[i]
+        packet = {"timestamp_ms": ts, "length": lengths[i]}
+        packet.update({field: None if strings[field][i] == NULL_INDEX else table[strings[field][i]] for field in STRING_FIELDS})
+        packet.update({field: None if integers[field][i] == -1 else integers[field][i] for field in INT_FIELDS})
+        packets.append(packet)
+    return packets
@@ -1,70 +1,52 @@
 # app/services/zeek_parser.py
 import logging
 import json
-import time
 import os
 
 from ..state import app_state
+from app.config import settings
+from app.services import log_tailer, zeek_store
 
 logger = logging.getLogger(__name__)
 
-# The default path for Zeek's current logs, in JSON format
-ZEEK_CONN_LOG_FILE = "/opt/zeek/logs/current/conn.log"
+# Zeek's current logs, in JSON format; each type goes to its own in-memory ring
+ZEEK_LOG_FILES = {log: os.path.join(settings.ZEEK_LOG_DIR, f"{log}.log") for log in zeek_store.LOG_SCHEMAS}
+ZEEK_CONN_LOG_FILE = ZEEK_LOG_FILES["conn"]
 
-def process_zeek_log_entry(line: str):
+
+def get_store() -> zeek_store.ZeekStore:
+    if app_state.zeek_store is None:
+        app_state.zeek_store = zeek_store.ZeekStore(settings.ZEEK_RING_CAPACITY)
+    return app_state.zeek_store
+
+
+def process_zeek_log_entry(line: str, log: str = "conn"):
     """
-    Parses a single JSON line from conn.log and adds it to the in-memory state.
+    Parses a single JSON line from one of the Zeek logs and adds it to the in-memory rings.
     """
     try:
         # Load the JSON line into a Python dictionary
         log_data = json.loads(line)
-        
-        # Acquire the lock to safely add to our shared deque
-        with app_state.zeek_lock:
-            app_state.zeek_conn_logs.append(log_data)
-            
-        logger.debug(f"Zeek connection logged: {log_data.get('id.orig_h')} -> {log_data.get('id.resp_h')}")
+        get_store().add(log, log_data)
+        logger.debug(f"Zeek {log} logged: {log_data.get('id.orig_h')} -> {log_data.get('id.resp_h')}")
 
     except Exception as e:
-        logger.error(f"Failed to process Zeek log entry: '{line[:100]}...'. Error: {e}")
+        logger.error(f"Failed to process Zeek {log} log entry: '{line[:100]}...'. Error: {e}")
+
 
 def start_log_monitoring():
     """
-    Tails the Zeek conn.log file and processes new lines as they are written.
-    This runs in a background thread.
+    Registers conn/dns/http/ssl logs with the shared log tailer (see log_tailer.py),
+    which calls back with new lines as they are written. Returns immediately.
     """
     logger.info("Zeek log monitoring service starting.")
-    logger.info(f"Watching for connection logs in {ZEEK_CONN_LOG_FILE}")
-    
-    time.sleep(10) # Give Zeek time to start up and create the log file
-    
-    try:
-        # Jump to the end of the file so we only process new logs
-        with open(ZEEK_CONN_LOG_FILE, 'r') as f:
-            f.seek(0, os.SEEK_END)
-            last_pos = f.tell()
-    except FileNotFoundError:
-        last_pos = 0
-        logger.warning(f"Zeek log file not found at startup: {ZEEK_CONN_LOG_FILE}. Will keep trying.")
+    get_store()
+    for log, path in ZEEK_LOG_FILES.items():
+        logger.info(f"Watching for Zeek {log} logs in {path}")
 
-    while True:
-        try:
-            with open(ZEEK_CONN_LOG_FILE, 'r') as f:
-                # Handle log rotation
-                current_size = os.fstat(f.fileno()).st_size
-                if current_size < last_pos:
-                    last_pos = 0
-                
-                f.seek(last_pos)
-                for line in f:
-                    if line.strip():
-                        process_zeek_log_entry(line.strip())
-                last_pos = f.tell()
-        except FileNotFoundError:
-            last_pos = 0
-            time.sleep(5) # Wait longer if the file is missing
-            continue
-        except Exception as e:
-            logger.error(f"Error in Zeek log monitoring loop: {e}. Retrying...")
+        def on_lines(lines: list, log=log):
+            for line in lines:
+                process_zeek_log_entry(line.decode("utf-8", errors="replace"), log)
 
-        time.sleep(2) # Check for new lines every 2 seconds
+        log_tailer.tailer.register(f"zeek_{log}", path, on_lines)
+    log_tailer.tailer.start()
@@ -0,0 +1,234 @@
+# backend/app/services/zeek_store.py
+"""
+Fixed-capacity columnar ring buffers for recent Zeek logs (conn, dns, http, ssl).
+
+Each log type keeps one typed column per field instead of a dict per record:
+
+    "f"  float64 array   (ts, duration); NaN is null
+    "q"  int64 array     (ports, byte counts, status codes); -1 is null
+    "s"  int32 ids into an intern table, for low/medium cardinality strings (IPs,
+         protocols, states, hosts); id 0 is null. The table is compacted when it
+         grows well past the ring capacity.
+    "o"  plain Python list, for high cardinality strings (uid, DNS query, URI)
+
+Records come back in the shape Elasticsearch stores them ("id.orig_h" -> "id_orig_h",
+plus "@timestamp"), so callers can answer from memory or from ES interchangeably.
+NumPy is not a dependency of the backend, so the columns are stdlib `array`s.
+"""
+import math
+import threading
+import time
+from array import array
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Optional
+
+_ID_FIELDS = (("id_orig_h", "s"), ("id_orig_p", "q"), ("id_resp_h", "s"), ("id_resp_p", "q"))
+
+LOG_SCHEMAS = {
+    "conn": (("ts", "f"), ("uid", "o"), *_ID_FIELDS, ("proto", "s"), ("service", "s"), ("conn_state", "s"),
+             ("duration", "f"), ("orig_bytes", "q"), ("resp_bytes", "q"), ("orig_ip_bytes", "q"), ("resp_ip_bytes", "q")),
+    "dns": (("ts", "f"), ("uid", "o"), *_ID_FIELDS, ("proto", "s"), ("query", "o"), ("qtype_name", "s"), ("rcode_name", "s")),
+    "http": (("ts", "f"), ("uid", "o"), *_ID_FIELDS, ("method", "s"), ("host", "s"), ("uri", "o"), ("status_code", "q"),
+             ("user_agent", "s"), ("request_body_len", "q"), ("response_body_len", "q")),
+    "ssl": (("ts", "f"), ("uid", "o"), *_ID_FIELDS, ("version", "s"), ("cipher", "s"), ("server_name", "s"), ("validation_status", "s")),
+}
+
+_NULL_INT = -1
+_EMPTY = {"f": math.nan, "q": _NULL_INT, "s": 0}
+
+
+class ColumnarRing:
+    def __init__(self, schema: tuple, capacity: int):
+        self.schema = schema
+        self.capacity = max(1, capacity)
+        self.fields = [name for name, _ in schema]
+        self.columns = {}
+        for name, kind in schema:
+            if kind == "o":
+                self.columns[name] = [None] * self.capacity
+            else:
+                self.columns[name] = array("d" if kind == "f" else "q" if kind == "q" else "i", [_EMPTY[kind]]) * self.capacity
+        self._strings = [None]  # id -> string; id 0 is null
+        self._string_ids = {}
+        self.head = 0  # Next slot to write
+        self.size = 0
+        self.appended = 0
+        self.created_at = time.time()
+        self._lock = threading.Lock()
+
+    # --- Writing ---
+    def _intern(self, value) -> int:
+        if value is None:
+            return 0
+        value = str(value)
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self._strings)
+            self._strings.append(value)
+        return string_id
+
+    def _compact_strings(self):
+        """Re-interns the strings still referenced by the ring, dropping the rest."""
+        strings, string_ids, remap = [None], {}, {0: 0}
+        for name, kind in self.schema:
+            if kind != "s":
+                continue
+            column = self.columns[name]
+            for slot in range(self.capacity):
+                old = column[slot]
+                new = remap.get(old)
+                if new is None:
+                    value = self._strings[old]
+                    new = remap[old] = string_ids[value] = len(strings)
+                    strings.append(value)
+                column[slot] = new
+        self._strings, self._string_ids = strings, string_ids
+
+    def append(self, record: dict):
+        with self._lock:
+            slot = self.head
+            for name, kind in self.schema:
+                value = record.get(name)
+                column = self.columns[name]
+                if kind == "s":
+                    column[slot] = self._intern(value)
+                elif kind == "o":
+                    column[slot] = value
+                elif value is None:
+                    column[slot] = _EMPTY[kind]
+                else:
+                    try:
+                        column[slot] = float(value) if kind == "f" else int(value)
+                    except (TypeError, ValueError, OverflowError):
+                        column[slot] = _EMPTY[kind]
+            self.head = (slot + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+            self.appended += 1
+            if len(self._strings) > 4 * self.capacity + 1024:
+                self._compact_strings()
+
+    # --- Reading ---
+    def horizon(self) -> float:
+        """Epoch seconds from which the ring holds everything it was fed."""
+        if self.appended <= self.capacity:
+            return self.created_at
+        ts = self.columns["ts"]
+        return min(ts[slot] for slot in range(self.capacity) if not math.isnan(ts[slot]))
+
+    def _value(self, name: str, kind: str, slot: int):
+        value = self.columns[name][slot]
+        if kind == "s":
+            return self._strings[value]
+        if kind == "f":
+            return None if math.isnan(value) else value
+        if kind == "q":
+            return None if value == _NULL_INT else value
+        return value
+
+    def _slots_newest_first(self):
+        for offset in range(1, self.size + 1):
+            yield (self.head - offset) % self.capacity
+
+    def _matcher(self, since: Optional[float], filters: dict):
+        """Builds a slot predicate; string filters are compared as interned ids (no decoding)."""
+        ts = self.columns["ts"]
+        checks = []
+        kinds = dict(self.schema)
+        for name, wanted in filters.items():
+            if wanted is None or name not in kinds:
+                continue
+            column, kind = self.columns[name], kinds[name]
+            if kind == "s":
+                wanted_id = self._string_ids.get(str(wanted), -1)
+                checks.append(lambda slot, c=column, w=wanted_id: c[slot] == w)
+            elif kind == "o":
+                checks.append(lambda slot, c=column, w=str(wanted): c[slot] == w)
+            else:
+                checks.append(lambda slot, c=column, w=float(wanted): c[slot] == w)
+
+        def matches(slot):
+            if since is not None and not ts[slot] >= since:
+                return False
+            return all(check(slot) for check in checks)
+        return matches
+
+    def record(self, slot: int) -> dict:
+        record = {name: self._value(name, kind, slot) for name, kind in self.schema}
+        if record.get("ts") is not None:
+            record["@timestamp"] = datetime.fromtimestamp(record["ts"], tz=timezone.utc).isoformat()
+        return record
+
+    def query(self, limit: int, since: Optional[float] = None, **filters) -> list:
+        """Newest-first records matching the equality `filters`, optionally only with ts >= `since`."""
+        with self._lock:
+            matches = self._matcher(since, filters)
+            records = []
+            for slot in self._slots_newest_first():
+                if matches(slot):
+                    records.append(self.record(slot))
+                    if len(records) >= limit:
+                        break
+            return records
+
+    def group_by(self, key, since: Optional[float] = None, value_fields: tuple = (), limit: int = 10, **filters) -> list:
+        """
+        Counts (and sums `value_fields`) over matching records grouped by `key`: a field name or
+        a function of the record. Returns the top `limit` groups by the first sum, else by count.
+        """
+        with self._lock:
+            matches = self._matcher(since, filters)
+            kinds = dict(self.schema)
+            groups = defaultdict(lambda: [0] + [0] * len(value_fields))
+            for slot in self._slots_newest_first():
+                if not matches(slot):
+                    continue
+                group = key(lambda name: self._value(name, kinds[name], slot)) if callable(key) else self._value(key, kinds[key], slot)
+                totals = groups[group]
+                totals[0] += 1
+                for position, name in enumerate(value_fields, start=1):
+                    totals[position] += self._value(name, kinds[name], slot) or 0
+        rows = [{"key": group, "count": totals[0], **dict(zip(value_fields, totals[1:]))} for group, totals in groups.items()]
+        rows.sort(key=lambda row: row[value_fields[0]] if value_fields else row["count"], reverse=True)
+        return rows[:limit]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"capacity": self.capacity, "size": self.size, "appended": self.appended, "interned_strings": len(self._strings) - 1}
+
+
+def normalize_record(log_data: dict) -> dict:
+    """Zeek JSON keys ("id.orig_h") to the flattened names used by Elasticsearch and the API ("id_orig_h")."""
+    return {key.replace(".", "_"): value for key, value in log_data.items()}
+
+
+# Port-based application protocol, as in the Elasticsearch protocol distribution query.
+APP_PORTS = {80: "HTTP", 443: "HTTPS", 21: "FTP", 22: "SSH", 23: "TELNET", 25: "SMTP", 53: "DNS",
+             110: "POP3", 143: "IMAP", 3389: "RDP", 445: "SMB"}
+
+
+def app_protocol(field) -> str:
+    """`field(name)` returns a conn record value. Mirrors the painless script (orig port checked first)."""
+    port = field("id_orig_p")
+    if port is None:
+        port = field("id_resp_p")
+    name = APP_PORTS.get(port)
+    if name:
+        return name
+    proto = field("proto")
+    return proto.upper() if proto else "UNKNOWN"
+
+
+class ZeekStore:
+    def __init__(self, capacity: int):
+        self.rings = {log: ColumnarRing(schema, capacity) for log, schema in LOG_SCHEMAS.items()}
+
+    def add(self, log: str, log_data: dict):
+        self.rings[log].append(normalize_record(log_data))
+
+    def covers(self, log: str, since: float) -> bool:
+        """True when everything since `since` (epoch seconds) is still in memory."""
+        return self.rings[log].horizon() <= since
+
+    def stats(self) -> dict:
+        return {log: ring.stats() for log, ring in self.rings.items()}
@@ -1,5 +1,4 @@
 import threading
-from collections import deque
 class AppState:
     def __init__(self):
         # Admin privileges check result
@@ -8,8 +7,8 @@ class AppState:
         # We use a dictionary for network_hosts for efficient lookups by IP.
         # It maps an IP address to a host object. e.g., {'192.168.1.1': HostData}
         self.network_hosts = {}
-        self.zeek_conn_logs = deque(maxlen=1000)
-        self.zeek_lock = threading.Lock()
+        # Columnar ring buffers of recent Zeek conn/dns/http/ssl logs (services/zeek_store.py)
+        self.zeek_store = None
 # last_scan_time is still useful for the UI
         self.last_scan_time = None
 
@@ -17,6 +16,19 @@ class AppState:
         # from the scanner thread and the API router thread, preventing crashes.
         self.hosts_lock = threading.Lock()
 
+        # Live counters published by the packet writer thread (rows/s, flush latency...)
+        self.packet_writer_stats = {}
+        # The sniffer -> handler channel (multiprocessing.Queue or shared-memory PacketRing)
+        self.packet_transport = None
+        # Watermark-based load shedding policy of the packet handler (mode, drop counters)
+        self.packet_load_shedder = None
+        # 5-tuple flow aggregator, when PACKET_PERSISTENCE is "flows" or "both"
+        self.packet_flow_table = None
+        # Ring of the most recent packets, answering GET /api/packets from memory
+        self.recent_packets = None
+        # Multi-resolution ingress/egress time series per interface and protocol
+        self.bandwidth_store = None
+
 # A single, global instance of our application state that is imported everywhere
 app_state = AppState()
 app_state.vulnerability_scan_in_progress = False
@@ -0,0 +1,371 @@
+# backend/run_pipeline_benchmark.py
+"""
+Replays tshark EK traffic through the live packet pipeline without a capture interface.
+
+    python run_pipeline_benchmark.py --synthetic 200000
+    python run_pipeline_benchmark.py --ek-file capture.ek --sink postgres --output run.json
+
+A feeder process writes the lines into a private FIFO, exactly like the packet-streamer
+container does, and the real sniffer stage (`start_sniffer`: json_sniffer_process or the
+EK decoder pool), transport and `data_handler_thread` consume it. The WebSocket manager is
+replaced by a recording fake, and with `--sink memory` (the default) the database session
+is an in-memory stand-in that still builds the COPY stream / statements but never talks to
+PostgreSQL. `--sink postgres` writes to the database configured in DATABASE_URL.
+
+The feeder rewrites every EK "timestamp" to the moment the line is written, so the
+latencies reported are end to end: FIFO write -> WebSocket publish and -> batch persisted.
+The JSON report carries the commit and settings used, so runs can be compared across versions.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import re
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from app.config import settings
+from app.services import packet_capture
+
+logger = logging.getLogger("pipeline_benchmark")
+
+TIMESTAMP_FIELD = re.compile(rb'"timestamp"\s*:\s*"\d+"')
+SYNTHETIC_HOSTS = 64
+SYNTHETIC_PROTOCOLS = ("tcp", "tcp", "tcp", "udp", "icmp")
+
+
+# --- Traffic sources ---
+
+def synthetic_ek_lines(count: int, seed: int = 0):
+    """Yields `count` tshark-style EK packets (bulk index line + document line each)."""
+    rng = random.Random(seed)
+    hosts = [f"10.0.{i // 256}.{i % 256}" for i in range(SYNTHETIC_HOSTS)]
+    macs = [f"02:00:00:00:{i // 256:02x}:{i % 256:02x}" for i in range(SYNTHETIC_HOSTS)]
+    index_line = b'{"index":{"_index":"packets-benchmark","_type":"doc"}}\n'
+    for _ in range(count):
+        src, dst = rng.sample(range(SYNTHETIC_HOSTS), 2)
+        layers = {
+            "frame": {"frame_frame_len": str(rng.randint(60, 1514))},
+            "eth": {"eth_eth_src": macs[src], "eth_eth_dst": macs[dst]},
+            "ip": {"ip_ip_src": hosts[src], "ip_ip_dst": hosts[dst], "ip_ip_ttl": str(rng.choice((64, 128, 255)))},
+        }
+        protocol = rng.choice(SYNTHETIC_PROTOCOLS)
+        if protocol == "tcp":
+            layers["tcp"] = {"tcp_tcp_srcport": str(rng.randint(1024, 65535)), "tcp_tcp_dstport": str(rng.choice((80, 443, 22, 5432))), "tcp_tcp_flags": rng.choice(("0x0002", "0x0012", "0x0010", "0x0018", "0x0011"))}
+        elif protocol == "udp":
+            layers["udp"] = {"udp_udp_srcport": str(rng.randint(1024, 65535)), "udp_udp_dstport": str(rng.choice((53, 123, 514)))}
+        else:
+            layers["icmp"] = {"icmp_icmp_type": "8"}
+        yield index_line
+        yield json.dumps({"timestamp": "0", "layers": layers}, separators=(",", ":")).encode() + b"\n"
+
+
+def ek_file_lines(path: str):
+    with open(path, "rb") as f:
+        yield from f
+
+
+def feeder_process(pipe_path: str, ek_file: str, synthetic: int, seed: int, rate: int, fed_lines):
+    """Writes the source lines into the FIFO, stamping each with the current time. `rate` is packets/s, 0 for unthrottled."""
+    lines = ek_file_lines(ek_file) if ek_file else synthetic_ek_lines(synthetic, seed)
+    started, written = time.monotonic(), 0
+    with open(pipe_path, "wb", buffering=1024 * 1024) as pipe:
+        for line in lines:
+            if b'"layers"' in line:
+                line = TIMESTAMP_FIELD.sub(b'"timestamp":"%d"' % int(time.time() * 1000), line, count=1)
+                written += 1
+                if rate and written % 100 == 0:
+                    pipe.flush()
+                    ahead = written / rate - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+            pipe.write(line)
+    fed_lines.value = written
+
+
+# --- Instrumented stand-ins ---
+
+class LatencyRecorder:
+    """Collects end-to-end latencies (ms) from packet timestamps; shared by the fakes below."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []
+        self.last_seen = time.monotonic()
+
+    def record(self, timestamps):
+        now = time.time()
+        latencies = [(now - ts.timestamp()) * 1000 for ts in timestamps]
+        with self._lock:
+            self.samples.extend(latencies)
+            self.last_seen = time.monotonic()
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return {"count": 0, "p50": None, "p99": None, "max": None}
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))], 2)
+
+        return {"count": len(samples), "p50": percentile(0.50), "p99": percentile(0.99), "max": round(samples[-1], 2)}
+
+
+class FakeConnectionManager:
+    """Accepts packet batches the way ConnectionManager.publish_packets does and only measures them."""
+
+    def __init__(self, recorder: LatencyRecorder):
+        self.recorder = recorder
+
+    def publish_packets(self, packets: list):
+        if packets:
+            self.recorder.record(datetime.fromisoformat(packet["@timestamp"]) for packet in packets)
+
+    def publish_event(self, topic: str, message: dict, events=None):
+        pass
+
+
+class _MemoryCursor:
+    def execute(self, statement, stream=None):
+        if stream is not None:
+            stream.read()  # Consume the COPY payload like the server would
+
+    def close(self):
+        pass
+
+
+class _MemoryConnection:
+    def __init__(self):
+        self.connection = self  # Stands in for both the SQLAlchemy and the DBAPI connection
+
+    def cursor(self):
+        return _MemoryCursor()
+
+
+class MemorySession:
+    """Just enough of a SQLAlchemy Session for data_handler_thread; statements are built but go nowhere."""
+
+    def connection(self):
+        return _MemoryConnection()
+
+    def execute(self, statement, params=None):
+        return None
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _instrument(sink: str, published: LatencyRecorder, persisted: LatencyRecorder):
+    """
+    Swaps the WebSocket manager inside packet_capture for the recording fake, and the
+    database for MemorySession with the memory sink. Packets count as persisted when the
+    transaction holding them commits.
+    """
+    packet_capture.manager = FakeConnectionManager(published)
+    pending = []
+    for mode, writer in list(packet_capture.BATCH_WRITERS.items()):
+        def recording_writer(db_session, rows, _writer=writer):
+            _writer(db_session, rows)
+            pending.extend(row["timestamp"] for row in rows)
+        packet_capture.BATCH_WRITERS[mode] = recording_writer
+
+    connect = MemorySession if sink == "memory" else packet_capture._connect_db
+
+    def connect_db():
+        db_session = connect()
+        if db_session is None:
+            return None
+        commit, rollback = db_session.commit, db_session.rollback
+
+        def recording_commit():
+            commit()
+            persisted.record(pending)
+            pending.clear()
+
+        def recording_rollback():
+            rollback()
+            pending.clear()
+
+        db_session.commit, db_session.rollback = recording_commit, recording_rollback
+        return db_session
+
+    packet_capture._connect_db = connect_db
+
+
+# --- Measurement ---
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def process_cpu_seconds(pid: int):
+    """User + system CPU of a live process from /proc (Linux). None when unavailable."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(args) -> dict:
+    # Settings are read when the pipeline stages start, and forked children inherit them.
+    settings.PACKET_INGEST_FORMAT = "ek"
+    for option, name in (("transport", "PACKET_TRANSPORT"), ("decoder_workers", "PACKET_DECODER_WORKERS"), ("write_mode", "PACKET_WRITE_MODE"),
+                         ("persistence", "PACKET_PERSISTENCE"), ("batch_size", "PACKET_BATCH_SIZE"), ("flush_interval_ms", "PACKET_FLUSH_INTERVAL_MS")):
+        value = getattr(args, option)
+        if value is not None:
+            setattr(settings, name, value)
+
+    # Synthetic traffic must never overwrite (or be seeded from) the production bandwidth snapshot.
+    settings.BANDWIDTH_SNAPSHOT_FILE = ""
+
+    published, persisted = LatencyRecorder(), LatencyRecorder()
+    _instrument(args.sink, published, persisted)
+
+    workdir = tempfile.mkdtemp(prefix="netguard-bench-")
+    pipe_path = os.path.join(workdir, "stream.ek")
+    os.mkfifo(pipe_path)
+    stop_event = multiprocessing.Event()
+    fed_lines = multiprocessing.Value("q", 0)
+    packet_queue = packet_capture.create_packet_transport()
+
+    handler_cpu = {}
+
+    def handler():
+        packet_capture.data_handler_thread(packet_queue, stop_event)
+        handler_cpu["seconds"] = time.thread_time()
+
+    sniffers = packet_capture.start_sniffer(packet_queue, pipe_path, stop_event)
+    handler_thread = threading.Thread(target=handler, name="BenchmarkDataHandler", daemon=True)
+    handler_thread.start()
+
+    started_at = datetime.now(timezone.utc).isoformat()
+    main_cpu_started = resource.getrusage(resource.RUSAGE_SELF)
+    started = time.monotonic()
+    feeder = multiprocessing.Process(target=feeder_process, args=(pipe_path, args.ek_file, args.synthetic, args.seed, args.rate, fed_lines), daemon=True, name="BenchmarkFeeder")
+    feeder.start()
+
+    queue_depth, cpu = [], {}
+
+    def sample():
+        stats = packet_capture.transport_stats(packet_queue)
+        shedder = packet_capture.app_state.packet_load_shedder
+        queue_depth.append({
+            "t": round(time.monotonic() - started, 3), "depth": stats.get("depth"), "dropped": stats.get("dropped"),
+            "shedding_mode": shedder.stats["mode"] if shedder else None,
+        })
+        for process in [feeder] + sniffers:
+            seconds = process_cpu_seconds(process.pid) if process.is_alive() else None
+            if seconds is not None:
+                cpu[process.name] = seconds
+
+    # Replay until the feeder is done and the pipeline has gone quiet.
+    while True:
+        sample()
+        time.sleep(args.sample_interval)
+        if feeder.is_alive():
+            continue
+        depth = packet_capture.transport_stats(packet_queue).get("depth") or 0
+        if depth == 0 and time.monotonic() - published.last_seen >= args.settle:
+            break
+    finished = published.last_seen
+    sample()
+
+    stop_event.set()
+    handler_thread.join(timeout=30)
+    for process in sniffers:
+        if process.is_alive():
+            process.terminate()
+        process.join(timeout=5)
+    main_cpu = resource.getrusage(resource.RUSAGE_SELF)
+    final_transport = packet_capture.transport_stats(packet_queue)
+    if hasattr(packet_queue, "close"):
+        packet_queue.close()
+    os.unlink(pipe_path)
+    os.rmdir(workdir)
+
+    duration = max(finished - started, 1e-9)
+    writer_stats = dict(packet_capture.app_state.packet_writer_stats)
+    shedder = packet_capture.app_state.packet_load_shedder
+    shedding = shedder.snapshot() if shedder else {}
+    shedding.pop("aggregates", None)
+    published_summary, persisted_summary = published.summary(), persisted.summary()
+    return {
+        "benchmark": "packet_pipeline_replay",
+        "started_at": started_at,
+        "git_commit": _git_commit(),
+        "source": {"type": "ek_file", "path": args.ek_file} if args.ek_file else {"type": "synthetic", "packets": args.synthetic, "seed": args.seed},
+        "config": {
+            "sink": args.sink, "rate": args.rate, "transport": settings.PACKET_TRANSPORT, "decoder_workers": settings.PACKET_DECODER_WORKERS,
+            "write_mode": settings.PACKET_WRITE_MODE, "persistence": settings.PACKET_PERSISTENCE,
+            "batch_size": settings.PACKET_BATCH_SIZE, "flush_interval_ms": settings.PACKET_FLUSH_INTERVAL_MS,
+        },
+        "packets": {
+            "fed": fed_lines.value, "published": published_summary["count"], "persisted": persisted_summary["count"],
+            "transport_dropped": final_transport.get("dropped"),
+            "sampled_out": shedding.get("sampled_out"), "shed": shedding.get("shed"),
+        },
+        "duration_seconds": round(duration, 3),
+        "packets_per_second": round(published_summary["count"] / duration, 1),
+        "persisted_per_second": round(persisted_summary["count"] / duration, 1),
+        "latency_ms": {"publish": published_summary, "persist": persisted_summary},
+        "queue_depth": queue_depth,
+        "cpu_seconds": {
+            "stages": {**cpu, "data_handler_thread": handler_cpu.get("seconds")},
+            "benchmark_process": round((main_cpu.ru_utime + main_cpu.ru_stime) - (main_cpu_started.ru_utime + main_cpu_started.ru_stime), 3),
+        },
+        "writer": writer_stats,
+        "load_shedding": shedding,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay EK traffic through the packet pipeline and report throughput and latency as JSON.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--ek-file", help="tshark -T ek recording to replay")
+    source.add_argument("--synthetic", type=int, help="number of synthetic packets to generate")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic generator")
+    parser.add_argument("--rate", type=int, default=0, help="target packets/s, 0 replays as fast as possible")
+    parser.add_argument("--sink", choices=("memory", "postgres"), default="memory")
+    parser.add_argument("--transport", choices=("queue", "shm"))
+    parser.add_argument("--decoder-workers", type=int)
+    parser.add_argument("--write-mode", choices=tuple(packet_capture.BATCH_WRITERS))
+    parser.add_argument("--persistence", choices=("packets", "flows", "both"))
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--flush-interval-ms", type=int)
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="seconds between queue depth / CPU samples")
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds without new packets before the run is considered finished")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    logging.basicConfig(level="WARNING", format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    report = json.dumps(run_benchmark(args), indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
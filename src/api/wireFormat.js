@@ -0,0 +1,58 @@
+// src/api/wireFormat.js
+// Decoder for the binary "columnar" packet_batch frames sent by the backend
+// (backend/app/services/ws_codec.py documents the layout). All integers are little endian.
+
+const MAGIC = 'NGPB';
+const VERSION = 1;
+const NULL_INDEX = 0xffff;
+const STRING_FIELDS = ['source_ip', 'destination_ip', 'protocol', 'source_mac', 'destination_mac', 'flags'];
+const INT_FIELDS = ['source_port', 'destination_port', 'ttl'];
+
+const textDecoder = new TextDecoder();
+
+// Turns an ArrayBuffer frame into the same { type, data } message the JSON encoding produces.
+export const decodePacketBatch = (buffer) => {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+    if (magic !== MAGIC || view.getUint8(4) !== VERSION) {
+        throw new Error('Unknown binary frame');
+    }
+    const count = view.getUint32(5, true);
+    const base = view.getFloat64(9, true);
+    let offset = 17;
+
+    const stringCount = view.getUint16(offset, true); offset += 2;
+    const strings = new Array(stringCount);
+    for (let i = 0; i < stringCount; i++) {
+        const length = view.getUint16(offset, true); offset += 2;
+        strings[i] = textDecoder.decode(new Uint8Array(buffer, offset, length)); offset += length;
+    }
+
+    const readColumn = (size, read) => {
+        const values = new Array(count);
+        for (let i = 0; i < count; i++) values[i] = read(offset + i * size);
+        offset += count * size;
+        return values;
+    };
+    const deltas = readColumn(4, (at) => view.getInt32(at, true));
+    const stringColumns = STRING_FIELDS.map(() => readColumn(2, (at) => view.getUint16(at, true)));
+    const lengths = readColumn(4, (at) => view.getUint32(at, true));
+    const intColumns = INT_FIELDS.map(() => readColumn(4, (at) => view.getInt32(at, true)));
+
+    const packets = new Array(count);
+    let timestamp = base;
+    for (let i = 0; i < count; i++) {
+        timestamp += deltas[i];
+        const packet = { '@timestamp': new Date(timestamp).toISOString(), length: lengths[i] };
+        STRING_FIELDS.forEach((field, f) => {
+            const index = stringColumns[f][i];
+            packet[field] = index === NULL_INDEX ? null : strings[index];
+        });
+        INT_FIELDS.forEach((field, f) => {
+            const value = intColumns[f][i];
+            packet[field] = value === -1 ? null : value;
+        });
+        packets[i] = packet;
+    }
+    return { type: 'packet_batch', data: packets };
+};
@@ -13,7 +13,7 @@ export const useData = () => {
 };
 
 export const DataProvider = ({ children }) => {
-    const { lastJsonMessage, isConnected } = useWebSocket();
+    const { lastJsonMessage, isConnected } = useWebSocket({ encoding: 'columnar' });
     const [packets, setPackets] = useState([]);
     const [hosts, setHosts] = useState([]);
     const [alerts, setAlerts] = useState([]);
@@ -58,6 +58,10 @@ export const DataProvider = ({ children }) => {
         if (lastJsonMessage && lastJsonMessage.type === 'packet_data') {
             const newPacket = lastJsonMessage.data;
             setPackets(p => [newPacket, ...p].slice(0, MAX_PACKETS_IN_LIST));
+        } else if (lastJsonMessage && lastJsonMessage.type === 'packet_batch') {
+            // Batches arrive oldest first; the table shows the newest packet on top.
+            const newPackets = [...lastJsonMessage.data].reverse();
+            setPackets(p => [...newPackets, ...p].slice(0, MAX_PACKETS_IN_LIST));
         }
     }, [lastJsonMessage]);
 
@@ -4,8 +4,11 @@ import { useState, useEffect, useRef, useCallback } from 'react';
 // --- START OF FINAL FIX: Import the base URL from our config file ---
 import { WS_BASE_URL } from '../api/config';
 // --- END OF FINAL FIX ---
+import { decodePacketBatch } from '../api/wireFormat';
 
-export const useWebSocket = () => {
+// `encoding` is negotiated with the server right after connecting: 'json' (the default)
+// or 'columnar' for compact binary packet batches, decoded here transparently.
+export const useWebSocket = ({ encoding = 'json' } = {}) => {
     const [lastJsonMessage, setLastJsonMessage] = useState(null);
     const [isConnected, setIsConnected] = useState(false);
     const websocketRef = useRef(null);
@@ -17,17 +20,36 @@ export const useWebSocket = () => {
 
         console.log("Attempting to connect to WebSocket (No Auth):", wsUrl);
         websocketRef.current = new WebSocket(wsUrl);
+        websocketRef.current.binaryType = 'arraybuffer';
 
-        websocketRef.current.onopen = () => { console.log("✅ WebSocket Connected"); setIsConnected(true); };
+        websocketRef.current.onopen = () => {
+            console.log("✅ WebSocket Connected");
+            setIsConnected(true);
+            if (encoding !== 'json') {
+                websocketRef.current.send(JSON.stringify({ action: 'subscribe', encoding }));
+            }
+        };
         websocketRef.current.onclose = () => { console.log("🔌 WebSocket Disconnected"); setIsConnected(false); };
         websocketRef.current.onerror = (error) => { console.error("❌ WebSocket Error:", error); };
         websocketRef.current.onmessage = (event) => {
             try {
+                if (event.data instanceof ArrayBuffer) {
+                    setLastJsonMessage(decodePacketBatch(event.data));
+                    return;
+                }
                 setLastJsonMessage(JSON.parse(event.data));
             } catch (error) {
                 console.error("Failed to parse WebSocket message:", error);
             }
         };
+    }, [encoding]);
+
+    // Sends a JSON message to the server, e.g. a subscription:
+    // { action: 'subscribe', topics: ['packets', 'alerts'], filter: { ip: '10.0.0.0/8', port: 443, protocol: 'TCP' } }
+    const sendJsonMessage = useCallback((message) => {
+        if (websocketRef.current && websocketRef.current.readyState === WebSocket.OPEN) {
+            websocketRef.current.send(JSON.stringify(message));
+        }
     }, []);
 
     useEffect(() => {
@@ -39,5 +61,5 @@ export const useWebSocket = () => {
         };
     }, [connect]);
 
-    return { lastJsonMessage, isConnected };
+    return { lastJsonMessage, isConnected, sendJsonMessage };
 };
\ No newline at end of file